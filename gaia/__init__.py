@@ -91,7 +91,9 @@ def create(data_source, *args, **kwargs):
     :param data_source: the source data for the object. Can be one of:
       * a path (string) on local filesystem
       * a web url (string) that Gaia can download from
-      * a python object (numpy array, GeoPandas dataframe, etc.)
+      * a python object (numpy array, GeoPandas dataframe, etc.);
+        numpy arrays take geotransform, crs (EPSG code) and nodata
+        keyword arguments and are wrapped without copying
       * TBD a tuple indicating postgis parameters
       * a 2-tuple specifying a GirderInterface object and path(string) to the file
     :return: Gaia data obkject
@@ -184,14 +186,19 @@ def show(*data_objects, **options):
 def save(data_object, filename, **options):
     """Writes data object to specified file.
 
+    Vector data can also be written to a PostGIS table, using either a
+    'postgis://table' filename or no filename and a table=... option (see
+    gaia.io.writers.write_postgis_object for the connection options).
+
     :param data_object: GaiaDataObject instance
-    :param filename: filesystem path
+    :param filename: filesystem path or postgis url
     :param options: options to pass to writing backend
     :return boolean indicating success
     """
     return writers.write_gaia_object(data_object, filename, **options)
 
-def submit_crop(data_object, geometry_object, nersc_repository):
+def submit_crop(data_object, geometry_object, nersc_repository,
+                backend=None):
     """Submits processing job to NERSC HPC machine
 
     Current support is (only) for girder-hosted datasets
@@ -199,12 +206,14 @@ def submit_crop(data_object, geometry_object, nersc_repository):
     :param data_object: GirderDataObject to be cropped
     :param geometry_object: GaiaDataObject specifying the crop geometry
     :param nersc_repository: (string) accounting repository (e.g., m1234)
+    :param backend: execution backend (default: NERSC), e.g. a
+      gaia.io.job_backends.LocalBackend to run the job on this machine
     :return job_id (string) that can be used for tracking and creating
       new GaiaDataObject when job is complete.
     """
     # Hand off to cumulus interface
     from gaia.io.cumulus_interface import CumulusInterface
-    cumulus_interface = CumulusInterface()
+    cumulus_interface = CumulusInterface(backend)
     return cumulus_interface.submit_crop(data_object, geometry_object, nersc_repository)
 
 get_config()
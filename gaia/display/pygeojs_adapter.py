@@ -11,11 +11,22 @@ try:
 except ImportError:
     IS_PYGEOJS_LOADED = False
 
+import base64
+import io
+
 import geopandas
 
 import gaia.types
+from gaia.geo.gdal_functions import (
+    gdal_preview_image,
+    gdal_reproject,
+    reduced_shape
+)
 from gaia.util import GaiaException
 
+#: Longest side (in pixels) of the preview image shown for local rasters
+PREVIEW_SIZE = 1024
+
 
 def is_loaded():
     """Returns boolean indicating if pygeojs is loaded
@@ -30,7 +41,9 @@ def show(data_objects, **options):
 
     :param data_objects: list of GeoData objects to display, in
         front-to-back rendering order.
-    :param options: options passed to jupyterlab_geojs.Scene instance.
+    :param options: options passed to jupyterlab_geojs.Scene instance,
+        plus preview_size, the longest side in pixels of the reduced
+        resolution image displayed for local rasters.
     :return: pygeojs.scene instance if running Jupyter;
         otherwise returns data_objects for default display
     """
@@ -41,6 +54,8 @@ def show(data_objects, **options):
     if not hasattr(data_objects, '__iter__'):
         data_objects = [data_objects]
 
+    preview_size = options.pop('preview_size', PREVIEW_SIZE)
+
     # print(data_objects)
     scene = pygeojs.scene(**options)
     scene.createLayer('osm')
@@ -58,14 +73,13 @@ def show(data_objects, **options):
         if data_object._getdatatype() == gaia.types.VECTOR:
             # print('Adding vector object')
             # Special handling for vector datasets:
-            # First, make a copy of the geopandas frame
-            df = geopandas.GeoDataFrame.copy(data_object.get_data())
-
-            # Convert to lon-lat if needed
+            # Convert to lon-lat if needed (cached on the data object)
             epsg = data_object.get_epsg()
             if epsg and str(epsg) != '4326':
-                print('Converting crs')
-                df[df.geometry.name] = df.geometry.to_crs(epsg='4326')
+                data_object = data_object.in_crs(4326)
+
+            # Make a copy of the geopandas frame
+            df = geopandas.GeoDataFrame.copy(data_object.get_data())
 
             # Strip any z coordinates (force to z = 1)
             df.geometry = df.geometry.scale(zfact=0.0).translate(zoff=1.0)
@@ -167,6 +181,12 @@ def show(data_objects, **options):
 
         elif data_object._getdatatype() == gaia.types.VECTOR:
             pass  # vector objects handled above
+        elif data_object._getdatatype() == gaia.types.RASTER:
+            # Display a reduced resolution image, never full res pixels
+            if feature_layer is None:
+                feature_layer = scene.createLayer('feature')
+            feature_layer.createFeature(
+                'quad', [_raster_preview(data_object, preview_size)])
         else:
             msg = 'Cannot display dataobject, type {}'.format(
                 data_object.__class__.__name__)
@@ -178,6 +198,38 @@ def show(data_objects, **options):
     return scene
 
 
+def _raster_preview(data_object, preview_size):
+    """Returns geojs quad data for a reduced resolution preview of a raster
+
+    :param data_object: raster (GDALDataObject)
+    :param preview_size: longest side of the preview image, in pixels
+    :return: dict with ul, lr corners (lon-lat) and PNG image data url
+    """
+    meta = data_object.get_metadata()
+    shape = reduced_shape(meta.get('width'), meta.get('height'), preview_size)
+    preview = data_object.get_data(target_shape=shape)
+
+    # Only the preview is reprojected, not the full resolution raster
+    epsg = data_object.get_epsg()
+    if epsg and str(epsg) != '4326':
+        preview = gdal_reproject(preview, '', epsg=4326)
+
+    buf = io.BytesIO()
+    gdal_preview_image(preview).save(buf, format='PNG')
+    url = 'data:image/png;base64,{}'.format(
+        base64.b64encode(buf.getvalue()).decode('ascii'))
+
+    gt = preview.GetGeoTransform()
+    xmin, ymax = gt[0], gt[3]
+    xmax = gt[0] + gt[1] * preview.RasterXSize
+    ymin = gt[3] + gt[5] * preview.RasterYSize
+    return {
+        'ul': {'x': xmin, 'y': ymax},
+        'lr': {'x': xmax, 'y': ymin},
+        'image': url
+    }
+
+
 def _is_jupyter():
     """Determines if Jupyter is loaded
 
@@ -17,6 +17,12 @@
 #  limitations under the License.
 ###############################################################################
 import operator
+import re
+
+import numpy as np
+from six import string_types
+
+from gaia.util import GaiaException
 
 #: Dict of mathematical operators for equations
 ops = {
@@ -28,62 +34,478 @@ ops = {
     "<=": operator.le,
 }
 
+#: String operators, evaluated through the pandas ``.str`` accessor
+str_ops = ["contains", "startswith", "endswith"]
+
+#: Estimated fraction of rows passing each operator, used to order clauses
+selectivity = {
+    "=": 0.05,
+    "in": 0.05,
+    "startswith": 0.1,
+    "endswith": 0.1,
+    "contains": 0.25,
+    ">": 0.33,
+    ">=": 0.33,
+    "<": 0.33,
+    "<=": 0.33,
+    "not in": 0.9,
+    "!=": 0.95,
+}
+
+#: Estimated fraction of rows passing other (SQL only) operators
+default_selectivity = 0.5
+
+#: Operators passed through to SQL as-is (e.g. ilike, ~, &&), which pandas
+#: and OGR cannot evaluate
+sql_operator = re.compile(r'^([a-z]+( [a-z]+)*|[!<>=~*&|@#%^-]+)$')
+
+#: Complement of each comparison operator, used to push NOT into clauses
+negated_ops = {
+    "=": "<>",
+    "!=": "=",
+    ">": "<=",
+    ">=": "<",
+    "<": ">=",
+    "<=": ">",
+}
+
+#: Boolean joiners recognized in nested filter tuples
+joiners = ("and", "or", "not")
+
+
+class FilterExpression(object):
+    """
+    Base class for a node in a filter expression tree.
+    """
+    def estimate_selectivity(self):
+        """
+        Estimate the fraction of rows that pass this expression
+
+        :return: float between 0 and 1
+        """
+        raise NotImplementedError()
+
+    def evaluate(self, df, rows=None):
+        """
+        Evaluate the expression against a DataFrame
+
+        :param df: The DataFrame to evaluate against
+        :param rows: Optional array of row positions to evaluate; if None,
+        all rows are evaluated
+        :return: boolean numpy array, one value per evaluated row
+        """
+        raise NotImplementedError()
+
+    def attributes(self):
+        """
+        :return: set of attribute names referenced by the expression
+        """
+        raise NotImplementedError()
+
+    def optimize(self):
+        """
+        Return an equivalent expression with nested joins flattened and
+        children ordered so the cheapest short-circuit is evaluated first.
+        """
+        return self
+
+    def to_sql(self):
+        """
+        Generate a parameterized SQL expression
+
+        :return: SQL string and list of parameters
+        """
+        raise NotImplementedError()
+
+    def to_ogr(self, negate=False):
+        """
+        Generate an OGR SQL attribute filter (values are inlined)
+
+        The filter selects exactly the rows evaluate() selects: negations
+        are pushed down to the clauses, and clauses that are true for
+        NULL values in pandas (e.g. != and not in) also test IS NULL,
+        since SQL comparisons with NULL are never true.
+
+        :param negate: generate the filter of the negated expression
+        :return: OGR SQL string, or None when OGR cannot select a superset
+        of the rows (e.g. negated string operators, as LIKE ignores case)
+        """
+        raise NotImplementedError()
+
+
+class Clause(FilterExpression):
+    """
+    A single (attribute, operator, values) comparison.
+    """
+    def __init__(self, attribute, operator, values):
+        self.attribute = attribute
+        self.operator = operator.lower()
+        self.values = values
+        if self.operator not in selectivity and \
+                not sql_operator.match(self.operator):
+            raise GaiaException(
+                'Unsupported filter operator {}'.format(operator))
+
+    def __repr__(self):
+        return 'Clause({!r}, {!r}, {!r})'.format(
+            self.attribute, self.operator, self.values)
+
+    def attributes(self):
+        return set([self.attribute])
+
+    def estimate_selectivity(self):
+        estimate = selectivity.get(self.operator, default_selectivity)
+        if self.operator == "in":
+            estimate = min(1.0, estimate * len(self.values))
+        elif self.operator == "not in":
+            estimate = max(0.0, 1.0 - 0.05 * len(self.values))
+        return estimate
+
+    def evaluate(self, df, rows=None):
+        column = df[self.attribute]
+        if rows is not None:
+            column = column.iloc[rows]
+        if self.operator == "in":
+            result = column.isin(self.values)
+        elif self.operator == "not in":
+            result = ~column.isin(self.values)
+        elif self.operator not in selectivity:
+            raise GaiaException(
+                'Filter operator {} is only supported by SQL sources'.format(
+                    self.operator))
+        elif self.operator in str_ops:
+            # Literal matching, as with the LIKE patterns of to_sql/to_ogr
+            value = str(self.values)
+            if self.operator == "contains":
+                result = column.str.contains(value, regex=False)
+            else:
+                result = getattr(column.str, self.operator)(value)
+            result = result.fillna(False)
+        else:
+            result = ops[self.operator](column, self.values)
+        return np.asarray(result, dtype=bool)
+
+    def to_sql(self):
+        attribute = '"{}"'.format(self.attribute)
+        if self.operator in ("in", "not in"):
+            placeholders = ','.join(['%s' for x in self.values])
+            sql = '{} {} ({})'.format(
+                attribute, self.operator.upper(), placeholders)
+            return sql, list(self.values)
+        if self.operator in str_ops:
+            return '{} LIKE %s'.format(attribute), [self._like_pattern()]
+        if self.operator not in selectivity and \
+                isinstance(self.values, (list, tuple)):
+            placeholders = ','.join(['%s' for x in self.values])
+            sql = '{} {} ({})'.format(
+                attribute, self.operator.upper(), placeholders)
+            return sql, list(self.values)
+        return '{} {} %s'.format(attribute, self.operator.upper()), \
+            [self.values]
+
+    def to_ogr(self, negate=False):
+        if self.operator not in selectivity:
+            return None
+        attribute = '"{}"'.format(self.attribute)
+        # pandas keeps NULL values for != and not in, and drops them for
+        # all other operators (the other way around when negated)
+        keep_null = (self.operator in ("!=", "not in")) != negate
+        if self.operator in ("in", "not in"):
+            values = ','.join([_ogr_literal(x) for x in self.values])
+            negated = (self.operator == "not in") != negate
+            sql = '{} {}IN ({})'.format(
+                attribute, 'NOT ' if negated else '', values)
+        elif self.operator in str_ops:
+            if negate:
+                return None
+            sql = "{} LIKE {} ESCAPE '\\'".format(
+                attribute, _ogr_literal(self._like_pattern()))
+        else:
+            operator = '<>' if self.operator == '!=' else self.operator
+            if negate:
+                operator = negated_ops[self.operator]
+            sql = '{} {} {}'.format(
+                attribute, operator, _ogr_literal(self.values))
+        if keep_null:
+            sql = '({} OR {} IS NULL)'.format(sql, attribute)
+        return sql
+
+    def _like_pattern(self):
+        value = str(self.values)
+        for char in ('\\', '%', '_'):
+            value = value.replace(char, '\\' + char)
+        if self.operator == "startswith":
+            return value + '%'
+        elif self.operator == "endswith":
+            return '%' + value
+        return '%' + value + '%'
+
+
+class And(FilterExpression):
+    """
+    True where all child expressions are true.
+    """
+    sql_joiner = ' AND '
+
+    def __init__(self, *children):
+        self.children = list(children)
+
+    def __repr__(self):
+        return '{}({})'.format(
+            self.__class__.__name__,
+            ', '.join([repr(x) for x in self.children]))
+
+    def attributes(self):
+        return set().union(*[x.attributes() for x in self.children])
+
+    def estimate_selectivity(self):
+        estimate = 1.0
+        for child in self.children:
+            estimate *= child.estimate_selectivity()
+        return estimate
+
+    def optimize(self):
+        children = []
+        for child in self.children:
+            child = child.optimize()
+            if type(child) is type(self):
+                children.extend(child.children)
+            else:
+                children.append(child)
+        # Most selective first, so later clauses see the fewest rows
+        children.sort(key=lambda x: x.estimate_selectivity())
+        return self.__class__(*children)
+
+    def evaluate(self, df, rows=None):
+        count = len(df) if rows is None else len(rows)
+        mask = np.ones(count, dtype=bool)
+        for child in self.children:
+            live = np.flatnonzero(mask)
+            if len(live) == 0:
+                break
+            if len(live) == count:
+                mask &= child.evaluate(df, rows)
+            else:
+                subset = live if rows is None else rows[live]
+                mask[live] = child.evaluate(df, subset)
+        return mask
+
+    def to_sql(self):
+        sql_filters = []
+        sql_params = []
+        for child in self.children:
+            sql, params = child.to_sql()
+            sql_filters.append(sql)
+            sql_params.extend(params)
+        return '(' + self.sql_joiner.join(sql_filters) + ')', sql_params
+
+    def to_ogr(self, negate=False):
+        # De Morgan: NOT (a AND b) is (NOT a OR NOT b) and vice versa
+        joiner = self.sql_joiner
+        if negate:
+            joiner = ' OR ' if joiner == ' AND ' else ' AND '
+        sql_filters = [x.to_ogr(negate) for x in self.children]
+        if None in sql_filters:
+            # Dropping a term of an AND still selects a superset
+            if joiner == ' OR ':
+                return None
+            sql_filters = [x for x in sql_filters if x is not None]
+            if not sql_filters:
+                return None
+        return '(' + joiner.join(sql_filters) + ')'
+
+
+class Or(And):
+    """
+    True where any child expression is true.
+    """
+    sql_joiner = ' OR '
+
+    def estimate_selectivity(self):
+        estimate = 1.0
+        for child in self.children:
+            estimate *= 1.0 - child.estimate_selectivity()
+        return 1.0 - estimate
+
+    def optimize(self):
+        optimized = super(Or, self).optimize()
+        # Least selective first, so later clauses see the fewest rows
+        optimized.children.reverse()
+        return optimized
+
+    def evaluate(self, df, rows=None):
+        count = len(df) if rows is None else len(rows)
+        mask = np.zeros(count, dtype=bool)
+        for child in self.children:
+            live = np.flatnonzero(~mask)
+            if len(live) == 0:
+                break
+            if len(live) == count:
+                mask |= child.evaluate(df, rows)
+            else:
+                subset = live if rows is None else rows[live]
+                mask[live] = child.evaluate(df, subset)
+        return mask
+
+
+class Not(FilterExpression):
+    """
+    True where the child expression is false.
+    """
+    def __init__(self, child):
+        self.child = child
+
+    def __repr__(self):
+        return 'Not({!r})'.format(self.child)
+
+    def attributes(self):
+        return self.child.attributes()
+
+    def estimate_selectivity(self):
+        return 1.0 - self.child.estimate_selectivity()
+
+    def optimize(self):
+        child = self.child.optimize()
+        if isinstance(child, Not):
+            return child.child
+        return Not(child)
+
+    def evaluate(self, df, rows=None):
+        return ~self.child.evaluate(df, rows)
+
+    def to_sql(self):
+        sql, params = self.child.to_sql()
+        return 'NOT ({})'.format(sql), params
+
+    def to_ogr(self, negate=False):
+        return self.child.to_ogr(not negate)
+
+
+def _ogr_literal(value):
+    """
+    Format a python value as an OGR SQL literal
+    """
+    if isinstance(value, string_types):
+        return "'{}'".format(value.replace("'", "''"))
+    if isinstance(value, np.generic):
+        # numpy scalars (e.g. taken from a DataFrame) repr as np.int64(5)
+        value = value.item()
+    if isinstance(value, bool):
+        return str(int(value))
+    return repr(value)
+
+
+def _is_filter_list(filters):
+    return (isinstance(filters, (list, tuple)) and
+            not (len(filters) == 2 and isinstance(filters[0], string_types)
+                 and filters[0].lower() in joiners) and
+            not (len(filters) in (3, 4) and
+                 isinstance(filters[0], string_types) and
+                 isinstance(filters[1], string_types)))
+
+
+def parse_filters(filters):
+    r"""
+    Convert filters into a FilterExpression tree.
+
+    Accepts a FilterExpression, a single (attribute, operator, values)
+    clause, a nested ('and' | 'or', [filters]) or ('not', filter) tuple,
+    or a list of clauses as used by filter_pandas and filter_postgis.
+    In a list, an optional 4th clause element ('AND' or 'OR') sets the
+    joiner from that clause on, with AND binding tighter than OR.
+
+    :param filters: filters in any of the forms above, for example\
+    [('city', 'in', ['Boston', 'New York']), ('id', '>', 10)] or\
+    ('or', [('id', '<', 5), ('not', ('city', '=', 'Boston'))])
+    :return: FilterExpression
+    """
+    if isinstance(filters, FilterExpression):
+        return filters
+
+    if not isinstance(filters, (list, tuple)) or not filters:
+        raise GaiaException('Invalid filter {}'.format(filters))
+
+    if not _is_filter_list(filters):
+        if filters[0].lower() == "not":
+            return Not(parse_filters(filters[1]))
+        elif filters[0].lower() == "and":
+            return And(*[parse_filters(x) for x in filters[1]])
+        elif filters[0].lower() == "or":
+            return Or(*[parse_filters(x) for x in filters[1]])
+        return Clause(filters[0], filters[1], filters[2])
+
+    groups = [[]]
+    joiner = "and"
+    for filter in filters:
+        if not _is_filter_list(filter) and len(filter) > 3:
+            joiner = filter[3].strip().lower()
+        if joiner == "or" and groups[-1]:
+            groups.append([])
+        groups[-1].append(parse_filters(filter))
+    terms = [x[0] if len(x) == 1 else And(*x) for x in groups]
+    if len(terms) == 1:
+        return terms[0]
+    return Or(*terms)
+
+
+def compile_filters(filters):
+    """
+    Compile filters into a function returning a boolean row mask.
+
+    The filter tree is parsed and reordered by estimated selectivity once;
+    each call then evaluates the whole tree in a single pass, only testing
+    later clauses against the rows that can still change the result.
+
+    :param filters: filters in any form accepted by parse_filters
+    :return: function taking a DataFrame and returning a boolean array
+    """
+    expression = parse_filters(filters).optimize()
+
+    def filter_mask(df):
+        return expression.evaluate(df)
+    return filter_mask
+
 
 def filter_pandas(df, filters):
     r"""
     Filter a GeoPandas DataFrame, return a new filtered DataFrame.
-    Currently all filters are joined by 'AND'
-    TODO: Support for 'OR', parentheses?
+    Clauses may be combined with AND, OR and NOT (see parse_filters).
 
     :param df: The DataFrame to filter
     :param filters: An array of (attribute, operator, value) arrays\
     for example [('city', 'in', ['Boston', 'New York']), ('id', '>', 10)]
     :return: A filtered DataFrame
     """
-    for filter in filters:
-        attribute = filter[0]
-        operator = filter[1]
-        values = filter[2]
-        if operator.lower() == "in":
-            df = df[df[attribute].isin(values)]
-        elif operator.lower() == "not in":
-            df = df[~df[attribute].isin(values)]
-        elif operator.lower() in ["contains", "startswith", "endswith"]:
-            str_func = getattr(df[attribute].str, operator.lower())
-            df = df[str_func(r'{}'.format(values))]
-        elif operator in ops.keys():
-            df = df[ops[operator](df[attribute], values)]
-    return df
+    if not filters:
+        return df
+    return df[compile_filters(filters)(df)]
 
 
 def filter_postgis(filters):
     r"""
     Generate a SQL statement to be used as a WHERE clause.
-    TODO: Support parentheses?
 
     :param filters: list of filters in the form of
     (attribute, operator, values [, join option (AND, OR)])\
     for example [('city', 'in', ['Boston', 'New York']), ('id', '>', 10)]
+    or any other form accepted by parse_filters. Operators that pandas
+    cannot evaluate (e.g. 'ilike') are passed through to SQL.
     :return: SQL string and list of parameters
     """
-    sql_filters = None
-    sql_params = []
-    sql_joiner = ' AND '
-    for filter in filters:
-        attribute = filter[0]
-        operator = filter[1]
-        values = filter[2]
-        if len(filter) > 3:
-            sql_joiner = filter[3]
-        if type(values) in (list, tuple):
-            sql_filter = '"{}" {} ('.format(attribute, operator) + ','.join(
-                ['%s' for x in values]) + ')'
-            sql_params.extend(values)
-        else:
-            sql_filter = '"{}" {} %s'.format(attribute, operator)
-            sql_params.append(values)
-        if not sql_filters:
-            sql_filters = sql_filter
-        else:
-            sql_filters = sql_filters + sql_joiner + sql_filter
-    return sql_filters, sql_params
+    return parse_filters(filters).to_sql()
+
+
+def filter_ogr(filters):
+    r"""
+    Generate an OGR SQL attribute filter, as used by
+    ogr.Layer.SetAttributeFilter or the 'where' option of readers.
+
+    Note that OGR's LIKE is case-insensitive, so string operators select a
+    superset of the rows filter_pandas would; re-apply filter_pandas to the
+    result when exact matching is required. Negated string operators are
+    left out of the filter for the same reason.
+
+    :param filters: filters in any form accepted by parse_filters
+    :return: OGR SQL string, or None when nothing can be filtered by OGR
+    """
+    return parse_filters(filters).to_ogr()
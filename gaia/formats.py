@@ -29,8 +29,14 @@ JSON = ['.json', '.geojson']
 SHP = ['.shp']
 #: File extension for pandas dataframes
 PANDAS = ['pandas']
+#: File extensions for GeoParquet files
+PARQUET = ['.parquet', '.geoparquet']
+#: File extensions for Arrow IPC (Feather) files
+FEATHER = ['.feather', '.arrow']
+#: File extensions for columnar vector datasets
+COLUMNAR = PARQUET + FEATHER
 #: File extensions for all vector datasets
-VECTOR = list(itertools.chain.from_iterable([JSON, SHP, PANDAS]))
+VECTOR = list(itertools.chain.from_iterable([JSON, SHP, PANDAS, COLUMNAR]))
 #: File extensions for raster datasets
 GEOTIFF = ['.tif', '.tiff', '.geotif', '.geotiff']
 PNG = ['.png']
@@ -42,4 +48,4 @@ ALL = VECTOR + RASTER
 #: File extensions for text-based datasets
 TEXT = list(itertools.chain.from_iterable([JSON]))
 #: File extensions for bindary datasets
-BINARY = list(itertools.chain.from_iterable([RASTER, SHP]))
+BINARY = list(itertools.chain.from_iterable([RASTER, SHP, COLUMNAR]))
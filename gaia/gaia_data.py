@@ -3,18 +3,41 @@ from builtins import (
     bytes, str, open, super, range, zip, round, input, int, pow, object
 )
 
-from sqlalchemy import create_engine, MetaData, Table, text
-from geoalchemy2 import Geometry
+from collections import OrderedDict
+import uuid
+
+from sqlalchemy import text
 import fiona
 import geopandas
+import pandas
+import psycopg2
+from shapely import wkb
 try:
-    import osr
+    from shapely import from_wkb
 except ImportError:
-    from osgeo import osr
-
+    # shapely < 2.0 has no vectorized WKB decoding
+    from_wkb = None
 from gaia.filters import filter_postgis
-from gaia.geo.gdal_functions import gdal_reproject
-from gaia.util import GaiaException, sqlengines
+from gaia.geo.crs import get_epsg, transform_geometries
+from gaia.geo.gdal_functions import (
+    gdal_read_reduced,
+    gdal_reproject,
+    raster_to_numpy_array
+)
+from gaia import postgis_connection
+from gaia.util import GaiaException
+
+#: Default number of rows fetched per round-trip from a PostGIS cursor
+POSTGIS_BATCH_SIZE = 10000
+
+#: Maximum number of reprojected views cached per data object
+CRS_CACHE_SIZE = 4
+
+#: Map of spatial predicate names to PostGIS functions
+POSTGIS_PREDICATES = {
+    'within': 'ST_Within',
+    'intersects': 'ST_Intersects'
+}
 
 
 class GaiaDataObject(object):
@@ -25,6 +48,7 @@ class GaiaDataObject(object):
         self._datatype = None
         self._dataformat = dataFormat
         self._epsg = epsg
+        self._crs_views = OrderedDict()
 
     def get_metadata(self):
         if not self._metadata:
@@ -41,19 +65,72 @@ class GaiaDataObject(object):
 
     def set_data(self, data):
         self._data = data
+        self._crs_views.clear()
 
     def get_epsg(self):
         return self._epsg
 
-    def reproject(self, epsg):
-        repro = geopandas.GeoDataFrame.copy(self.get_data())
-        repro[repro.geometry.name] = repro.geometry.to_crs(epsg=epsg)
+    def in_crs(self, epsg):
+        """
+        Return this data projected to another CRS, without modifying this
+        object. Projections are cached, so repeated requests for the same
+        CRS are free; the least recently used of more than CRS_CACHE_SIZE
+        projections is dropped.
+
+        :param epsg: EPSG code of the CRS
+        :return: this object if already in that CRS, or a new data object
+        that must be treated as read-only
+        """
+        epsg = int(epsg)
+        current = self.get_epsg()
+        if current is not None and int(current) == epsg:
+            return self
+
+        view = self._crs_views.pop(epsg, None)
+        if view is None:
+            view = self._project(epsg)
+        self._crs_views[epsg] = view
+        while len(self._crs_views) > CRS_CACHE_SIZE:
+            self._crs_views.popitem(last=False)
+        return view
+
+    def _project(self, epsg):
+        """
+        Create a new data object with this (vector) data projected to epsg
+        """
+        projected = self._projected_data(epsg)
+        view = GaiaDataObject(dataFormat=self._dataformat, epsg=epsg)
+        view._data = projected
+        view._datatype = self._getdatatype()
+
+        xmin, ymin, xmax, ymax = projected.geometry.total_bounds
+        metadata = dict(self.get_metadata() or {})
+        metadata['bounds'] = {
+            'coordinates': [[
+                [xmin, ymin], [xmax, ymin], [xmax, ymax], [xmin, ymax]
+            ]]
+        }
+        view.set_metadata(metadata)
+        return view
+
+    def reproject(self, epsg, workers=None):
+        """
+        Reproject the data in place. Coordinates are transformed as flat
+        arrays, in chunks spread over a thread pool for large datasets;
+        only the geometry column is replaced, the rest of the data frame
+        is not copied.
+
+        :param epsg: EPSG code to reproject to
+        :param workers: number of threads (default one per CPU)
+        """
+        self._crs_views.clear()
+        repro = self.get_data()
+        repro[repro.geometry.name] = self._projected_geometry(epsg, workers)
         repro.crs = fiona.crs.from_epsg(epsg)
-        self._data = repro
         self._epsg = epsg
 
         # Recompute bounds
-        geometry = repro['geometry']
+        geometry = repro.geometry
         geopandas_bounds = geometry.total_bounds
         xmin, ymin, xmax, ymax = geopandas_bounds
         coords = [[
@@ -65,6 +142,30 @@ class GaiaDataObject(object):
         metadata['bounds'] = bounds
         self.set_metadata(metadata)
 
+    def _projected_data(self, epsg):
+        """
+        Copy of the (vector) data with its geometries transformed to epsg
+        """
+        data = self.get_data()
+        projected = geopandas.GeoDataFrame.copy(data)
+        projected[data.geometry.name] = self._projected_geometry(epsg)
+        projected.crs = fiona.crs.from_epsg(epsg)
+        return projected
+
+    def _projected_geometry(self, epsg, workers=None):
+        """
+        The (vector) geometries transformed to epsg, using the shared CRS
+        cache
+
+        :return: GeoSeries aligned with the data
+        """
+        data = self.get_data()
+        src = self.get_epsg() or data.crs
+        return geopandas.GeoSeries(
+            transform_geometries(data.geometry.values, src, epsg,
+                                 workers=workers),
+            index=data.index, crs=fiona.crs.from_epsg(epsg))
+
     def _getdatatype(self):
         if not self._datatype:
             self.get_metadata()
@@ -95,25 +196,96 @@ class GDALDataObject(GaiaDataObject):
         super(GDALDataObject, self).__init__(**kwargs)
         self._reader = reader
         self._epsgComputed = False
+        self._memmap = None
+
+    def get_data(self, resolution=None, target_shape=None,
+                 resampling='NEAREST'):
+        """
+        Return the GDAL dataset, or a reduced resolution in-memory copy of
+        it when a resolution or target shape is given. Reduced reads use
+        the best available overview level, so previews of large rasters
+        do not read full resolution pixels.
+
+        :param resolution: pixel size in the dataset CRS units, either a
+        single value or an (x, y) pair
+        :param target_shape: output size as (rows, columns)
+        :param resampling: NEAREST, BILINEAR, CUBIC, AVERAGE or MODE
+        :return: GDAL Dataset
+        """
+        data = super(GDALDataObject, self).get_data()
+        if resolution is None and target_shape is None:
+            return data
+        return gdal_read_reduced(data, target_shape=target_shape,
+                                 resolution=resolution, resampling=resampling)
+
+    def get_array(self, window=None, as_single_band=True, masked=False,
+                  old_nodata=None, new_nodata=None):
+        """
+        Read the raster into a numpy array of the bands' native data type
+
+        :param window: pixel window to read as (xoff, yoff, xsize, ysize)
+        (default None reads the whole raster)
+        :param as_single_band: return a 2D array of the first band (default
+        True); if False, a 3D (bands, rows, columns) array
+        :param masked: return a masked array with NoData pixels masked
+        :param old_nodata: NoData value, if not stored in the raster
+        :param new_nodata: value to replace NoData pixels with
+        :return: numpy array or masked array
+        """
+        return raster_to_numpy_array(
+            self.get_data(), as_single_band=as_single_band,
+            old_nodata=old_nodata, new_nodata=new_nodata,
+            window=window, masked=masked)
+
+    def get_memmap(self, as_single_band=True):
+        """
+        Band data as read-only views memory-mapped over the raster file,
+        which must be an uncompressed GeoTIFF. Only the parts of the file
+        that are accessed get paged in.
+
+        :param as_single_band: return the view of the first band (default
+        True); if False, a list with one view per band
+        :return: numpy.memmap view, or TiledBand for tiled rasters
+        """
+        from gaia.io.raster_memmap import memmap_bands
+        if self._memmap is None:
+            self._memmap = memmap_bands(self.get_data())
+        if as_single_band:
+            return self._memmap[0]
+        return self._memmap
 
     def get_epsg(self):
         if not self._epsgComputed:
             if not self._data:
                 self.get_data()
 
-            projection = self._data.GetProjection()
-            data_crs = osr.SpatialReference(wkt=projection)
-
-            try:
-                self.epsg = int(data_crs.GetAttrValue('AUTHORITY', 1))
-                self._epsgComputed = True
-            except KeyError:
+            epsg = get_epsg(self._data.GetProjection())
+            if epsg is None:
                 raise GaiaException("EPSG code coud not be determined")
+            self.epsg = epsg
+            self._epsgComputed = True
 
         return self.epsg
 
+    def _project(self, epsg):
+        """
+        Create a new data object with this raster warped to epsg
+        """
+        from gaia.io.gdal_reader import GaiaGDALReader
+        view = GDALDataObject(dataFormat=self._dataformat)
+        view._data = gdal_reproject(self.get_data(), '', epsg=epsg)
+        view.epsg = epsg
+        view._epsgComputed = True
+        view._datatype = self._getdatatype()
+
+        # Instantiate temporary reader to (only) parse metadata
+        GaiaGDALReader('internal.tif').load_metadata(view)
+        return view
+
     def reproject(self, epsg):
+        self._crs_views.clear()
         self._data = gdal_reproject(self._data, '', epsg=epsg)
+        self._memmap = None
         self.epsg = epsg
 
 
@@ -134,6 +306,11 @@ class PostgisDataObject(GaiaDataObject):
         self._epsg = None
         self._meta = None
         self._table_obj = None
+        self._batch_size = POSTGIS_BATCH_SIZE
+        self._spatial_filters = []
+        self._engine = None
+        self._pool_options = {}
+        self._geometry_type = None
 
     # Define table property
     def _settable(self, table):
@@ -207,6 +384,15 @@ class PostgisDataObject(GaiaDataObject):
 
     geom_column = property(_getgeom_column, _setgeom_column)
 
+    # Define batch_size property
+    def _setbatch_size(self, batch_size):
+        self._batch_size = int(batch_size)
+
+    def _getbatch_size(self):
+        return self._batch_size
+
+    batch_size = property(_getbatch_size, _setbatch_size)
+
     # Define engine property
     def _setengine(self, engine):
         self._engine = engine
@@ -216,8 +402,74 @@ class PostgisDataObject(GaiaDataObject):
 
     engine = property(_getengine, _setengine)
 
+    # Define pool_options property
+    def _setpool_options(self, pool_options):
+        self._pool_options = dict(pool_options or {})
+
+    def _getpool_options(self):
+        return self._pool_options
+
+    pool_options = property(_getpool_options, _setpool_options)
+
     # etc...
 
+    def copy(self):
+        """
+        Return a new, unloaded PostgisDataObject for the same table,
+        columns and filters
+
+        :return: PostgisDataObject
+        """
+        other = PostgisDataObject(reader=self._reader,
+                                  dataFormat=self._dataformat)
+        for attr in ('_table', '_hostname', '_dbname', '_user', '_password',
+                     '_filters', '_geom_column', '_epsg', '_batch_size',
+                     '_engine', '_datatype', '_pool_options',
+                     '_geometry_type', '_table_obj', '_meta'):
+            setattr(other, attr, getattr(self, attr))
+        other._columns = list(self._columns)
+        other._spatial_filters = list(self._spatial_filters)
+        return other
+
+    def add_spatial_filter(self, geometry, predicate='within', epsg=None):
+        """
+        Restrict the query to rows whose geometry satisfies a spatial
+        predicate against the given geometry. The test is evaluated by
+        PostGIS, behind a bounding box (&&) test that can use the geometry
+        column's spatial index.
+
+        :param geometry: shapely geometry
+        :param predicate: 'within' or 'intersects'
+        :param epsg: EPSG code of the geometry (default is the table's)
+        """
+        if predicate not in POSTGIS_PREDICATES:
+            raise GaiaException(
+                'Unsupported spatial predicate {}'.format(predicate))
+        self._spatial_filters.append((predicate, geometry.wkb, epsg))
+        self._data = None
+
+    def get_spatial_filter_sql(self):
+        """
+        Generate a SQL statement for the spatial filters
+
+        :return: SQL string (None if no spatial filters) and parameters
+        """
+        sql_filters = []
+        sql_params = []
+        for predicate, geometry_wkb, epsg in self._spatial_filters:
+            geometry_sql = 'ST_GeomFromWKB(%s, %s)'
+            params = [psycopg2.Binary(geometry_wkb), epsg or self._epsg]
+            if epsg and self._epsg and epsg != self._epsg:
+                geometry_sql = 'ST_Transform({}, %s)'.format(geometry_sql)
+                params.append(self._epsg)
+            sql_filters.append('"{0}" && {1} AND {2}("{0}", {1})'.format(
+                self._geom_column, geometry_sql,
+                POSTGIS_PREDICATES[predicate]))
+            sql_params.extend(params + params)
+        if not sql_filters:
+            return None, sql_params
+        return ' AND '.join(sql_filters), sql_params
+
     def initialize_engine(self):
         self._engine = self.get_engine(self.get_connection_string())
 
@@ -228,22 +480,22 @@ class PostgisDataObject(GaiaDataObject):
 
     def get_engine(self, connection_string):
         """
-        Create and return a SQLAlchemy engine object
+        Return the shared (pooled) SQLAlchemy engine object for a
+        connection string
 
         :param connection_string: Database connection string
         :return: SQLAlchemy Engine object
         """
-        if connection_string not in sqlengines:
-            sqlengines[connection_string] = create_engine(
-                self.get_connection_string())
-        return sqlengines[connection_string]
+        return postgis_connection.get_engine(
+            connection_string, **self._pool_options)
 
     def verify(self):
         """
         Make sure that all PostgisIO columns exist in the actual table
         """
+        table_columns = self._table_obj.columns.keys()
         for col in self._columns:
-            if col not in self._table_obj.columns.keys():
+            if col not in table_columns:
                 raise GaiaException('{} column not found in {}'.format(
                     col, self._table_obj))
 
@@ -253,17 +505,8 @@ class PostgisDataObject(GaiaDataObject):
 
         :return: Postgres connection string for SQLAlchemy
         """
-        auth = ''
-        if self._user:
-            auth = self._user
-        if self._password:
-            auth = auth + ':' + self._password
-        if auth:
-            auth += '@'
-        conn_string = 'postgresql://{auth}{host}/{dbname}'.format(
-            auth=auth, host=self._hostname, dbname=self._dbname)
-
-        return conn_string
+        return postgis_connection.get_connection_string(
+            self._hostname, self._dbname, self._user, self._password)
 
     def get_epsg(self):
         """
@@ -275,34 +518,23 @@ class PostgisDataObject(GaiaDataObject):
 
     def get_table_info(self):
         """
-        Use SQLALchemy reflection to gather data on the table, including the
-        geometry column, geometry type, and EPSG code, and assign to the
-        PostgisIO object's attributes.
+        Gather data on the table, including the geometry column, geometry
+        type, and EPSG code, and assign to the PostgisIO object's
+        attributes. Reflection results are cached per table for
+        postgis_connection.TABLE_INFO_TTL seconds.
         """
-        epsg = None
-        meta = MetaData()
-        table_obj = Table(self._table, meta,
-                          autoload=True, autoload_with=self._engine)
+        info = postgis_connection.get_table_info(self._engine, self._table)
         if not self._columns:
-            self._columns = table_obj.columns.keys()
-        geo_cols = [(col.name, col.type) for col in table_obj.columns
-                    if hasattr(col.type, 'srid')]
-        if geo_cols:
-            geo_col = geo_cols[0]
-            self._geom_column = geo_col[0]
-            geo_obj = geo_col[1]
+            self._columns = list(info['columns'])
+        if info['geom_column']:
+            self._geom_column = info['geom_column']
             if self._geom_column not in self._columns:
                 self._columns.append(self._geom_column)
-            if hasattr(geo_obj, 'srid'):
-                epsg = geo_obj.srid
-                if epsg == -1:
-                    epsg = 4326
-            if hasattr(geo_obj, 'geometry_type'):
-                self._geometry_type = geo_obj.geometry_type
+            self._geometry_type = info['geometry_type']
 
-        self._epsg = epsg
-        self._table_obj = table_obj
-        self._meta = meta
+        self._epsg = info['epsg']
+        self._table_obj = info['table']
+        self._meta = info['table'].metadata
 
     def get_geometry_type(self):
         """
@@ -312,18 +544,108 @@ class PostgisDataObject(GaiaDataObject):
         """
         return self._geometry_type
 
-    def get_query(self):
+    def get_query(self, binary_geometry=False):
         """
         Formulate a query string and parameter list based on the
         table name, columns, and filter
 
+        :param binary_geometry: Select the geometry column as WKB
+        (ST_AsBinary) instead of the database's native representation
         :return: Query string
         """
-        columns = ','.join(['"{}"'.format(x) for x in self._columns])
+        columns = []
+        for column in self._columns:
+            if binary_geometry and column == self._geom_column:
+                columns.append('ST_AsBinary("{0}") AS "{0}"'.format(column))
+            else:
+                columns.append('"{}"'.format(column))
+        columns = ','.join(columns)
         query = 'SELECT {} FROM "{}"'.format(columns, self._table)
+        where = []
         filter_params = []
         if self._filters:
             filter_sql, filter_params = filter_postgis(self._filters)
-            query += ' WHERE {}'.format(filter_sql)
+            where.append(filter_sql)
+        spatial_sql, spatial_params = self.get_spatial_filter_sql()
+        if spatial_sql:
+            where.append(spatial_sql)
+            filter_params.extend(spatial_params)
+        if where:
+            query += ' WHERE {}'.format(' AND '.join(where))
         query += ';'
         return str(text(query)), filter_params
+
+    def iter_data(self, batch_size=None):
+        """
+        Stream the query results as a series of GeoDataFrames.
+
+        Rows are read through a named (server-side) cursor, so at most one
+        batch of rows is held client-side at a time, and geometries are
+        transferred as binary WKB and decoded a batch at a time.
+
+        :param batch_size: Rows per chunk (default is the object's
+        batch_size)
+        :return: generator of GeoDataFrames
+        """
+        batch_size = batch_size or self._batch_size
+        query, params = self.get_query(binary_geometry=True)
+        query = query.rstrip(';')
+        crs = fiona.crs.from_epsg(self._epsg) if self._epsg else None
+
+        connection = self._engine.raw_connection()
+        try:
+            cursor = connection.cursor(
+                name='gaia_{}'.format(uuid.uuid4().hex))
+            cursor.itersize = batch_size
+            cursor.execute(query, params)
+            first = True
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows and not first:
+                    break
+                first = False
+                # Column names are only known after the first fetch
+                columns = [x[0] for x in cursor.description]
+                yield self._rows_to_dataframe(rows, columns, crs)
+                if len(rows) < batch_size:
+                    break
+            cursor.close()
+        finally:
+            connection.close()
+
+    def read_data(self, batch_size=None):
+        """
+        Read the query results into a single GeoDataFrame
+
+        :param batch_size: Rows fetched per round-trip
+        :return: GeoDataFrame
+        """
+        chunks = list(self.iter_data(batch_size))
+        if len(chunks) == 1:
+            return chunks[0]
+        data = pandas.concat(chunks, ignore_index=True)
+        return geopandas.GeoDataFrame(
+            data, geometry=self._geom_column, crs=chunks[0].crs)
+
+    def _rows_to_dataframe(self, rows, columns, crs):
+        """
+        Build a GeoDataFrame from one batch of cursor rows, decoding the
+        geometry column from WKB in bulk
+        """
+        df = pandas.DataFrame.from_records(rows, columns=columns)
+        df[self._geom_column] = decode_wkb(df[self._geom_column].values)
+        return geopandas.GeoDataFrame(
+            df, geometry=self._geom_column, crs=crs)
+
+
+def decode_wkb(values):
+    """
+    Decode an array of WKB buffers (bytes or memoryview) to geometries
+
+    :param values: sequence of WKB values, None for null geometries
+    :return: list or array of shapely geometries
+    """
+    values = [bytes(x) if x is not None else None for x in values]
+    if from_wkb is not None:
+        return from_wkb(values)
+    return [wkb.loads(x) if x is not None else None for x in values]
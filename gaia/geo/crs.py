@@ -0,0 +1,286 @@
+from __future__ import absolute_import, division, print_function
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+import threading
+
+import numpy as np
+try:
+    import osr
+except ImportError:
+    from osgeo import osr
+try:
+    import pyproj
+except ImportError:
+    pyproj = None
+try:
+    from shapely import get_coordinates, has_z, set_coordinates
+except ImportError:
+    # shapely < 2.0 has no vectorized coordinate access
+    get_coordinates = None
+from shapely.ops import transform as transform_geometry
+
+"""
+Shared cache of parsed spatial reference systems, EPSG identifications
+and coordinate transformations, so that code looping over many small
+objects does not rebuild the same CRS objects on every call.
+
+Cached osr.SpatialReference objects are shared and must not be modified.
+Transformation objects are not thread-safe, so they are cached per thread.
+"""
+
+#: Number of coordinates transformed per chunk (and per worker task)
+TRANSFORM_CHUNK_SIZE = 262144
+
+#: Parsed osr.SpatialReference objects, keyed by crs_key()
+srs_cache = {}
+
+#: EPSG codes identified for non-EPSG CRS definitions, keyed by crs_key()
+epsg_cache = {}
+
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def crs_key(crs):
+    """
+    Normalize a CRS definition to a hashable cache key
+
+    :param crs: EPSG code (int or string), 'EPSG:xxxx' string, WKT or
+    proj string, {'init': 'epsg:xxxx'} dict, osr.SpatialReference or
+    pyproj CRS
+    :return: 'EPSG:xxxx' or the WKT/proj definition string
+    """
+    if isinstance(crs, dict) and 'init' in crs:
+        crs = crs['init']
+    elif isinstance(crs, osr.SpatialReference):
+        crs = crs.ExportToWkt()
+    elif hasattr(crs, 'to_wkt'):
+        crs = crs.to_wkt()
+    if isinstance(crs, (int, np.integer)):
+        return 'EPSG:{}'.format(int(crs))
+
+    crs = str(crs).strip()
+    if crs.isdigit():
+        return 'EPSG:{}'.format(int(crs))
+    if crs.upper().startswith('EPSG:') and crs[5:].isdigit():
+        return 'EPSG:{}'.format(int(crs[5:]))
+    return crs
+
+
+def get_srs(crs):
+    """
+    Return the (shared) osr.SpatialReference for a CRS definition, with
+    traditional GIS (x=longitude, y=latitude) axis order
+
+    :param crs: any CRS definition accepted by crs_key()
+    :return: osr.SpatialReference, which must not be modified
+    """
+    key = crs_key(crs)
+    srs = srs_cache.get(key)
+    if srs is None:
+        srs = osr.SpatialReference()
+        if key.startswith('EPSG:'):
+            srs.ImportFromEPSG(int(key[5:]))
+        else:
+            srs.SetFromUserInput(key)
+        if hasattr(osr, 'OAMS_TRADITIONAL_GIS_ORDER'):
+            srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        with _lock:
+            srs = srs_cache.setdefault(key, srs)
+    return srs
+
+
+def get_wkt(crs):
+    """
+    Return the WKT string for a CRS definition
+
+    :param crs: any CRS definition accepted by crs_key()
+    :return: WKT string
+    """
+    return get_srs(crs).ExportToWkt()
+
+
+def get_epsg(crs):
+    """
+    Identify the EPSG code of a CRS definition (e.g. a raster's WKT)
+
+    :param crs: any CRS definition accepted by crs_key()
+    :return: EPSG code, or None if it could not be determined
+    """
+    key = crs_key(crs)
+    if key.startswith('EPSG:'):
+        return int(key[5:])
+    if key in epsg_cache:
+        return epsg_cache[key]
+
+    srs = get_srs(key)
+    code = srs.GetAttrValue('AUTHORITY', 1)
+    if code is None:
+        srs = srs.Clone()
+        try:
+            srs.AutoIdentifyEPSG()
+            code = srs.GetAuthorityCode(None)
+        except RuntimeError:
+            code = None
+    epsg = int(code) if code else None
+    with _lock:
+        epsg_cache[key] = epsg
+    return epsg
+
+
+def get_transformation(src, dst):
+    """
+    Return a cached osr.CoordinateTransformation between two CRSs, for
+    the calling thread
+
+    :param src: source CRS definition
+    :param dst: destination CRS definition
+    :return: osr.CoordinateTransformation
+    """
+    cache = _thread_cache('transformations')
+    key = (crs_key(src), crs_key(dst))
+    transformation = cache.get(key)
+    if transformation is None:
+        transformation = osr.CoordinateTransformation(
+            get_srs(src), get_srs(dst))
+        cache[key] = transformation
+    return transformation
+
+
+def get_transformer(src, dst):
+    """
+    Return a cached pyproj Transformer (x/y axis order) between two CRSs,
+    for the calling thread
+
+    :param src: source CRS definition
+    :param dst: destination CRS definition
+    :return: pyproj.Transformer, or None if pyproj is not installed
+    """
+    if pyproj is None:
+        return None
+    cache = _thread_cache('transformers')
+    key = (crs_key(src), crs_key(dst))
+    transformer = cache.get(key)
+    if transformer is None:
+        transformer = pyproj.Transformer.from_crs(
+            key[0], key[1], always_xy=True)
+        cache[key] = transformer
+    return transformer
+
+
+def transform_coordinates(coords, src, dst, workers=None,
+                          chunk_size=TRANSFORM_CHUNK_SIZE,
+                          use_processes=False):
+    """
+    Transform an array of coordinates between two CRSs
+
+    Arrays longer than chunk_size are split into chunks that are
+    transformed concurrently, by a thread pool (pyproj and GDAL release
+    the GIL while transforming) or optionally a process pool.
+
+    :param coords: (N, 2) or (N, 3) array of x, y(, z) coordinates
+    :param src: source CRS definition
+    :param dst: destination CRS definition
+    :param workers: number of workers (default one per CPU, 1 disables
+    the pool)
+    :param chunk_size: number of coordinates per chunk
+    :param use_processes: use a process pool instead of threads
+    :return: transformed (N, 2) or (N, 3) array
+    """
+    coords = np.asarray(coords, dtype=float)
+    src, dst = crs_key(src), crs_key(dst)
+    if len(coords) <= chunk_size or workers == 1:
+        return _transform_chunk((coords, src, dst))
+
+    workers = workers or multiprocessing.cpu_count()
+    starts = range(0, len(coords), chunk_size)
+    tasks = [(coords[i:i + chunk_size], src, dst) for i in starts]
+    executor = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    result = np.empty_like(coords)
+    with executor(max_workers=workers) as pool:
+        for start, chunk in zip(starts, pool.map(_transform_chunk, tasks)):
+            result[start:start + len(chunk)] = chunk
+    return result
+
+
+def _transform_chunk(task):
+    """
+    Transform one (coords, src, dst) chunk with the calling thread's
+    cached transformer
+    """
+    coords, src, dst = task
+    if not len(coords):
+        return coords
+    transformer = get_transformer(src, dst)
+    if transformer is not None:
+        return np.column_stack(transformer.transform(
+            *[coords[:, i] for i in range(coords.shape[1])]))
+
+    transformation = get_transformation(src, dst)
+    points = transformation.TransformPoints(coords.tolist())
+    return np.array(points, dtype=float)[:, :coords.shape[1]]
+
+
+def transform_geometries(geometries, src, dst, workers=None,
+                         chunk_size=TRANSFORM_CHUNK_SIZE,
+                         use_processes=False):
+    """
+    Transform an array of shapely geometries between two CRSs
+
+    With shapely 2, the coordinates of all geometries are transformed as
+    one flat array (see transform_coordinates for the chunking and worker
+    options) and written back into new geometries in a single call.
+
+    :param geometries: array of shapely geometries (or None)
+    :param src: source CRS definition
+    :param dst: destination CRS definition
+    :return: object array of transformed geometries
+    """
+    geometries = np.asarray(geometries, dtype=object)
+
+    if get_coordinates is not None:
+        result = geometries.copy()
+        three_d = has_z(geometries)
+        for mask, include_z in ((~three_d, False), (three_d, True)):
+            if not mask.any():
+                continue
+            selected = geometries[mask]
+            coords = transform_coordinates(
+                get_coordinates(selected, include_z=include_z), src, dst,
+                workers=workers, chunk_size=chunk_size,
+                use_processes=use_processes)
+            result[mask] = set_coordinates(selected, coords)
+        return result
+
+    def transform_xy(x, y, z=None):
+        coords = np.column_stack([x, y] if z is None else [x, y, z])
+        return tuple(transform_coordinates(coords, src, dst, workers=1).T)
+
+    result = np.empty(len(geometries), dtype=object)
+    for i, geom in enumerate(geometries):
+        if geom is not None and not geom.is_empty:
+            geom = transform_geometry(transform_xy, geom)
+        result[i] = geom
+    return result
+
+
+def clear_cache():
+    """
+    Forget all cached CRS objects and the calling thread's transformations
+    """
+    with _lock:
+        srs_cache.clear()
+        epsg_cache.clear()
+    _local.__dict__.clear()
+
+
+def _thread_cache(name):
+    """
+    Per-thread cache dict for objects that are not thread-safe
+    """
+    cache = getattr(_local, name, None)
+    if cache is None:
+        cache = {}
+        setattr(_local, name, cache)
+    return cache
@@ -16,17 +16,23 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 ###############################################################################
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import math
 import re
 import string
 import os
 import json
 import logging
+import tempfile
+import threading
 import gdalconst
 import numpy
 import gdal
 import shapely
 import rasterio
 import rasterio.features
+from gaia.geo.crs import get_transformation, get_wkt
 from gaia.util import (
     GaiaException,
     UnsupportedFormatException,
@@ -37,9 +43,13 @@ try:
 except ImportError:
     from osgeo import gdalnumeric
 import ogr
-import osr
 from PIL import Image, ImageDraw
-from osgeo.gdal_array import BandReadAsArray, BandWriteArray
+from osgeo import gdal_array
+from osgeo.gdal_array import (
+    BandReadAsArray,
+    BandWriteArray,
+    GDALTypeCodeToNumericTypeCode
+)
 import numpy as np
 from numpy.ma.core import MaskedConstant
 
@@ -67,6 +77,24 @@ driver_lookup = {
     'tiff': 'GTiff'
 }
 
+#: Map of resampling names to GDAL RasterIO resampling algorithms
+read_resampling_lookup = {
+    'NEAREST': 'GRIORA_NearestNeighbour',
+    'BILINEAR': 'GRIORA_Bilinear',
+    'CUBIC': 'GRIORA_Cubic',
+    'AVERAGE': 'GRIORA_Average',
+    'MODE': 'GRIORA_Mode'
+}
+
+#: Size (in pixels) of the coarsest overview level built by default
+OVERVIEW_MIN_SIZE = 256
+
+#: Maximum number of threads reading parts of a raster window in parallel
+WINDOW_READ_WORKERS = 8
+
+#: Serializes remote reads that set process-wide options (GDAL < 3.6)
+_vsicurl_lock = threading.Lock()
+
 
 def register_driver_name(fileExt, driverName):
     driver_lookup[fileExt] = driverName
@@ -90,47 +118,173 @@ def write_dataset(raster_dataset, filepath, fileFormat=None):
 
 
 def raster_to_numpy_array(raster_data, as_single_band=True,
-                          old_nodata=None, new_nodata=None):
+                          old_nodata=None, new_nodata=None,
+                          window=None, masked=False):
     """
     Convert raster output to numpy array output
 
+    Bands are read straight into one preallocated band-interleaved
+    (bands, rows, columns) array of the bands' native data type, so no
+    float64 copy of the raster is ever made.
+
     :param raster_data: Original raster output dataset
     :param as_single_band: Output data as 2D array of its first band
     (default is True). If False, returns full 3D array.
     :param old_nodata: Explicitly identify existing NoData values
     (default None). If None, attempts to get existing NoData values stored
-    in the raster band.
+    in the raster band (or its mask band).
     :param new_nodata: Replace NoData values in each band with new_nodata
-    (default None). If new_nodata is not None but old_nodata is None
-    and no existing NoData value is stored in the band, uses unchanged
-    default ReadAsArray() return values.
+    (default None). The array is only promoted to a wider data type if
+    new_nodata does not fit the band data type.
+    :param window: pixel window to read as (xoff, yoff, xsize, ysize)
+    (default None reads the whole raster)
+    :param masked: return a numpy masked array in which NoData pixels are
+    masked (default False)
     :return: Converted numpy array dataset
     """
-    bands = as_single_band + (1 - as_single_band) * raster_data.RasterCount
-    nrow = raster_data.RasterYSize
-    ncol = raster_data.RasterXSize
-    dims = (bands, nrow, ncol)
+    dataset = get_dataset(raster_data)
+    xoff, yoff, xsize, ysize = _check_window(dataset, window)
+    band_count = 1 if as_single_band else dataset.RasterCount
+    bands = [dataset.GetRasterBand(i + 1) for i in range(band_count)]
+
+    dtype = np.result_type(
+        *[GDALTypeCodeToNumericTypeCode(b.DataType) for b in bands])
+    if new_nodata is not None:
+        nodata_type = np.min_scalar_type(new_nodata)
+        if nodata_type.kind == 'f':
+            # There is no GDAL type for float16
+            nodata_type = np.promote_types(nodata_type, np.float32)
+        dtype = np.promote_types(dtype, nodata_type)
+
+    out_data_array = np.empty((band_count, ysize, xsize), dtype=dtype)
+    valid = None
+    if masked or new_nodata is not None:
+        valid = np.ones(out_data_array.shape, dtype=bool)
+
+    for i, band in enumerate(bands):
+        band.ReadAsArray(xoff, yoff, xsize, ysize,
+                         buf_obj=out_data_array[i])
+        if valid is not None:
+            band_valid = _band_validity(
+                band, out_data_array[i], (xoff, yoff, xsize, ysize),
+                old_nodata)
+            if band_valid is not None:
+                valid[i] = band_valid
+
+    if new_nodata is not None and not valid.all():
+        out_data_array[~valid] = new_nodata
+        logger.debug('NoData: Replaced {} with {}'.format(
+            old_nodata, new_nodata))
+
+    if masked:
+        mask = np.ma.nomask if valid.all() else ~valid
+        out_data_array = np.ma.MaskedArray(
+            out_data_array, mask=mask, copy=False)
 
-    out_data_array = np.full(dims, np.nan)
+    if as_single_band:
+        return out_data_array[0]
+    else:
+        return out_data_array
 
-    for i in range(bands):
-        srcband = raster_data.GetRasterBand(i + 1)
-        srcband_array = np.array(srcband.ReadAsArray().astype(np.float))
-        if old_nodata is None:
-            old_nodata = srcband.GetNoDataValue()
-        if new_nodata is not None and old_nodata is not None:
-            if np.isnan(old_nodata):
-                srcband_array[np.isnan(srcband_array)] = new_nodata
-            else:
-                srcband_array[srcband_array == old_nodata] = new_nodata
-            print('NoData: Replaced ' + str(old_nodata) +
-                  ' with ' + str(new_nodata))
-        out_data_array[i, :, :] = srcband_array
+
+def numpy_to_dataset(array, geotransform=None, projection=None,
+                     nodata=None):
+    """
+    Wrap a numpy array as a GDAL dataset without copying it
+
+    The dataset references the array buffer (and keeps the array alive),
+    so changes to the array are visible through the dataset.
+
+    :param array: 2D (rows, columns) or 3D (bands, rows, columns) array
+    :param geotransform: GDAL geotransform (6 numbers)
+    :param projection: EPSG code or WKT string of the array CRS
+    :param nodata: NoData value set on every band
+    :return: GDAL Dataset
+    """
+    if array.ndim not in (2, 3):
+        raise GaiaException(
+            'Expected a 2D or 3D array, got {} dimensions'.format(array.ndim))
+    if gdal_array.NumericTypeCodeToGDALTypeCode(array.dtype.type) is None:
+        raise GaiaException(
+            'Unsupported array data type {}'.format(array.dtype))
+
+    dataset = gdal_array.OpenArray(array)
+    if dataset is None:
+        raise GaiaException('Could not open array as a GDAL dataset')
+
+    if geotransform is not None:
+        if len(geotransform) != 6:
+            raise GaiaException('A geotransform needs 6 values')
+        dataset.SetGeoTransform([float(x) for x in geotransform])
+    if projection is not None:
+        dataset.SetProjection(get_wkt(projection))
+    if nodata is not None:
+        for i in range(dataset.RasterCount):
+            dataset.GetRasterBand(i + 1).SetNoDataValue(float(nodata))
+    return dataset
+
+
+def raster_validity_mask(raster_data, as_single_band=True, window=None):
+    """
+    Read the validity masks of raster bands, without reading band data
+    for bands that have no NoData pixels
+
+    :param raster_data: GDAL Dataset or file path to raster image
+    :param as_single_band: Output mask of the first band only (default
+    True). If False, returns a 3D (bands, rows, columns) array.
+    :param window: pixel window to read as (xoff, yoff, xsize, ysize)
+    :return: boolean numpy array, True for valid pixels
+    """
+    dataset = get_dataset(raster_data)
+    xoff, yoff, xsize, ysize = _check_window(dataset, window)
+    band_count = 1 if as_single_band else dataset.RasterCount
+    valid = np.ones((band_count, ysize, xsize), dtype=bool)
+    for i in range(band_count):
+        band = dataset.GetRasterBand(i + 1)
+        if not band.GetMaskFlags() & gdal.GMF_ALL_VALID:
+            mask_band = band.GetMaskBand()
+            valid[i] = mask_band.ReadAsArray(xoff, yoff, xsize, ysize) > 0
 
     if as_single_band:
-        return out_data_array[0, :, :]
+        return valid[0]
     else:
-        return out_data_array
+        return valid
+
+
+def _check_window(dataset, window):
+    """
+    Validate a pixel window against the raster size
+
+    :return: (xoff, yoff, xsize, ysize) tuple, the whole raster if window
+    is None
+    """
+    if window is None:
+        return 0, 0, dataset.RasterXSize, dataset.RasterYSize
+    xoff, yoff, xsize, ysize = [int(x) for x in window]
+    if (xoff < 0 or yoff < 0 or xsize < 1 or ysize < 1 or
+            xoff + xsize > dataset.RasterXSize or
+            yoff + ysize > dataset.RasterYSize):
+        raise GaiaException(
+            'Window {} is outside the raster bounds'.format(window))
+    return xoff, yoff, xsize, ysize
+
+
+def _band_validity(band, band_array, window, nodata=None):
+    """
+    Validity mask of a band read, computed from the NoData value when
+    there is one and read from the GDAL mask band otherwise
+
+    :return: boolean array, or None if all pixels are valid
+    """
+    if nodata is None and band.GetMaskFlags() & gdal.GMF_NODATA:
+        nodata = band.GetNoDataValue()
+    if nodata is not None:
+        if np.isnan(nodata):
+            return ~np.isnan(band_array)
+        return band_array != nodata
+    if band.GetMaskFlags() & gdal.GMF_ALL_VALID:
+        return None
+    return band.GetMaskBand().ReadAsArray(*window) > 0
 
 
 def gdal_reproject(src, dst,
@@ -150,9 +304,7 @@ def gdal_reproject(src, dst,
     src_ds = get_dataset(src)
 
     # Define target SRS
-    dst_srs = osr.SpatialReference()
-    dst_srs.ImportFromEPSG(int(epsg))
-    dst_wkt = dst_srs.ExportToWkt()
+    dst_wkt = get_wkt(int(epsg))
 
     # Resampling might be passed as a string
     if not isinstance(resampling, int):
@@ -201,6 +353,370 @@ def gdal_resize(raster, dimensions, projection, transform):
     return resized_ds
 
 
+def overview_factors(width, height, min_size=OVERVIEW_MIN_SIZE):
+    """
+    Overview decimation factors (2, 4, 8...) down to a level that fits
+    within min_size pixels
+
+    :param width: raster width in pixels
+    :param height: raster height in pixels
+    :param min_size: size of the coarsest level (e.g. one tile)
+    :return: list of factors, empty if the raster is already small enough
+    """
+    factors = []
+    factor = 2
+    while max(width, height) / float(factor // 2) > min_size:
+        factors.append(factor)
+        factor *= 2
+    return factors
+
+
+def gdal_build_overviews(raster, factors=None, resampling='AVERAGE',
+                         external=False, min_size=OVERVIEW_MIN_SIZE):
+    """
+    Build an overview pyramid for a raster dataset
+
+    Internal overviews are written into the raster file itself, which is
+    reopened in update mode. External overviews are written to a sidecar
+    .ovr file and leave the raster file untouched. Datasets that are not
+    backed by a file (e.g. in-memory datasets) keep their overviews in
+    memory.
+
+    :param raster: GDAL Dataset or file path to raster image
+    :param factors: decimation factors, e.g. [2, 4, 8] (default computed
+    with overview_factors())
+    :param resampling: GDAL overview resampling method
+    :param external: write a .ovr file instead of internal overviews
+    :param min_size: size of the coarsest level when computing factors
+    :return: GDAL Dataset with the overviews available
+    """
+    dataset = get_dataset(raster)
+    if factors is None:
+        factors = overview_factors(
+            dataset.RasterXSize, dataset.RasterYSize, min_size)
+    if not factors:
+        return dataset
+
+    path = dataset.GetDescription()
+    if dataset.GetDriver().ShortName != 'MEM' and os.path.isfile(path):
+        # A read-only handle makes GDAL write external overviews
+        access = gdalconst.GA_ReadOnly if external else gdalconst.GA_Update
+        dataset = gdal.Open(path, access)
+
+    dataset.BuildOverviews(resampling.upper(), list(factors))
+    dataset.FlushCache()
+    return dataset
+
+
+def reduced_shape(width, height, max_size):
+    """
+    Output shape for reading a raster so that its longer side is at most
+    max_size pixels, keeping the aspect ratio
+
+    :return: (rows, columns) tuple
+    """
+    scale = min(1.0, max_size / float(max(width, height)))
+    return (max(1, int(round(height * scale))),
+            max(1, int(round(width * scale))))
+
+
+def gdal_read_reduced(raster, target_shape=None, resolution=None,
+                      resampling='NEAREST'):
+    """
+    Read a raster at reduced resolution
+
+    Pixels are read from the coarsest overview level that is still at
+    least as fine as the requested output, falling back to a downsampled
+    (buffer-size) read of the full resolution bands when there are no
+    suitable overviews. Requests finer than the raster return it as is.
+
+    :param raster: GDAL Dataset or file path to raster image
+    :param target_shape: output size as (rows, columns)
+    :param resolution: output pixel size in raster CRS units, either a
+    single value or an (x, y) pair; ignored if target_shape is given
+    :param resampling: one of NEAREST, BILINEAR, CUBIC, AVERAGE, MODE
+    :return: in-memory GDAL Dataset
+    """
+    dataset = get_dataset(raster)
+    width, height = dataset.RasterXSize, dataset.RasterYSize
+    geo_trans = dataset.GetGeoTransform()
+
+    if target_shape is not None:
+        out_height, out_width = [int(x) for x in target_shape]
+    elif resolution is not None:
+        if not hasattr(resolution, '__iter__'):
+            resolution = (resolution, resolution)
+        x_res, y_res = [abs(float(x)) for x in resolution]
+        out_width = int(math.ceil(width * abs(geo_trans[1]) / x_res))
+        out_height = int(math.ceil(height * abs(geo_trans[5]) / y_res))
+    else:
+        return dataset
+
+    out_width = max(1, min(width, out_width))
+    out_height = max(1, min(height, out_height))
+    if out_width == width and out_height == height:
+        return dataset
+
+    try:
+        resample_alg = getattr(
+            gdal, read_resampling_lookup[resampling.upper()])
+    except KeyError:
+        raise GaiaException(
+            'Unsupported resampling method {}'.format(resampling))
+
+    first_band = dataset.GetRasterBand(1)
+    overview = _best_overview(first_band, out_width, out_height)
+
+    output_dataset = gdal.GetDriverByName('MEM').Create(
+        '', out_width, out_height, dataset.RasterCount, first_band.DataType)
+    x_scale = width / float(out_width)
+    y_scale = height / float(out_height)
+    output_dataset.SetGeoTransform((
+        geo_trans[0], geo_trans[1] * x_scale, geo_trans[2] * y_scale,
+        geo_trans[3], geo_trans[4] * x_scale, geo_trans[5] * y_scale))
+    output_dataset.SetProjection(dataset.GetProjection())
+
+    for i in range(dataset.RasterCount):
+        band = dataset.GetRasterBand(i + 1)
+        source = band if overview is None else band.GetOverview(overview)
+        data = source.ReadRaster(
+            0, 0, source.XSize, source.YSize, out_width, out_height,
+            resample_alg=resample_alg)
+
+        out_band = output_dataset.GetRasterBand(i + 1)
+        out_band.WriteRaster(0, 0, out_width, out_height, data)
+        out_band.SetColorInterpretation(band.GetColorInterpretation())
+        nodata_value = band.GetNoDataValue()
+        if nodata_value is not None:
+            out_band.SetNoDataValue(nodata_value)
+
+    return output_dataset
+
+
+def _best_overview(band, width, height):
+    """
+    Index of the coarsest overview of a band that is at least width by
+    height pixels, or None if there is no such overview
+    """
+    best, best_size = None, None
+    for i in range(band.GetOverviewCount()):
+        overview = band.GetOverview(i)
+        if overview.XSize < width or overview.YSize < height:
+            continue
+        if best is None or overview.XSize < best_size:
+            best, best_size = i, overview.XSize
+    return best
+
+
+@contextmanager
+def vsicurl_options(url, headers=None):
+    """
+    Context for reading a remote raster with HTTP range requests, so that
+    only the parts of the file that are read get transferred. Datasets
+    opened from the path must be read (and closed) within the context.
+
+    The headers are sent only with the requests for this url: with GDAL
+    >= 3.6 they are set for the path only, and older versions get them
+    from a temporary header file set process-wide (and serialized) for
+    the duration of the context. The options and the header file are
+    removed on exit.
+
+    :param url: http(s) url of the raster file
+    :param headers: dict of HTTP headers (e.g. for authentication) sent
+    with every request for the url
+    :return: /vsicurl/ path to open with GDAL
+    """
+    path = '/vsicurl/{}'.format(url)
+    options = {
+        # The url is a single file; don't probe for sidecar files
+        'GDAL_DISABLE_READDIR_ON_OPEN': 'EMPTY_DIR'
+    }
+    lines = ['{}: {}'.format(k, v) for k, v in (headers or {}).items()]
+
+    if hasattr(gdal, 'SetPathSpecificOption'):
+        if lines:
+            options['GDAL_HTTP_HEADERS'] = '\r\n'.join(lines)
+        for key, value in options.items():
+            gdal.SetPathSpecificOption(path, key, value)
+        try:
+            yield path
+        finally:
+            for key in options:
+                gdal.SetPathSpecificOption(path, key, None)
+        return
+
+    # GDAL < 3.6 only reads extra headers from a file
+    header_file = None
+    with _vsicurl_lock:
+        if lines:
+            fd, header_file = tempfile.mkstemp(suffix='.txt')
+            with os.fdopen(fd, 'w') as fp:
+                fp.write('\n'.join(lines))
+            options['GDAL_HTTP_HEADER_FILE'] = header_file
+        previous = {key: gdal.GetConfigOption(key) for key in options}
+        try:
+            for key, value in options.items():
+                gdal.SetConfigOption(key, value)
+            yield path
+        finally:
+            for key, value in previous.items():
+                gdal.SetConfigOption(key, value)
+            if header_file is not None:
+                os.remove(header_file)
+
+
+def pixel_window(raster, bounds):
+    """
+    Pixel window of a raster that intersects a bounding box, with the
+    pixels partially covered by the box included
+
+    :param raster: GDAL Dataset or path to raster image
+    :param bounds: (min x, min y, max x, max y) in the raster's CRS
+    :return: (xoff, yoff, xsize, ysize), or None if bounds miss the raster
+    """
+    dataset = get_dataset(raster)
+    width, height = dataset.RasterXSize, dataset.RasterYSize
+    geo_trans = dataset.GetGeoTransform()
+    if geo_trans[2] or geo_trans[4]:
+        raise GaiaException('Cannot read a window of a rotated raster')
+
+    min_x, min_y, max_x, max_y = bounds
+    cols = sorted((geo_trans[0], geo_trans[0] + geo_trans[1] * width))
+    rows = sorted((geo_trans[3], geo_trans[3] + geo_trans[5] * height))
+    x0 = int(math.floor((max(min_x, cols[0]) - geo_trans[0]) / geo_trans[1]))
+    x1 = int(math.ceil((min(max_x, cols[1]) - geo_trans[0]) / geo_trans[1]))
+    y0 = int(math.floor((min(max_y, rows[1]) - geo_trans[3]) / geo_trans[5]))
+    y1 = int(math.ceil((max(min_y, rows[0]) - geo_trans[3]) / geo_trans[5]))
+    x0, x1 = max(0, min(x0, x1)), min(width, max(x0, x1))
+    y0, y1 = max(0, min(y0, y1)), min(height, max(y0, y1))
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def gdal_read_window(raster, bounds, workers=WINDOW_READ_WORKERS):
+    """
+    Read the pixels of a raster that intersect a bounding box
+
+    The window is split into chunks aligned with the raster's blocks,
+    which are read concurrently, each thread with its own dataset handle.
+    For remote (/vsicurl/) rasters this fetches only the blocks that
+    intersect the window, in parallel range requests.
+
+    :param raster: GDAL Dataset or path to raster image
+    :param bounds: (min x, min y, max x, max y) in the raster's CRS
+    :param workers: maximum number of reading threads
+    :return: in-memory GDAL Dataset, or None if bounds miss the raster
+    """
+    dataset = get_dataset(raster)
+    window = pixel_window(dataset, bounds)
+    if window is None:
+        return None
+    return gdal_read_pixels(dataset, window, workers)
+
+
+def gdal_read_pixels(raster, window, workers=WINDOW_READ_WORKERS):
+    """
+    Read a pixel window of a raster into an in-memory dataset, in
+    concurrent block-aligned chunks (see gdal_read_window)
+
+    :param raster: GDAL Dataset or path to raster image
+    :param window: (xoff, yoff, xsize, ysize) in pixels
+    :param workers: maximum number of reading threads
+    :return: in-memory GDAL Dataset
+    """
+    dataset = get_dataset(raster)
+    x0, y0, xsize, ysize = _check_window(dataset, window)
+    x1, y1 = x0 + xsize, y0 + ysize
+    geo_trans = dataset.GetGeoTransform()
+
+    first_band = dataset.GetRasterBand(1)
+    output_dataset = gdal.GetDriverByName('MEM').Create(
+        '', x1 - x0, y1 - y0, dataset.RasterCount, first_band.DataType)
+    output_dataset.SetGeoTransform((
+        geo_trans[0] + x0 * geo_trans[1], geo_trans[1], 0,
+        geo_trans[3] + y0 * geo_trans[5], 0, geo_trans[5]))
+    output_dataset.SetProjection(dataset.GetProjection())
+    for i in range(dataset.RasterCount):
+        band = dataset.GetRasterBand(i + 1)
+        out_band = output_dataset.GetRasterBand(i + 1)
+        out_band.SetColorInterpretation(band.GetColorInterpretation())
+        nodata_value = band.GetNoDataValue()
+        if nodata_value is not None:
+            out_band.SetNoDataValue(nodata_value)
+
+    # Chunks of whole block rows, enough to keep the workers busy
+    block_y = first_band.GetBlockSize()[1]
+    start = y0 - y0 % block_y
+    block_rows = int(math.ceil((y1 - start) / float(block_y)))
+    chunk_rows = block_y * max(1, int(math.ceil(
+        block_rows / float(max(1, workers)))))
+    chunks = [(max(y, y0), min(y + chunk_rows, y1))
+              for y in range(start, y1, chunk_rows)]
+
+    path = dataset.GetDescription()
+    local = threading.local()
+
+    def read_chunk(chunk):
+        if not hasattr(local, 'dataset'):
+            local.dataset = gdal.Open(path, gdalconst.GA_ReadOnly)
+        return local.dataset.ReadRaster(
+            x0, chunk[0], x1 - x0, chunk[1] - chunk[0])
+
+    if len(chunks) > 1 and workers > 1 and path and \
+            dataset.GetDriver().ShortName != 'MEM':
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            data = list(executor.map(read_chunk, chunks))
+    else:
+        data = [dataset.ReadRaster(x0, c[0], x1 - x0, c[1] - c[0])
+                for c in chunks]
+
+    for chunk, chunk_data in zip(chunks, data):
+        output_dataset.WriteRaster(
+            0, chunk[0] - y0, x1 - x0, chunk[1] - chunk[0], chunk_data)
+    return output_dataset
+
+
+def gdal_preview_image(raster):
+    """
+    Render a (small) raster dataset as an 8-bit PIL image, stretching
+    each band between its minimum and maximum. Single band rasters become
+    greyscale, rasters with three or more bands RGB, and NoData pixels
+    are transparent.
+
+    :param raster: GDAL Dataset or file path to raster image
+    :return: PIL Image in LA or RGBA mode
+    """
+    dataset = get_dataset(raster)
+    band_count = 3 if dataset.RasterCount >= 3 else 1
+    channels = []
+    valid = np.ones(
+        (dataset.RasterYSize, dataset.RasterXSize), dtype=bool)
+    for i in range(band_count):
+        band = dataset.GetRasterBand(i + 1)
+        band_array = band.ReadAsArray().astype(np.float32)
+        nodata_value = band.GetNoDataValue()
+        if nodata_value is not None:
+            valid &= band_array != nodata_value
+        valid &= np.isfinite(band_array)
+        channels.append(band_array)
+
+    scaled = []
+    for band_array in channels:
+        if valid.any():
+            low = band_array[valid].min()
+            high = band_array[valid].max()
+        else:
+            low = high = 0
+        span = (high - low) or 1
+        band_array = np.clip((band_array - low) * (255.0 / span), 0, 255)
+        scaled.append(np.where(valid, band_array, 0).astype(np.uint8))
+    scaled.append((valid * 255).astype(np.uint8))
+
+    # Two channels make an LA image, four an RGBA image
+    return Image.fromarray(np.dstack(scaled))
+
+
 def gdal_clip(raster_input, raster_output, polygon_json, nodata=0):
     """
     This function will subset a raster by a vector polygon.
@@ -532,15 +1048,55 @@ def gdal_calc(calculation, raster_output, rasters,
     return output_dataset
 
 
-def gdal_zonalstats(zones, raster):
+def gdal_zonalstats(zones, raster, resolution=None, target_shape=None):
     """
     Return a list of zonal statistics.
 
     :param zones: vector dataset in JSON format representing polygons (zones)
     :param raster: Raster file to generate statistics from in each polygon
+    :param resolution: compute statistics at this (coarser) pixel size
+    :param target_shape: compute statistics on a raster of this
+    (rows, columns) size
     :return: list of polygon features with statistics properties appended.
     """
-    return list(gen_zonalstats(zones, raster))
+    return list(gen_zonalstats(zones, raster, resolution=resolution,
+                               target_shape=target_shape))
+
+
+def gdal_stats(raster, resolution=None, target_shape=None):
+    """
+    Return summary statistics for each band of a raster, optionally
+    computed from a reduced resolution read
+
+    :param raster: GDAL Dataset or file path to raster image
+    :param resolution: compute statistics at this (coarser) pixel size
+    :param target_shape: compute statistics on a raster of this
+    (rows, columns) size
+    :return: list of dicts (count, min, max, mean, stddev), one per band
+    """
+    dataset = gdal_read_reduced(
+        raster, target_shape=target_shape, resolution=resolution)
+    stats = []
+    for i in range(dataset.RasterCount):
+        band = dataset.GetRasterBand(i + 1)
+        band_array = numpy.ma.masked_invalid(
+            band.ReadAsArray().astype(numpy.float64))
+        nodata_value = band.GetNoDataValue()
+        if nodata_value is not None:
+            band_array = numpy.ma.masked_equal(band_array, nodata_value)
+        count = int(band_array.count())
+        if not count:
+            stats.append({'count': 0, 'min': None, 'max': None,
+                          'mean': None, 'stddev': None})
+            continue
+        stats.append({
+            'count': count,
+            'min': float(band_array.min()),
+            'max': float(band_array.max()),
+            'mean': float(band_array.mean()),
+            'stddev': float(band_array.std())
+        })
+    return stats
 
 
 def rasterio_bbox(raster_input):
@@ -576,19 +1132,23 @@ def rasterio_footprint(raster_input):
         return list(shape.minimum_rotated_rectangle.exterior.coords)
 
 
-def gen_zonalstats(zones_json, raster):
+def gen_zonalstats(zones_json, raster, resolution=None, target_shape=None):
     """
     Generator function that yields the statistics of a raster dataset
     within each polygon (zone) of a vector dataset.
 
     :param zones_json: Polygons in GeoJSON format
     :param raster: Raster dataset
+    :param resolution: compute statistics at this (coarser) pixel size
+    :param target_shape: compute statistics on a raster of this
+    (rows, columns) size
     :return: Polygons with additional properties for calculated raster stats.
     """
     global_transform = True
 
-    # Open data
-    raster = get_dataset(raster)
+    # Open data, at reduced resolution if requested
+    raster = gdal_read_reduced(
+        raster, target_shape=target_shape, resolution=resolution)
     if type(zones_json) is str:
         shp = ogr.Open(zones_json)
         zones_json = json.loads(zones_json)
@@ -606,12 +1166,11 @@ def gen_zonalstats(zones_json, raster):
 
     # Reproject vector geometry to same projection as raster
     sourceSR = lyr.GetSpatialRef()
-    targetSR = osr.SpatialReference()
-    targetSR.ImportFromWkt(raster.GetProjectionRef())
-    coordTrans = osr.CoordinateTransformation(sourceSR, targetSR)
+    raster_wkt = get_wkt(raster.GetProjectionRef())
+    coordTrans = get_transformation(sourceSR, raster_wkt)
 
     # Check for matching spatial references
-    differing_SR = (sourceSR.ExportToWkt() != targetSR.ExportToWkt())
+    differing_SR = (get_wkt(sourceSR) != raster_wkt)
 
     # TODO: Use a multiprocessing pool to process features more quickly
     for feat, feature in zip(lyr, zones_json['features']):
@@ -693,9 +1252,7 @@ def gen_zonalstats(zones_json, raster):
         mem_layer.CreateFeature(feat.Clone())
 
         # Create for target raster the same projection as for the value raster
-        raster_srs = osr.SpatialReference()
-        raster_srs.ImportFromWkt(raster.GetProjectionRef())
-        target_ds.SetProjection(raster_srs.ExportToWkt())
+        target_ds.SetProjection(raster_wkt)
 
         # Rasterize zone polygon to raster
         gdal.RasterizeLayer(target_ds, [1], mem_layer, burn_values=[1])
@@ -0,0 +1,249 @@
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import glob
+import os
+
+import gdal
+import rasterio.features
+from rasterio.transform import Affine
+from shapely.geometry import mapping
+
+import gaia
+from gaia.gaia_data import GDALDataObject
+from gaia.geo.gdal_functions import (
+    gdal_read_pixels, get_dataset, pixel_window)
+from gaia.io.writers import write_raster_object
+from gaia.util import GaiaException
+
+"""
+Scatter-gather crop of a raster by a polygon, for running on many cluster
+tasks at once.
+
+The pixel window of the crop geometry is split into strips of whole block
+rows. Every task computes the same plan, crops the strip selected by its
+task index and writes it as a GeoTIFF tile; a final step mosaics the tiles
+into a VRT or a (cloud-optimized) GeoTIFF. slurm_commands() generates the
+job script lines, e.g.
+
+    srun -n 8 -c 1 -u python -m gaia.geo.tiled_crop tile --tiles 8 \\
+        input.tif crop_geometry.geojson tiles
+    srun -n 1 -c 1 -u python -m gaia.geo.tiled_crop merge --tiles 8 \\
+        tiles output.tif
+"""
+
+#: Name of the tile written by each task
+TILE_NAME = 'tile_{:04d}.tif'
+
+#: Creation options of the tiles
+TILE_OPTIONS = ['TILED=YES', 'COMPRESS=DEFLATE', 'BIGTIFF=IF_SAFER']
+
+#: Environment variables holding the task index, by priority
+TASK_INDEX_VARIABLES = ('SLURM_ARRAY_TASK_ID', 'SLURM_PROCID')
+
+
+def task_index():
+    """
+    Index of the calling task, from the job array index or the srun task
+    rank (0 outside of SLURM)
+    """
+    for variable in TASK_INDEX_VARIABLES:
+        if os.environ.get(variable):
+            return int(os.environ[variable])
+    return 0
+
+
+def plan_tiles(raster, bounds, tiles):
+    """
+    Split the pixel window of a bounding box into strips
+
+    Strip edges fall on block row boundaries when the strips are at least
+    one block high, so that no block is read by two tasks.
+
+    :param raster: GDAL Dataset or path to raster image
+    :param bounds: (min x, min y, max x, max y) in the raster's CRS
+    :param tiles: number of strips (fewer are planned for small windows)
+    :return: list of (xoff, yoff, xsize, ysize) pixel windows
+    """
+    window = pixel_window(raster, bounds)
+    if window is None:
+        return []
+    xoff, yoff, xsize, ysize = window
+    block_y = get_dataset(raster).GetRasterBand(1).GetBlockSize()[1]
+    step = ysize / float(max(1, tiles))
+    edges = [yoff]
+    for i in range(1, max(1, tiles)):
+        edge = yoff + int(round(i * step))
+        if step >= block_y:
+            edge = int(round(edge / float(block_y))) * block_y
+        if edges[-1] < edge < yoff + ysize:
+            edges.append(edge)
+    edges.append(yoff + ysize)
+    return [(xoff, y0, xsize, y1 - y0) for y0, y1 in zip(edges, edges[1:])]
+
+
+def crop_tile(raster, geometry, window, output_path, workers=1):
+    """
+    Crop one pixel window of a raster, setting the pixels outside of the
+    geometry to NoData. The tile is written even when it misses the
+    geometry, so that the mosaic covers the whole crop window.
+
+    :param raster: GDAL Dataset or path to raster image
+    :param geometry: shapely geometry in the raster's CRS
+    :param window: (xoff, yoff, xsize, ysize) in pixels
+    :param output_path: GeoTIFF file path of the tile
+    :param workers: maximum number of reading threads
+    :return: output_path
+    """
+    dataset = gdal_read_pixels(raster, window, workers)
+    outside = rasterio.features.geometry_mask(
+        [mapping(geometry)], out_shape=(window[3], window[2]),
+        transform=Affine.from_gdal(*dataset.GetGeoTransform()))
+
+    for i in range(dataset.RasterCount):
+        band = dataset.GetRasterBand(i + 1)
+        nodata = band.GetNoDataValue()
+        if nodata is None:
+            nodata = 0
+            band.SetNoDataValue(nodata)
+        array = band.ReadAsArray()
+        array[outside] = nodata
+        band.WriteArray(array)
+
+    output_dataset = gdal.GetDriverByName('GTiff').CreateCopy(
+        output_path, dataset, strict=0, options=TILE_OPTIONS)
+    output_dataset = None  # writes to disk  # noqa: F841
+    return output_path
+
+
+def run_tile(input_path, geometry_path, tile_dir, tiles, index=None,
+             workers=1):
+    """
+    Crop the tile of one task
+
+    :param input_path: raster file path
+    :param geometry_path: vector file with the crop geometry
+    :param tile_dir: directory receiving the tiles
+    :param tiles: total number of tiles
+    :param index: tile index (default: from the SLURM environment)
+    :param workers: maximum number of reading threads
+    :return: path of the tile, or None if there is no tile to write
+    """
+    if index is None:
+        index = task_index()
+    raster = gaia.create(input_path)
+    clip = gaia.create(geometry_path)
+    if clip.get_epsg() != raster.get_epsg():
+        clip = clip.in_crs(raster.get_epsg())
+    geometry = clip.get_data().geometry.unary_union
+
+    dataset = raster.get_data()
+    plan = plan_tiles(dataset, geometry.bounds, tiles)
+    tile_path = os.path.join(tile_dir, TILE_NAME.format(index))
+    if index >= len(plan):
+        # Drop the tile an earlier job may have left in tile_dir
+        if os.path.exists(tile_path):
+            os.remove(tile_path)
+        return None
+    if not os.path.isdir(tile_dir):
+        try:
+            os.makedirs(tile_dir)
+        except OSError:
+            # Created by another task meanwhile
+            pass
+    return crop_tile(dataset, geometry, plan[index], tile_path, workers)
+
+
+def merge_tiles(tile_dir, output_path, cog=False, tiles=None):
+    """
+    Mosaic the tiles of a tile directory
+
+    :param tile_dir: directory holding the tiles
+    :param output_path: .vrt file referencing the tiles, or GeoTIFF file
+    :param cog: write a cloud-optimized GeoTIFF
+    :param tiles: number of tiles of the run; tiles with higher indexes
+    (left by an earlier job in tile_dir) are ignored (default: merge all
+    tiles of tile_dir)
+    :return: output_path
+    """
+    if tiles is None:
+        paths = sorted(glob.glob(os.path.join(tile_dir, TILE_NAME.replace(
+            '{:04d}', '[0-9]' * 4))))
+    else:
+        paths = [os.path.join(tile_dir, TILE_NAME.format(i))
+                 for i in range(tiles)]
+        paths = [path for path in paths if os.path.exists(path)]
+    if not paths:
+        raise GaiaException(
+            'No tiles in {} (the geometry misses the raster?)'.format(
+                tile_dir))
+
+    if os.path.splitext(output_path)[1].lower() == '.vrt':
+        vrt = gdal.BuildVRT(output_path, paths)
+        vrt = None  # writes to disk  # noqa: F841
+        return output_path
+
+    mosaic = GDALDataObject()
+    mosaic.set_data(gdal.BuildVRT('', paths))
+    write_raster_object(mosaic, output_path, cog=cog, tiled=not cog)
+    return output_path
+
+
+def slurm_commands(input_path, geometry_path, output_path, tiles,
+                   cog=False, tile_dir='tiles', python='python'):
+    """
+    Job script lines running a tiled crop as tiles parallel srun tasks,
+    followed by the merge step
+
+    :return: list of command strings
+    """
+    module = '{} -m gaia.geo.tiled_crop'.format(python)
+    return [
+        'srun -n {} -c 1 -u {} tile --tiles {} {} {} {}'.format(
+            tiles, module, tiles, input_path, geometry_path, tile_dir),
+        'srun -n 1 -c 1 -u {} merge --tiles {} {} {}{}'.format(
+            module, tiles, tile_dir, output_path, ' --cog' if cog else '')
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Crop a raster tile by tile on parallel tasks.')
+    subparsers = parser.add_subparsers(dest='step')
+
+    tile_parser = subparsers.add_parser(
+        'tile', help='crop the tile of this task')
+    tile_parser.add_argument('input', help='raster file')
+    tile_parser.add_argument('geometry', help='crop geometry file')
+    tile_parser.add_argument('tile_dir', help='output tile directory')
+    tile_parser.add_argument('--tiles', type=int, required=True,
+                             help='total number of tiles')
+    tile_parser.add_argument('--index', type=int,
+                             help='tile index (default: SLURM task index)')
+    tile_parser.add_argument('--workers', type=int, default=1,
+                             help='reading threads')
+
+    merge_parser = subparsers.add_parser(
+        'merge', help='mosaic the tiles')
+    merge_parser.add_argument('tile_dir', help='tile directory')
+    merge_parser.add_argument('output', help='.vrt or .tif output file')
+    merge_parser.add_argument('--cog', action='store_true',
+                              help='write a cloud-optimized GeoTIFF')
+    merge_parser.add_argument('--tiles', type=int,
+                              help='total number of tiles (default: all '
+                              'tiles in the directory)')
+
+    args = parser.parse_args(argv)
+    if args.step == 'tile':
+        path = run_tile(args.input, args.geometry, args.tile_dir,
+                        args.tiles, args.index, args.workers)
+        print('Wrote {}'.format(path) if path else 'No tile to write')
+    elif args.step == 'merge':
+        print('Wrote {}'.format(
+            merge_tiles(args.tile_dir, args.output, args.cog, args.tiles)))
+    else:
+        parser.error('missing step (tile or merge)')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,10 +3,19 @@ from builtins import (
     bytes, str, open, super, range, zip, round, input, int, pow, object
 )
 import json
+import os
 import urllib
 
+import numpy as np
+from shapely.geometry import box, shape
+from shapely.geometry.base import BaseGeometry
+
 from gaia.gaia_data import GaiaDataObject
+from gaia.geo.gdal_functions import vsicurl_options
+from gaia.io.girder_cache import get_download_cache, get_metadata_cache
 from gaia.io.girder_interface import GirderInterface
+from gaia.util import GaiaException
+import gaia.formats as formats
 
 
 class GirderDataObject(GaiaDataObject):
@@ -18,19 +27,42 @@ class GirderDataObject(GaiaDataObject):
         """
 
         Optional bounds input provided because some girder assetstores
-        are not configured for geometa
+        are not configured for geometa. Optional updated input (the
+        item's 'updated' timestamp, e.g. from a folder listing) validates
+        cached metadata without contacting girder; otherwise the timestamp
+        is fetched with the item.
         """
         self._reader = reader
         self.resource_type = resource_type
         self.resource_id = resource_id
         self.mapnik_style = None
         self.bounds = kwargs.get('bounds')
+        self.updated = kwargs.get('updated')
+        self._local = None  # local data object, see materialize()
+        self._files = None  # girder file objects of the item
         # print('Created girder object, resource_id: {}'.format(resource_id))
 
     def get_metadata(self, force=False):
+        """Returns the item's geometa, from the persistent metadata cache
+        when possible
+
+        :param force: (bool) if true, refetch geometa from girder
+        """
         if force or not self._metadata:
+            cache = get_metadata_cache()
             gc = GirderInterface._get_girder_client()
-            metadata = gc.get('item/{}/geometa'.format(self.resource_id))
+            updated = self.updated
+            if updated is None:
+                # Validate the cache with the item's current timestamp,
+                # rather than trusting entries for the whole cache ttl
+                updated = gc.get(
+                    'item/{}'.format(self.resource_id)).get('updated')
+            metadata = None
+            if not force:
+                metadata = cache.get(self.resource_id, updated)
+            if metadata is None:
+                metadata = gc.get('item/{}/geometa'.format(self.resource_id))
+                cache.put(self.resource_id, updated, metadata)
             # print('returned metadata: {}'.format(metadata))
             self._metadata = metadata
 
@@ -39,6 +71,78 @@ class GirderDataObject(GaiaDataObject):
                 self._metadata['bounds'] = geom
         return self._metadata
 
+    def get_data(self, *args, **kwargs):
+        """Returns the item's data, read from a local copy
+
+        See materialize(); arguments are passed to the local data object.
+        """
+        return self.materialize().get_data(*args, **kwargs)
+
+    def materialize(self):
+        """Returns a local data object for the item
+
+        The item's files are downloaded into the local download cache
+        (unless already cached) and read with the reader for the file
+        type, so that the data can be used by local gaia processes.
+        """
+        if self._local is None:
+            # Local import, the readers module imports this one
+            from gaia.io.readers import GaiaReader
+            self._local = GaiaReader(self.local_path()).read()
+        return self._local
+
+    def local_path(self):
+        """Returns the local path of the item's data file
+
+        The item's files are downloaded together into one directory of
+        the download cache (unless already cached), so that the other
+        files of the item (e.g. of a shapefile) are next to it.
+        """
+        if self.resource_type != 'item':
+            raise GaiaException('Only girder items can be materialized')
+
+        girder = GirderInterface.get_instance()
+        paths = get_download_cache().fetch(self.get_files(), girder.transport)
+
+        data_paths = [path for path in paths
+                      if os.path.splitext(path)[1].lower() in formats.ALL]
+        if not data_paths:
+            raise GaiaException(
+                'No readable file in girder item {}'.format(self.resource_id))
+        return data_paths[0]
+
+    def get_files(self):
+        """Returns the girder file objects of the item
+        """
+        if self._files is None:
+            gc = GirderInterface._get_girder_client()
+            self._files = gc.get(
+                'item/{}/files'.format(self.resource_id),
+                parameters={'limit': 0})
+        return self._files
+
+    def vsicurl_options(self):
+        """Returns a context yielding a GDAL /vsicurl/ path for reading
+        the item's raster file directly from girder, with range requests
+        (see gdal_functions.vsicurl_options)
+
+        The girder token is sent as a header, not in the url.
+        """
+        rasters = [f for f in self.get_files()
+                   if os.path.splitext(f['name'])[1].lower()
+                   in formats.RASTER]
+        if not rasters:
+            raise GaiaException(
+                'No raster file in girder item {}'.format(self.resource_id))
+
+        transport = GirderInterface.get_instance().transport
+        url = transport.url('file/{}/download'.format(rasters[0]['_id']))
+        headers = {}
+        token = transport.session.headers.get('Girder-Token')
+        if token:
+            headers['Girder-Token'] = token
+        return vsicurl_options(url, headers)
+
     def set_mapnik_style(self, style):
         """A convenience method for applying mapnik styles for large-image
 
@@ -97,3 +201,117 @@ class GirderDataObject(GaiaDataObject):
             'type': 'Polygon'
         }
         return geom
+
+
+class GirderFolderObject(GirderDataObject):
+    """Proxies a girder folder as a collection of items (e.g. scenes)
+
+    The geometa of all items is fetched concurrently (and cached) to build
+    the combined extent of the folder and an in-memory index of the item
+    bounds, so that the items intersecting an area of interest can be
+    selected before any data is downloaded. Items without geometa are
+    left out. Bounds are in the geometa CRS (EPSG:4326).
+    """
+    def __init__(self, reader, resource_id, **kwargs):
+        super(GirderFolderObject, self).__init__(
+            reader, 'folder', resource_id, **kwargs)
+        self._items = None  # girder item objects
+        self._geometa = None  # geometa of each item
+        self._footprints = None  # shapely bounds geometry of each item
+        self._index = None  # (items, 4) array of xmin, ymin, xmax, ymax
+
+    def get_metadata(self, force=False):
+        """Returns the combined metadata of the folder's items
+
+        :param force: (bool) if true, list the folder again
+        """
+        if force or not self._metadata:
+            self._load_items()
+            metadata = {'items': len(self._items)}
+            if len(self._index):
+                extent = [self._index[:, 0].min(), self._index[:, 1].min(),
+                          self._index[:, 2].max(), self._index[:, 3].max()]
+                metadata['bounds'] = self._bounds_to_geom(
+                    [float(x) for x in extent])
+            types = set(g.get('type_') for g in self._geometa)
+            if len(types) == 1:
+                metadata['type_'] = types.pop()
+            self._metadata = metadata
+        return self._metadata
+
+    def get_data(self, *args, **kwargs):
+        raise GaiaException(
+            'Girder folders have no data; select() items first')
+
+    def get_items(self):
+        """Returns data objects for all items with geometa
+        """
+        self.get_metadata()
+        return [self._item_object(i) for i in range(len(self._items))]
+
+    def select(self, aoi):
+        """Returns data objects for the items intersecting an area of
+        interest, without downloading any data
+
+        :param aoi: GeoJSON geometry (dict), shapely geometry,
+            [xmin, ymin, xmax, ymax] in EPSG:4326, or vector GaiaDataObject
+        :return: list of GirderDataObject, with their metadata loaded
+        """
+        self.get_metadata()
+        geometry = self._aoi_geometry(aoi)
+        xmin, ymin, xmax, ymax = geometry.bounds
+        index = self._index
+        candidates = np.nonzero(
+            (index[:, 0] <= xmax) & (index[:, 2] >= xmin) &
+            (index[:, 1] <= ymax) & (index[:, 3] >= ymin))[0]
+        return [self._item_object(i) for i in candidates
+                if self._footprints[i].intersects(geometry)]
+
+    def _load_items(self):
+        """Lists the folder and builds the bounds index
+
+        For internal use
+        """
+        girder = GirderInterface.get_instance()
+        items = list(girder.iter_items(self.resource_id))
+        geometa = girder.lookup_geometa(items, missing_ok=True)
+
+        self._items, self._geometa, self._footprints = [], [], []
+        for item, item_geometa in zip(items, geometa):
+            bounds = (item_geometa or {}).get('bounds')
+            if not bounds or not bounds.get('coordinates'):
+                continue
+            self._items.append(item)
+            self._geometa.append(item_geometa)
+            self._footprints.append(shape(
+                {'type': bounds.get('type', 'Polygon'),
+                 'coordinates': bounds['coordinates']}))
+        self._index = np.array(
+            [f.bounds for f in self._footprints], dtype=float).reshape(-1, 4)
+
+    def _item_object(self, i):
+        """Creates the data object for the i-th item
+
+        For internal use
+        """
+        item = self._items[i]
+        data_object = GirderDataObject(
+            self._reader, 'item', item['_id'], updated=item.get('updated'))
+        data_object.set_metadata(dict(self._geometa[i]))
+        return data_object
+
+    @staticmethod
+    def _aoi_geometry(aoi):
+        """Converts an area of interest to a shapely geometry
+
+        For internal use
+        """
+        if isinstance(aoi, GaiaDataObject):
+            return aoi.in_crs(4326).get_data().geometry.unary_union
+        if isinstance(aoi, BaseGeometry):
+            return aoi
+        if isinstance(aoi, dict):
+            return shape(aoi.get('geometry', aoi))
+        if len(aoi) == 4:
+            return box(*aoi)
+        raise GaiaException('Unsupported area of interest')
@@ -0,0 +1,241 @@
+from __future__ import absolute_import, division, print_function
+
+import json
+
+import geopandas
+import numpy as np
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.feather
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+try:
+    import pyproj
+except ImportError:
+    pyproj = None
+
+import gaia.formats as formats
+from gaia.gaia_data import decode_wkb
+from gaia.util import GaiaException, UnsupportedFormatException
+
+"""
+Columnar (GeoParquet and Arrow IPC/Feather) storage for vector data.
+
+Geometries are stored as WKB in a binary column and described by
+GeoParquet 'geo' metadata, including a per-row bounding box column (the
+GeoParquet 1.1 "bbox covering"). Parquet row-group statistics on that
+column let a bbox read skip whole row groups without decoding them.
+"""
+
+#: Name of the per-row bounding box column
+BBOX_COLUMN = 'bbox'
+
+#: Default number of rows per Parquet row group
+ROW_GROUP_SIZE = 65536
+
+#: GeoParquet specification version written
+GEOPARQUET_VERSION = '1.1.0'
+
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise GaiaException(
+            'pyarrow is required for GeoParquet and Feather support')
+
+
+def is_parquet(filename):
+    return '.{}'.format(filename.rsplit('.', 1)[-1]) in formats.PARQUET
+
+
+def write_columnar(data, filename, epsg=None, row_group_size=ROW_GROUP_SIZE,
+                   compression=None):
+    """
+    Write a GeoDataFrame to GeoParquet or Feather, chosen by file extension
+
+    :param data: GeoDataFrame
+    :param filename: output path (.parquet, .geoparquet, .feather, .arrow)
+    :param epsg: EPSG code of the geometries
+    :param row_group_size: rows per Parquet row group
+    :param compression: codec (default snappy for Parquet, lz4 for Feather)
+    """
+    _require_pyarrow()
+    geom_column = data.geometry.name
+    bounds = data.geometry.bounds
+    frame = data.drop(columns=[geom_column])
+    if BBOX_COLUMN in frame.columns:
+        raise GaiaException(
+            'Column name {} is reserved for bounding boxes'.format(
+                BBOX_COLUMN))
+
+    table = pyarrow.Table.from_pandas(frame, preserve_index=False)
+    wkb = [geom.wkb if geom is not None else None for geom in data.geometry]
+    table = table.append_column(
+        geom_column, pyarrow.array(wkb, type=pyarrow.binary()))
+    bbox = pyarrow.StructArray.from_arrays(
+        [pyarrow.array(bounds[x].values, type=pyarrow.float64())
+         for x in ('minx', 'miny', 'maxx', 'maxy')],
+        names=['xmin', 'ymin', 'xmax', 'ymax'])
+    table = table.append_column(BBOX_COLUMN, bbox)
+
+    metadata = dict(table.schema.metadata or {})
+    metadata[b'geo'] = json.dumps(
+        _geo_metadata(data, geom_column, epsg)).encode('utf-8')
+    metadata[b'gaia'] = json.dumps({'epsg': epsg}).encode('utf-8')
+    table = table.replace_schema_metadata(metadata)
+
+    if is_parquet(filename):
+        pyarrow.parquet.write_table(
+            table, filename, row_group_size=row_group_size,
+            compression=compression or 'snappy')
+    else:
+        pyarrow.feather.write_feather(
+            table, filename, compression=compression or 'lz4')
+
+
+def _geo_metadata(data, geom_column, epsg):
+    """
+    Build the GeoParquet 'geo' metadata for a GeoDataFrame
+    """
+    geom_types = sorted(set(
+        [x for x in data.geometry.geom_type.unique() if x]))
+    column = {
+        'encoding': 'WKB',
+        'geometry_types': geom_types,
+        'covering': {
+            'bbox': dict([(x, [BBOX_COLUMN, x])
+                          for x in ('xmin', 'ymin', 'xmax', 'ymax')])
+        }
+    }
+    if len(data):
+        column['bbox'] = [float(x) for x in data.geometry.total_bounds]
+    if epsg and pyproj is not None:
+        column['crs'] = pyproj.CRS.from_epsg(int(epsg)).to_json_dict()
+    return {
+        'version': GEOPARQUET_VERSION,
+        'primary_column': geom_column,
+        'columns': {geom_column: column}
+    }
+
+
+def read_columnar(filename, columns=None, bbox=None):
+    """
+    Read a GeoParquet or Feather file into a GeoDataFrame
+
+    :param filename: input path
+    :param columns: attribute columns to read (default all); the geometry
+    column is always read
+    :param bbox: optional (xmin, ymin, xmax, ymax); only features whose
+    bounding box intersects it are returned
+    :return: GeoDataFrame and EPSG code (or None)
+    """
+    _require_pyarrow()
+    if is_parquet(filename):
+        parquet_file = pyarrow.parquet.ParquetFile(filename)
+        schema = parquet_file.schema_arrow
+    else:
+        table = pyarrow.feather.read_table(filename, memory_map=True)
+        schema = table.schema
+
+    metadata = schema.metadata or {}
+    if b'geo' not in metadata:
+        raise UnsupportedFormatException(
+            '{} has no GeoParquet metadata'.format(filename))
+    geo = json.loads(metadata[b'geo'].decode('utf-8'))
+    geom_column = geo['primary_column']
+    has_bbox = BBOX_COLUMN in schema.names
+
+    read_columns = None
+    if columns is not None:
+        read_columns = [x for x in columns if x != geom_column]
+        read_columns.append(geom_column)
+        if bbox is not None and has_bbox:
+            read_columns.append(BBOX_COLUMN)
+
+    if is_parquet(filename):
+        row_groups = list(range(parquet_file.num_row_groups))
+        if bbox is not None and has_bbox:
+            row_groups = _select_row_groups(parquet_file, bbox)
+        table = parquet_file.read_row_groups(
+            row_groups, columns=read_columns)
+    elif read_columns is not None:
+        table = table.select(read_columns)
+
+    if bbox is not None and has_bbox:
+        table = table.filter(_bbox_mask(table.column(BBOX_COLUMN), bbox))
+    geometry = decode_wkb(table.column(geom_column).to_pylist())
+    frame = table.select([x for x in table.column_names
+                          if x not in (geom_column, BBOX_COLUMN)]).to_pandas()
+    frame[geom_column] = geometry
+    epsg = _get_epsg(metadata, geo, geom_column)
+    crs = 'epsg:{}'.format(epsg) if epsg else None
+    data = geopandas.GeoDataFrame(frame, geometry=geom_column, crs=crs)
+    if bbox is not None and not has_bbox:
+        data = data.cx[bbox[0]:bbox[2], bbox[1]:bbox[3]]
+    return data, epsg
+
+
+def _select_row_groups(parquet_file, bbox):
+    """
+    Return indices of row groups whose bbox column statistics intersect
+    the given bbox
+    """
+    xmin, ymin, xmax, ymax = bbox
+    paths = dict([('{}.{}'.format(BBOX_COLUMN, x), x)
+                  for x in ('xmin', 'ymin', 'xmax', 'ymax')])
+    selected = []
+    metadata = parquet_file.metadata
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        stats = {}
+        for j in range(row_group.num_columns):
+            column = row_group.column(j)
+            if column.path_in_schema in paths and column.is_stats_set:
+                stats[paths[column.path_in_schema]] = column.statistics
+        if len(stats) == 4 and (
+                stats['xmin'].min > xmax or stats['ymin'].min > ymax or
+                stats['xmax'].max < xmin or stats['ymax'].max < ymin):
+            continue
+        selected.append(i)
+    return selected
+
+
+def _bbox_mask(bbox_column, bbox):
+    """
+    Boolean mask of rows whose bounding box intersects bbox
+    """
+    xmin, ymin, xmax, ymax = bbox
+    compute = pyarrow.compute
+    if isinstance(bbox_column, pyarrow.ChunkedArray):
+        bbox_column = bbox_column.combine_chunks()
+    mask = np.logical_and.reduce([
+        compute.less_equal(bbox_column.field('xmin'), xmax).to_numpy(
+            zero_copy_only=False),
+        compute.less_equal(bbox_column.field('ymin'), ymax).to_numpy(
+            zero_copy_only=False),
+        compute.greater_equal(bbox_column.field('xmax'), xmin).to_numpy(
+            zero_copy_only=False),
+        compute.greater_equal(bbox_column.field('ymax'), ymin).to_numpy(
+            zero_copy_only=False)
+    ])
+    return pyarrow.array(mask)
+
+
+def _get_epsg(metadata, geo, geom_column):
+    """
+    Find the EPSG code recorded by gaia or in the GeoParquet crs
+    """
+    if b'gaia' in metadata:
+        epsg = json.loads(metadata[b'gaia'].decode('utf-8')).get('epsg')
+        if epsg:
+            return int(epsg)
+    crs = geo['columns'].get(geom_column, {}).get('crs')
+    if crs and isinstance(crs, dict):
+        crs_id = crs.get('id', {})
+        if crs_id.get('authority') == 'EPSG':
+            return int(crs_id['code'])
+    elif 'crs' not in geo['columns'].get(geom_column, {}):
+        # GeoParquet default is OGC:CRS84 (lon/lat)
+        return 4326
+    return None
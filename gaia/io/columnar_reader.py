@@ -0,0 +1,75 @@
+from __future__ import absolute_import, division, print_function
+from builtins import (
+    bytes, str, open, super, range, zip, round, input, int, pow, object
+)
+
+from six import string_types
+
+from gaia.io.columnar import read_columnar
+from gaia.io.readers import GaiaReader
+from gaia.filters import filter_pandas, parse_filters
+from gaia.util import UnsupportedFormatException, get_uri_extension
+import gaia.formats as formats
+import gaia.types as types
+
+
+class GaiaColumnarReader(GaiaReader):
+    """
+    A specific subclass for reading GeoParquet and Feather files
+    """
+    def __init__(self, data_source, *args, **kwargs):
+        super(GaiaColumnarReader, self).__init__(*args, **kwargs)
+
+        self.uri = data_source
+        self.ext = '.%s' % get_uri_extension(self.uri)
+        # Optional column projection, bbox and attribute filters
+        self.columns = kwargs.get('columns')
+        self.bbox = kwargs.get('bbox')
+        self.filters = kwargs.get('filters')
+
+    @staticmethod
+    def can_read(data_source, *args, **kwargs):
+        if not isinstance(data_source, string_types):
+            return False
+        extension = '.{}'.format(get_uri_extension(data_source))
+        return extension in formats.COLUMNAR
+
+    def read(self, format=None, epsg=None):
+        return super().read(format, epsg)
+
+    def load_metadata(self, dataObject):
+        self.__read_internal(dataObject)
+
+    def load_data(self, dataObject):
+        self.__read_internal(dataObject)
+
+    def __read_internal(self, dataObject):
+        if self.ext not in formats.COLUMNAR:
+            tpl = "Only the following columnar formats are supported: {}"
+            msg = tpl.format(','.join(formats.COLUMNAR))
+            raise UnsupportedFormatException(msg)
+
+        columns = self.columns
+        if columns is not None and self.filters:
+            # Filtered attributes must be read, even if not requested
+            attributes = parse_filters(self.filters).attributes()
+            columns = list(columns) + sorted(attributes - set(columns))
+        data, epsg = read_columnar(self.uri, columns=columns, bbox=self.bbox)
+        if self.filters:
+            data = filter_pandas(data, self.filters)
+            if columns is not None:
+                geom_column = data.geometry.name
+                data = data[[x for x in self.columns if x != geom_column] +
+                            [geom_column]]
+
+        # Initialize metadata (same bounds format as GeoJSON reader)
+        minx, miny, maxx, maxy = data.geometry.total_bounds
+        coords = [[
+            [minx, miny], [maxx, miny], [maxx, maxy], [minx, maxy]
+        ]]
+        dataObject.set_metadata(dict(bounds=dict(coordinates=coords)))
+
+        dataObject.set_data(data)
+        dataObject._epsg = epsg
+        dataObject._datatype = types.VECTOR
+        dataObject._dataformat = formats.VECTOR
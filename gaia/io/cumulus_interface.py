@@ -20,8 +20,12 @@ from girder_client import HttpError
 import requests
 
 import gaia
+from gaia.geo import tiled_crop
 from gaia.girder_data import GirderDataObject
+from gaia.io import girder_jobs
 from gaia.io.girder_interface import GirderInterface
+from gaia.io.girder_upload import GirderUploader
+from gaia.io.job_backends import JobBackend
 from gaia.util import GaiaException
 
 NERSC_URL = 'https://newt.nersc.gov/newt'
@@ -33,14 +37,143 @@ CONDA_ENV_PATH = '{}/.conda/envs/py3'.format(JOHNT_PATH)
 PROJECT_PATH = '{}/project'.format(JOHNT_PATH)
 GAIA_PATH = '{}/git/gaia'.format(PROJECT_PATH)
 
+# Seconds to wait for a cluster to start
+CLUSTER_START_TIMEOUT = 30
+
+# Girder folder (in the user's folder) keeping a copy of uploaded inputs
+INPUT_CACHE_FOLDER = 'gaia_input_cache'
+
+# Cumulus job states of failed jobs
+JOB_FAILED_STATES = ['error', 'unexpectederror', 'terminated']
+
+
+def crop_commands(input_path, geometry_filename, output_filename, tiles=1,
+                  cog=False, script=None):
+    """Returns the SLURM commands cropping a raster by a geometry file
+
+    A single crop runs the crop script (if any) as one task. A tiled crop
+    runs one task per tile, then merges the tiles (see
+    gaia.geo.tiled_crop).
+    """
+    if tiles > 1 or script is None:
+        return tiled_crop.slurm_commands(
+            input_path, geometry_filename, output_filename, max(1, tiles),
+            cog=cog)
+
+    # Last command is the python script itself
+    py_command = 'python {} {} {} {}'.format(
+        script, input_path, geometry_filename, output_filename)
+
+    # Arguments
+    # -n number of tasks
+    # -c number of cpus per allocated process
+    # -u unbuffered (don't buffer terminal output - needed by cumulus)
+    return ['srun -n 1 -c 1 -u {}'.format(py_command)]
+
 
 class CumulusInterface():
-    """An internal class that submits jobs to NERSC via girder/cumulus
+    """An internal class that submits jobs to an execution backend
+
+    By default jobs run at NERSC via girder/cumulus (NerscBackend); a
+    LocalBackend (gaia.io.job_backends) runs them on this machine.
+    Methods other than submit_crop (create_job, job_future,
+    download_results...) are those of the backend.
+    """
+
+    # ---------------------------------------------------------------------
+    def __init__(self, backend=None):
+        """Recommend using separate instance for each job submission.
+        """
+        if backend is None:
+            backend = NerscBackend()
+        self.backend = backend
+
+    # ---------------------------------------------------------------------
+    def __getattr__(self, name):
+        if name == 'backend':
+            raise AttributeError(name)
+        return getattr(self.backend, name)
+
+    # ---------------------------------------------------------------------
+    def submit_crop(
+            self,
+            input_object,
+            crop_object,
+            nersc_repository,
+            job_name='geolib',
+            tiles=1,
+            cog=False):
+        """Submits a job cropping a raster by a vector object
+
+        With tiles > 1 the crop window is split into that many strips,
+        cropped by parallel srun tasks and then mosaicked into the output
+        file (see gaia.geo.tiled_crop); cog selects a cloud-optimized
+        GeoTIFF for the mosaic.
+        """
+        # Validate inputs
+        if not crop_object._getdatatype() == gaia.types.VECTOR:
+            raise GaiaException('Crop object not type VECTOR')
+        backend = self.backend
+
+        # Call internal methods in this order
+        #   create_cluster()
+        #   create_slurm_script()
+        #   create_job()
+        #   upload_inputs()
+        #   submit_job()
+        print('Creating cluster on {}'.format(backend.machine))
+        backend.create_cluster(backend.machine)
+
+        # Create SLURM commands
+        print('Creating SLURM script {}'.format(job_name))
+        command_list = backend.environment_commands()
+        input_path = backend.input_path(input_object)
+        geometry_filename = 'crop_geometry.geojson'
+        output_filename = 'output.tif'
+        command_list.extend(crop_commands(
+            input_path, geometry_filename, output_filename, tiles, cog,
+            script=backend.crop_script))
+        backend.create_slurm_script('metadata', command_list)
+
+        print('Creating job {}'.format(job_name))
+        backend.create_job(job_name)
+
+        # Set job metadata - keywords used by smtk job panel
+        job_metadata = dict()
+        # job_metadata['solver'] = solver
+        job_metadata['notes'] = ''
+        number_of_nodes = 1
+        job_metadata['numberOfNodes'] = number_of_nodes
+        # Total number of cores (1 core per task times number of nodes)
+        number_of_tasks = max(1, tiles)
+        job_metadata['numberOfCores'] = number_of_nodes * number_of_tasks
+
+        # Time stamp (seconds since epoci)
+        job_metadata['startTimeStamp'] = time.time()
+
+        # Plus one specific to our job
+        job_metadata['outputFilename'] = output_filename
+        backend.set_job_metadata(job_metadata)
+
+        print('Uploading geometry file')
+        backend.upload_input_text(
+            geometry_filename, crop_object.get_data().to_json())
+
+        print('Submitting job')
+        return backend.submit_job(
+            backend.machine, nersc_repository,
+            backend.job_output_dir(job_name))
+
+
+class NerscBackend(JobBackend):
+    """Runs jobs at NERSC via girder/cumulus
 
     This class uses the girder client owned by GirderInterface, which must be
     authenticated with NERSC (NEWT api). Note that this version is hard-coded
     to the Cori machine.
     """
+    machine = MACHINE
+    crop_script = '{}/nersc/crop.py'.format(GAIA_PATH)
 
     # ---------------------------------------------------------------------
     def __init__(self):
@@ -95,100 +228,9 @@ must authenticate with NEWT session id."""
         # print('private_folder_id', self._private_folder_id)
 
     # ---------------------------------------------------------------------
-    def submit_crop(
-            self,
-            input_object,
-            crop_object,
-            nersc_repository,
-            job_name='geolib'):
-        """
-        """
-        # Validate inputs
-        if not isinstance(input_object, GirderDataObject):
-            print('input object type', type(input_object))
-            raise GaiaException("""submit_crop() currently only supports \
-GirderDataObject input""")
-        if not crop_object._getdatatype() == gaia.types.VECTOR:
-            raise GaiaException('Crop object not type VECTOR')
-
-        # Get input object's filename
-        # For now (March 2019) we are storing a cache of files on cori
-        # for the ESS-DIVE dev server
-        item = self._girder_client.getItem(input_object.resource_id)
-        input_filename = item.get('name')
-
-        # Call internal methods in this order
-        #   create_cluster()
-        #   create_slurm_script()
-        #   create_job()
-        #   upload_inputs()
-        #   submit_job()
-        print('Creating cluster on {}'.format(MACHINE))
-        self.create_cluster(MACHINE)
-
-        # Create SLURM commands
-        print('Creating SLURM script {}'.format(job_name))
-        command_list = list()
-        command_list.append('ulimit -s unlimited')  # stack size
-        command_list.append('module load python/3.6-anaconda-4.4')
-        command_list.append('source activate {}'.format(CONDA_ENV_PATH))
-        command_list.append('export PYTHONPATH={}'.format(GAIA_PATH))
-
-        # Last command is the python script itself
-        py_script = '{}/nersc/crop.py'.format(GAIA_PATH)
-
-        # For now, we have chache copies of input files on cori:
-        input_path = '{}/data/{}'.format(PROJECT_PATH, input_filename)
-        geometry_filename = 'crop_geometry.geojson'
-        output_filename = 'output.tif'
-        py_command = 'python {} {} {} {}'.format(
-            py_script, input_path, geometry_filename, output_filename)
-
-        # Arguments
-        # -n number of nodes
-        # -c number of cpus per allocated process
-        # -u unbuffered (don't buffer terminal output - needed by cumulus)
-        command_list.append('srun -n 1 -c 1 -u {}'.format(py_command))
-        self.create_slurm_script('metadata', command_list)
-
-        print('Creating job {}'.format(job_name))
-        self.create_job(job_name)
-
-        # Set job metadata - keywords used by smtk job panel
-        job_metadata = dict()
-        # job_metadata['solver'] = solver
-        job_metadata['notes'] = ''
-        number_of_nodes = 1
-        job_metadata['numberOfNodes'] = number_of_nodes
-        # Total number of cores (1 core per task times number of nodes)
-        number_of_tasks = 1
-        job_metadata['numberOfCores'] = number_of_nodes * number_of_tasks
-
-        # Time stamp (seconds since epoci)
-        job_metadata['startTimeStamp'] = time.time()
-
-        # Plus one specific to our job
-        job_metadata['outputFilename'] = output_filename
-        self.set_job_metadata(job_metadata)
-
-        print('Uploading geometry file')
-        name = geometry_filename
-        geom_string = crop_object.get_data().to_json()
-        size = len(geom_string)
-        # print('geom_string:', geom_string)
-        geom_stream = io.StringIO(geom_string)
-        self._girder_client.uploadFile(
-            self._input_folder_id, geom_stream, name, size, parentType='folder')
-
-        print('Submitting job')
-        datecode = datetime.datetime.now().strftime('%y%m%d')
-        output_dir = '{}/geolib/{}/{}'.format(
-            self._nersc_scratch_folder, datecode, job_name)
-        return self.submit_job(MACHINE, nersc_repository, output_dir)
-
-    # ---------------------------------------------------------------------
-    def create_cluster(self, machine_name, cluster_name=None):
-        '''
+    def create_cluster(self, machine_name, cluster_name=None,
+                       timeout=CLUSTER_START_TIMEOUT):
+        '''Creates (or restarts) a cluster and waits until it is running
         '''
         if cluster_name is None:
             user = self._girder_client.get('user/me')
@@ -225,23 +267,50 @@ GirderDataObject input""")
 
         # Now test the connection
         r = self._girder_client.put('clusters/%s/start' % self._cluster_id)
-        sleeps = 0
-        while True:
-            time.sleep(1)
-            r = self._girder_client.get('clusters/%s/status' % self._cluster_id)
-            # print('status', r['status'])
+        cluster_id = self._cluster_id
+        girder_client = self._girder_client
 
+        def poll():
+            r = girder_client.get('clusters/%s/status' % cluster_id)
             if r['status'] == 'running':
-                break
+                return r
             elif r['status'] == 'error':
-                r = self._girder_client.get(
-                    'clusters/%s/log' % self._cluster_id)
+                r = girder_client.get('clusters/%s/log' % cluster_id)
                 print(r)
-                raise Exception('ERROR creating cluster')
+                raise GaiaException('ERROR creating cluster')
+            return None
+
+        try:
+            girder_jobs.submit(poll, timeout=timeout).result()
+        except girder_jobs.JobTimeoutError:
+            raise GaiaException('Cluster never moved into running state')
+
+    # ---------------------------------------------------------------------
+    def environment_commands(self):
+        '''Returns the commands loading python and gaia on cori
+        '''
+        return [
+            'ulimit -s unlimited',  # stack size
+            'module load python/3.6-anaconda-4.4',
+            'source activate {}'.format(CONDA_ENV_PATH),
+            'export PYTHONPATH={}'.format(GAIA_PATH)
+        ]
+
+    # ---------------------------------------------------------------------
+    def input_path(self, input_object):
+        '''Returns the path of a girder item's file on cori
+        '''
+        if not isinstance(input_object, GirderDataObject):
+            print('input object type', type(input_object))
+            raise GaiaException("""submit_crop() currently only supports \
+GirderDataObject input""")
 
-            if sleeps > 9:
-                raise Exception('Cluster never moved into running state')
-            sleeps += 1
+        # Get input object's filename
+        # For now (March 2019) we are storing a cache of files on cori
+        # for the ESS-DIVE dev server
+        item = self._girder_client.getItem(input_object.resource_id)
+        input_filename = item.get('name')
+        return '{}/data/{}'.format(PROJECT_PATH, input_filename)
 
     # ---------------------------------------------------------------------
     def create_slurm_script(self, name, command_list):
@@ -301,32 +370,59 @@ GirderDataObject input""")
     # ---------------------------------------------------------------------
     def upload_inputs(self, files_to_upload, folders_to_upload=[]):
         '''Uploads input files to (girder) input folder
+
+        Files are uploaded concurrently, in resumable chunks. Files with
+        the same content as an input of an earlier job are copied from
+        the input cache folder on girder instead of being transferred
+        again (see gaia.io.girder_upload).
         '''
         if not self._input_folder_id:
             raise Exception('Input folder missing')
 
-        def upload_file(path):
-            name = os.path.basename(path)
-            size = os.path.getsize(path)
-            with open(path, 'rb') as fp:
-                self._girder_client.uploadFile(
-                    self._input_folder_id, fp, name, size, parentType='folder')
-
         for file_path in files_to_upload:
             if not file_path or not os.path.exists(file_path):
                 raise Exception('Input file not found: %s' % file_path)
-            upload_file(file_path)
-
         for folder_path in folders_to_upload:
             if not folder_path or not os.path.exists(folder_path):
                 raise Exception('Input folder not found: %s' % folder_path)
-            # Create folder on girder
-            basename = os.path.basename(folder_path)
-            new_folder = self._girder_client.createFolder(
-                self._input_folder_id, basename)
-            # Upload files
-            pattern = '%s/*' % folder_path
-            self._girder_client.upload(pattern, new_folder._id)
+
+        uploader = GirderUploader(
+            GirderInterface.get_instance().transport,
+            cache_folder_id=self.get_folder(
+                self._private_folder_id, INPUT_CACHE_FOLDER))
+        uploader.upload_files(files_to_upload, self._input_folder_id)
+
+        def upload_folder(folder_path, parent_id):
+            # Create folder on girder, then upload its contents
+            basename = os.path.basename(os.path.normpath(folder_path))
+            folder_id = self.get_folder(parent_id, basename)
+            paths = sorted(
+                os.path.join(folder_path, name)
+                for name in os.listdir(folder_path))
+            uploader.upload_files(
+                [path for path in paths if os.path.isfile(path)], folder_id)
+            for path in paths:
+                if os.path.isdir(path):
+                    upload_folder(path, folder_id)
+
+        for folder_path in folders_to_upload:
+            upload_folder(folder_path, self._input_folder_id)
+
+    # ---------------------------------------------------------------------
+    def upload_input_text(self, name, text):
+        '''Uploads a text file (e.g. a geometry) to the input folder
+        '''
+        self._girder_client.uploadFile(
+            self._input_folder_id, io.StringIO(text), name, len(text),
+            parentType='folder')
+
+    # ---------------------------------------------------------------------
+    def job_output_dir(self, job_name):
+        '''Returns the job directory in the user's scratch folder
+        '''
+        datecode = datetime.datetime.now().strftime('%y%m%d')
+        return '{}/geolib/{}/{}'.format(
+            self._nersc_scratch_folder, datecode, job_name)
 
     # ---------------------------------------------------------------------
     def submit_job(self,
@@ -364,6 +460,28 @@ GirderDataObject input""")
         print('Submitted job', self._job_id)
         return self._job_id
 
+    # ---------------------------------------------------------------------
+    def job_future(self, job_id=None, timeout=None):
+        '''Returns a future for the completion of a submitted job
+
+        The future's result is the job's final status object. Futures of
+        many jobs can be combined with girder_jobs.wait/as_completed.
+        '''
+        if job_id is None:
+            job_id = self._job_id
+        girder_client = self._girder_client
+
+        def poll():
+            r = girder_client.get('jobs/%s/status' % job_id)
+            if r['status'] == 'complete':
+                return r
+            elif r['status'] in JOB_FAILED_STATES:
+                raise GaiaException(
+                    'Job %s ended with status %s' % (job_id, r['status']))
+            return None
+
+        return girder_jobs.submit(poll, timeout=timeout)
+
     # ---------------------------------------------------------------------
     def set_job_metadata(self, meta):
         '''Writes metadata to job
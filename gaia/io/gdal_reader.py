@@ -13,7 +13,6 @@ except ImportError:
 import gdal
 from gaia.geo.gdal_functions import (
     gdal_reproject,
-    raster_to_numpy_array,
     rasterio_bbox,
     rasterio_footprint
 )
@@ -21,7 +20,6 @@ from gaia.geo.gdal_functions import (
 from gaia.io.gaia_reader import GaiaReader
 from gaia.gaia_data import GDALDataObject
 from gaia.util import (
-    UnhandledOperationException,
     UnsupportedFormatException,
     get_uri_extension
 )
@@ -56,12 +54,13 @@ class GaiaGDALReader(GaiaReader):
         return False
 
     def read(self, format=formats.RASTER, epsg=None, as_numpy_array=False,
-             as_single_band=True, old_nodata=None, new_nodata=None):
+             as_single_band=True, old_nodata=None, new_nodata=None,
+             window=None, masked=False, as_memmap=False):
         """
         Read data from a raster dataset
 
-        :param as_numpy_array: Output data as numpy
-        (default is False i.e. raster osgeo.gdal.Dataset)
+        :param as_numpy_array: Output data as a numpy array of the bands'
+        native data type (default is False i.e. raster osgeo.gdal.Dataset)
         :param as_single_band: Output data as 2D array of its first band
         (default is True). If False, returns full 3D array.
         :param old_nodata: Explicitly identify existing NoData values
@@ -71,8 +70,15 @@ class GaiaGDALReader(GaiaReader):
         (default None). If new_nodata is not None but old_nodata is None
         and no existing NoData value is stored in the band, uses unchanged
         default ReadAsArray() return values.
+        :param window: numpy output only, pixel window to read as
+        (xoff, yoff, xsize, ysize) (default None reads the whole raster)
+        :param masked: numpy output only, return a masked array with
+        NoData pixels masked (default False)
+        :param as_memmap: Output band data as read-only views memory-mapped
+        over an uncompressed GeoTIFF (default False), 2D for a single
+        band or a list with one view per band
         :param epsg: EPSG code to reproject data to
-        :return: GDAL Dataset
+        :return: GDALDataObject, or numpy array if as_numpy_array is True
         """
         self.format = format
         self.epsg = epsg
@@ -81,9 +87,13 @@ class GaiaGDALReader(GaiaReader):
         self.old_nodata = old_nodata
         self.new_nodata = new_nodata
 
-        # FIXME: if we got "as_numpy_array=True", should we return different
-        # data object type?
         o = GDALDataObject(reader=self, dataFormat=self.format, epsg=self.epsg)
+        if as_memmap:
+            return o.get_memmap(as_single_band=as_single_band)
+        if as_numpy_array:
+            return o.get_array(window=window, as_single_band=as_single_band,
+                               masked=masked, old_nodata=old_nodata,
+                               new_nodata=new_nodata)
         return o
 
     def load_metadata(self, dataObject):
@@ -148,8 +158,3 @@ class GaiaGDALReader(GaiaReader):
         dataObject.set_metadata({})
         dataObject._datatype = types.RASTER
         dataObject._dataformat = formats.RASTER
-
-        if self.as_numpy_array:
-            raise UnhandledOperationException('Convert GDAL dataset to numpy')
-            # np_data = raster_to_numpy_array(out_data, as_single_band,
-            #                                 old_nodata, new_nodata)
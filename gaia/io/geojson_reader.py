@@ -11,6 +11,7 @@ import geopandas
 from gaia.io.readers import GaiaReader
 from gaia.gaia_data import GaiaDataObject
 from gaia import GaiaException
+from gaia.filters import filter_ogr, filter_pandas
 from gaia.util import (
     MissingParameterError,
     MissingDataException,
@@ -33,6 +34,7 @@ class GaiaGeoJSONReader(GaiaReader):
         self.geojson_object = None
         self.uri = None
         self.ext = None
+        self.filters = kwargs.get('filters')
 
         if isinstance(data_source, string_types):
             self.uri = data_source
@@ -45,7 +47,8 @@ class GaiaGeoJSONReader(GaiaReader):
         if isinstance(data_source, string_types):
             # Check string for a supported filename/url
             extension = '.{}'.format(get_uri_extension(data_source))
-            if extension in formats.VECTOR:
+            if (extension in formats.VECTOR and
+                    extension not in formats.COLUMNAR):
                 return True
             return False
         elif isinstance(data_source, geojson.GeoJSON):
@@ -70,7 +73,7 @@ class GaiaGeoJSONReader(GaiaReader):
                 tpl = "Only the following vector formats are supported: {}"
                 msg = tpl.format(','.join(formats.VECTOR))
                 raise UnsupportedFormatException(msg)
-            data = geopandas.read_file(self.uri)
+            data = self.__read_file()
 
         elif self.geojson_object:
             if isinstance(self.geojson_object, geojson.geometry.Geometry):
@@ -88,9 +91,10 @@ class GaiaGeoJSONReader(GaiaReader):
             data = geopandas.GeoDataFrame.from_features(
                 features, crs=dict(init='epsg:4326'))
 
-        # FIXME: still need to handle filtering
-        # if self.filters:
-        #     self.filter_data()
+        # Pushdown (if any) selects a superset of the rows, including the
+        # NULL values pandas keeps; the pandas pass below is exact
+        if self.filters:
+            data = filter_pandas(data, self.filters)
 
         # FIXME: skipped the transformation step for now
         # return self.transform_data(format, epsg)
@@ -121,3 +125,14 @@ class GaiaGeoJSONReader(GaiaReader):
             dataObject._epsg = int(m.group(1))
         dataObject._datatype = types.VECTOR
         dataObject._dataformat = formats.VECTOR
+
+    def __read_file(self):
+        where = filter_ogr(self.filters) if self.filters else None
+        if where:
+            # Push the filter down to OGR when the installed reader
+            # supports it, so unmatched features are never parsed
+            try:
+                return geopandas.read_file(self.uri, where=where)
+            except TypeError:
+                pass
+        return geopandas.read_file(self.uri)
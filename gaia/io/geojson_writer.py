@@ -0,0 +1,152 @@
+from __future__ import absolute_import, division, print_function
+
+import io
+import json
+
+import geopandas
+import numpy as np
+from shapely.geometry import mapping
+try:
+    from shapely import to_geojson, transform
+except ImportError:
+    # shapely < 2.0 has no vectorized GeoJSON output
+    to_geojson = None
+
+"""
+Streaming GeoJSON output, written batch by batch straight from the
+geometry coordinate arrays instead of feature by feature through fiona.
+"""
+
+#: Default number of features serialized at a time
+GEOJSON_BATCH_SIZE = 10000
+
+#: File extensions written as newline-delimited GeoJSON (GeoJSONSeq)
+GEOJSON_SEQ = ['.geojsonl', '.geojsons', '.ndjson']
+
+FEATURE_TEMPLATE = '{{"type":"Feature","properties":{},"geometry":{}}}'
+
+
+def write_geojson(data, filename, epsg=None, precision=None,
+                  newline_delimited=False, batch_size=GEOJSON_BATCH_SIZE):
+    """
+    Write vector data to a GeoJSON file
+
+    :param data: GeoDataFrame, or an iterable of GeoDataFrame chunks
+    :param filename: output path
+    :param epsg: EPSG code of the data, recorded as a named crs when it is
+    not 4326 (FeatureCollection output only)
+    :param precision: number of decimal places for coordinates (default
+    None keeps full precision)
+    :param newline_delimited: write one feature per line (GeoJSONSeq)
+    instead of a FeatureCollection
+    :param batch_size: number of features serialized at a time
+    :return: number of features written
+    """
+    if isinstance(data, geopandas.GeoDataFrame):
+        data = [data]
+
+    count = 0
+    with io.open(filename, 'w', encoding='utf-8') as fp:
+        if not newline_delimited:
+            fp.write(u'{"type":"FeatureCollection",')
+            if epsg and int(epsg) != 4326:
+                crs = {
+                    'type': 'name',
+                    'properties': {
+                        'name': 'urn:ogc:def:crs:EPSG::{}'.format(int(epsg))
+                    }
+                }
+                fp.write(u'"crs":{},'.format(json.dumps(crs)))
+            fp.write(u'"features":[\n')
+
+        for chunk in data:
+            for start in range(0, len(chunk), batch_size):
+                features = serialize_features(
+                    chunk.iloc[start:start + batch_size], precision)
+                if newline_delimited:
+                    fp.write(u'\n'.join(features) + u'\n')
+                else:
+                    if count:
+                        fp.write(u',\n')
+                    fp.write(u',\n'.join(features))
+                count += len(features)
+
+        if not newline_delimited:
+            fp.write(u'\n]}\n')
+    return count
+
+
+def serialize_features(data, precision=None):
+    """
+    Serialize a GeoDataFrame to a list of GeoJSON Feature strings
+
+    :param data: GeoDataFrame
+    :param precision: number of decimal places for coordinates
+    :return: list of strings, one per row
+    """
+    geom_column = data.geometry.name
+    properties = data.drop(columns=[geom_column])
+    if len(properties.columns):
+        properties = properties.to_json(
+            orient='records', lines=True, date_format='iso',
+            double_precision=15).rstrip('\n').split('\n')
+    else:
+        properties = ['{}'] * len(data)
+
+    geometries = serialize_geometries(data.geometry.values, precision)
+    return [FEATURE_TEMPLATE.format(p, g)
+            for p, g in zip(properties, geometries)]
+
+
+def serialize_geometries(geometries, precision=None):
+    """
+    Serialize geometries to GeoJSON geometry strings, rounding all
+    coordinates of the batch at once
+
+    :param geometries: array of shapely geometries (or None)
+    :param precision: number of decimal places for coordinates
+    :return: list of strings ('null' for missing geometries)
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    if to_geojson is not None:
+        if precision is not None:
+            geometries = transform(
+                geometries, lambda x: np.round(x, precision))
+        return [x if x is not None else 'null'
+                for x in to_geojson(geometries)]
+
+    results = []
+    for geom in geometries:
+        if geom is None:
+            results.append('null')
+            continue
+        geo = mapping(geom)
+        if precision is not None:
+            geo = _round_geometry(geo, precision)
+        results.append(json.dumps(geo, separators=(',', ':')))
+    return results
+
+
+def _round_geometry(geo, precision):
+    """
+    Round the coordinates of a GeoJSON-like geometry mapping
+    """
+    if geo['type'] == 'GeometryCollection':
+        geometries = [_round_geometry(x, precision)
+                      for x in geo['geometries']]
+        return dict(type=geo['type'], geometries=geometries)
+    coordinates = _round_coordinates(geo['coordinates'], precision)
+    return dict(type=geo['type'], coordinates=coordinates)
+
+
+def _round_coordinates(coordinates, precision):
+    """
+    Round nested coordinate sequences, one array operation per regular
+    (non-ragged) part
+    """
+    try:
+        array = np.asarray(coordinates, dtype=float)
+    except ValueError:
+        # Ragged, e.g. polygon rings with different numbers of points
+        return [_round_coordinates(x, precision) for x in coordinates]
+    return np.round(array, precision).tolist()
@@ -0,0 +1,331 @@
+from __future__ import absolute_import, division, print_function
+
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+"""
+Persistent caches for Girder-hosted data, shared by all processes of the
+same user through files in the cache directory.
+"""
+
+#: Default cache settings, overridden by the [gaia_girder] config section
+CACHE_DEFAULTS = {
+    'cache_dir': os.path.join('~', '.cache', 'gaia'),
+    'metadata_ttl': 86400,
+    'metadata_max_entries': 10000,
+    'download_max_bytes': 10 * 1024 ** 3
+}
+
+#: Maximum number of ids per SQL IN (...) clause
+SQL_BATCH_SIZE = 500
+
+_lock = threading.Lock()
+_metadata_cache = None
+_download_cache = None
+
+
+def get_cache_options(**options):
+    """
+    Merge cache settings from the defaults, the gaia config file and the
+    given keyword arguments (highest priority)
+
+    :return: dict of cache settings
+    """
+    import gaia
+    settings = dict(CACHE_DEFAULTS)
+    section = gaia.config.get('gaia_girder', {})
+    for key, default in CACHE_DEFAULTS.items():
+        value = options.get(key, section.get(key))
+        if value is None or value == '':
+            continue
+        settings[key] = type(default)(value)
+    settings['cache_dir'] = os.path.expanduser(settings['cache_dir'])
+    return settings
+
+
+def get_metadata_cache():
+    """
+    Return the shared metadata cache, created from the config settings on
+    first use
+    """
+    global _metadata_cache
+    with _lock:
+        if _metadata_cache is None:
+            settings = get_cache_options()
+            _metadata_cache = MetadataCache(
+                os.path.join(settings['cache_dir'], 'girder_metadata.db'),
+                ttl=settings['metadata_ttl'],
+                max_entries=settings['metadata_max_entries'])
+    return _metadata_cache
+
+
+def get_download_cache():
+    """
+    Return the shared download cache, created from the config settings on
+    first use
+    """
+    global _download_cache
+    with _lock:
+        if _download_cache is None:
+            settings = get_cache_options()
+            _download_cache = DownloadCache(
+                os.path.join(settings['cache_dir'], 'downloads'),
+                max_bytes=settings['download_max_bytes'])
+    return _download_cache
+
+
+def _makedirs(directory):
+    """
+    Create a directory (and its parents) unless it already exists
+    """
+    if directory and not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+
+
+class MetadataCache(object):
+    """
+    Cache of Girder item metadata (e.g. geometa) in an SQLite file
+
+    Entries are keyed by item id and store the item's 'updated' timestamp.
+    A lookup that passes the current timestamp (e.g. from a folder
+    listing) hits exactly when the item has not changed since it was
+    cached; a lookup without one trusts entries younger than ttl seconds.
+    The least recently used entries beyond max_entries are evicted.
+    """
+    def __init__(self, path, ttl=CACHE_DEFAULTS['metadata_ttl'],
+                 max_entries=CACHE_DEFAULTS['metadata_max_entries']):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        _makedirs(os.path.dirname(path))
+        with self._connect() as db:
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS metadata ('
+                'item_id TEXT PRIMARY KEY, updated TEXT, stored REAL, '
+                'accessed REAL, value TEXT)')
+            db.execute(
+                'CREATE INDEX IF NOT EXISTS metadata_accessed '
+                'ON metadata (accessed)')
+
+    @contextmanager
+    def _connect(self):
+        """
+        Open the cache file for one transaction, committed on success
+        """
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def get(self, item_id, updated=None):
+        """
+        Return cached metadata for an item, or None
+
+        :param item_id: Girder item id
+        :param updated: the item's current 'updated' timestamp, if known
+        """
+        return self.get_many([(item_id, updated)])[0]
+
+    def get_many(self, items):
+        """
+        Look up several items with one query per SQL_BATCH_SIZE items
+
+        :param items: list of (item id, updated timestamp or None) pairs
+        :return: list of metadata dicts (None for misses), in order
+        """
+        now = time.time()
+        rows = {}
+        ids = [item_id for item_id, _ in items]
+        with self._connect() as db:
+            for start in range(0, len(ids), SQL_BATCH_SIZE):
+                batch = ids[start:start + SQL_BATCH_SIZE]
+                query = (
+                    'SELECT item_id, updated, stored, value FROM metadata '
+                    'WHERE item_id IN ({})'.format(','.join('?' * len(batch))))
+                for row in db.execute(query, batch):
+                    rows[row[0]] = row[1:]
+
+            results = []
+            hits = []
+            for item_id, updated in items:
+                row = rows.get(item_id)
+                if row is None:
+                    valid = False
+                elif updated is None:
+                    valid = now - row[1] < self.ttl
+                else:
+                    valid = row[0] == str(updated)
+                if not valid:
+                    results.append(None)
+                    continue
+                results.append(json.loads(row[2]))
+                hits.append((now, item_id))
+            if hits:
+                db.executemany(
+                    'UPDATE metadata SET accessed = ? WHERE item_id = ?',
+                    hits)
+        return results
+
+    def put(self, item_id, updated, value):
+        """
+        Store metadata for an item
+
+        :param item_id: Girder item id
+        :param updated: the item's 'updated' timestamp (or None)
+        :param value: JSON-serializable metadata
+        """
+        self.put_many([(item_id, updated, value)])
+
+    def put_many(self, entries):
+        """
+        Store metadata for several items, then evict the least recently
+        used entries beyond max_entries
+
+        :param entries: list of (item id, updated, value) tuples
+        """
+        now = time.time()
+        rows = [(item_id, None if updated is None else str(updated),
+                 now, now, json.dumps(value))
+                for item_id, updated, value in entries]
+        with self._connect() as db:
+            db.executemany(
+                'INSERT OR REPLACE INTO metadata '
+                '(item_id, updated, stored, accessed, value) '
+                'VALUES (?, ?, ?, ?, ?)', rows)
+            db.execute(
+                'DELETE FROM metadata WHERE item_id IN ('
+                'SELECT item_id FROM metadata ORDER BY accessed DESC '
+                'LIMIT -1 OFFSET ?)', (self.max_entries,))
+
+    def invalidate(self, item_id=None):
+        """
+        Drop the cached metadata of one item, or of all items
+        """
+        with self._connect() as db:
+            if item_id is None:
+                db.execute('DELETE FROM metadata')
+            else:
+                db.execute(
+                    'DELETE FROM metadata WHERE item_id = ?', (item_id,))
+
+
+class DownloadCache(object):
+    """
+    Content-addressed local copies of Girder files
+
+    Each entry is a directory named after the content of the files it
+    holds: the sha512 checksum of a file when Girder provides one,
+    otherwise its Girder file id. Files of the same item (e.g. the parts
+    of a shapefile) are kept together in one entry under their original
+    names, so that readers find them side by side. Entries are touched on
+    every use, and the least recently used are evicted once the cache
+    holds more than max_bytes.
+    """
+    def __init__(self, directory,
+                 max_bytes=CACHE_DEFAULTS['download_max_bytes']):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        _makedirs(directory)
+
+    @staticmethod
+    def file_key(girder_file):
+        """
+        Content key of a Girder file object
+        """
+        if girder_file.get('sha512'):
+            return girder_file['sha512']
+        return 'id-{}'.format(girder_file['_id'])
+
+    def entry_path(self, files):
+        """
+        Local directory of the cache entry for a list of Girder files
+        """
+        keys = sorted(self.file_key(f) for f in files)
+        if len(keys) == 1:
+            key = keys[0]
+        else:
+            key = hashlib.sha512(
+                '\n'.join(keys).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key[-2:], key)
+
+    def fetch(self, files, transport):
+        """
+        Return local paths of Girder files, downloading the files that are
+        not cached yet (concurrently, on the transport's connection pool)
+
+        :param files: list of Girder file objects (with _id and name)
+        :param transport: GirderTransport used for downloading
+        :return: list of local file paths, in the order of files
+        """
+        entry = self.entry_path(files)
+        _makedirs(entry)
+        paths = [os.path.join(entry, os.path.basename(f['name']))
+                 for f in files]
+        missing = [(f['_id'], path) for f, path in zip(files, paths)
+                   if not os.path.isfile(path)]
+        transport.map(
+            lambda download: transport.download_file(*download), missing)
+        os.utime(entry, None)
+        if missing:
+            self.evict(keep=entry)
+        return paths
+
+    def entries(self):
+        """
+        List the cache entries, least recently used first
+
+        :return: list of (last use time, size in bytes, directory) tuples
+        """
+        entries = []
+        for prefix in os.listdir(self.directory):
+            parent = os.path.join(self.directory, prefix)
+            if not os.path.isdir(parent):
+                continue
+            for name in os.listdir(parent):
+                entry = os.path.join(parent, name)
+                try:
+                    used = os.path.getmtime(entry)
+                    size = sum(
+                        os.path.getsize(os.path.join(entry, f))
+                        for f in os.listdir(entry))
+                except OSError:
+                    # Evicted by another process meanwhile
+                    continue
+                entries.append((used, size, entry))
+        return sorted(entries)
+
+    def size(self):
+        """
+        Total number of bytes held by the cache
+        """
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        """
+        Remove least recently used entries until the cache holds no more
+        than max_bytes
+
+        :param keep: entry directory that must not be removed
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
@@ -4,9 +4,20 @@ import requests
 
 import girder_client
 
+from gaia.io.girder_cache import get_metadata_cache
+from gaia.io.girder_transport import PAGE_SIZE, GirderTransport
 from gaia.util import GaiaException, MissingParameterError
 
 
+def sizeof_fmt(num, suffix='B'):
+    '''Converts number to human-readable form'''
+    for unit in ['', 'K', 'M', 'G', 'T', 'P', 'E', 'Z']:
+        if abs(num) < 1024.0:
+            return "%3.1f %s%s" % (num, unit, suffix)
+        num /= 1024.0
+    return "%.1f %s%s" % (num, 'Y', suffix)
+
+
 class GirderInterface(object):
     """An internal class that provides a thin encapsulation of girder_client.
 
@@ -30,6 +41,8 @@ class GirderInterface(object):
         self.gaia_folder = None
         self.default_folder = None
         self.nersc_requests = None  # requests session
+        self.transport = None  # pooled http transport
+        self._gc_session = None  # girder client session context
 
     @classmethod
     def get_instance(cls):
@@ -109,6 +122,12 @@ class GirderInterface(object):
         else:
             raise MissingParameterError('No girder credentials provided.')
 
+        # Share one pooled, retrying keep-alive session with girder_client
+        self.transport = GirderTransport(api_url, token=self.gc.token)
+        # The session() context stays open for the life of the client
+        self._gc_session = self.gc.session(self.transport.session)
+        self._gc_session.__enter__()
+
         # Get user info
         self.user = self.gc.getUser('me')
 
@@ -219,10 +238,16 @@ class GirderInterface(object):
         return resource
 
     def ls(self, path, text=None, name=None, offset=0, limit=40,
-            formatted=True):
+            formatted=True, stream=False):
         """Returns list of files at specified girder path (folder)
 
+        :param text: (string) if given, only items matching this text search
+        :param name: (string) if given, only the item with this name
+        :param offset: (int) index of the first item
+        :param limit: (int) maximum number of items (0 for all)
         :param formatted: (bool) if true, return abridged, formatted list
+        :param stream: (bool) if true, return a generator that fetches the
+            listing page by page instead of a list
 
         """
         # Lookup folder id for given path
@@ -230,26 +255,118 @@ class GirderInterface(object):
         folder_id = folder_resource.get('_id')
 
         # Get items in that folder
-        gen = self.gc.listItem(folder_id)
-        contents = list(gen)
-        if not formatted:
-            return contents
-
-        # (else) generate a list of abridged, formatted items
-        def sizeof_fmt(num, suffix='B'):
-            '''Converts number to human-readable form'''
-            for unit in ['', 'K', 'M', 'G', 'T', 'P', 'E', 'Z']:
-                if abs(num) < 1024.0:
-                    return "%3.1f %s%s" % (num, unit, suffix)
-                num /= 1024.0
-            return "%.1f %s%s" % (num, 'Y', suffix)
-
-        content_list = [None] * len(contents)
-        for i, item in enumerate(contents):
-            sizeof = sizeof_fmt(item.get('size'))
-            content_list[i] = [sizeof, item.get('name')]
-
-        return content_list
+        contents = self.iter_items(
+            folder_id, text=text, name=name, offset=offset, limit=limit)
+        if formatted:
+            contents = ([sizeof_fmt(item.get('size')), item.get('name')]
+                        for item in contents)
+        return contents if stream else list(contents)
+
+    def iter_items(self, folder_id, text=None, name=None, offset=0, limit=0,
+                   page_size=PAGE_SIZE, prefetch=True):
+        """Yields the items in a folder, fetching them page by page
+
+        Filtering is done by girder. The next page is fetched in the
+        background while the current one is consumed, so iterating over
+        large folders starts immediately and uses constant memory.
+
+        :param folder_id: girder folder id
+        :param text: (string) if given, only items matching this text search
+        :param name: (string) if given, only the item with this name
+        :param offset: (int) index of the first item
+        :param limit: (int) maximum number of items (0 for all)
+        :param page_size: (int) number of items per request
+        :param prefetch: (bool) fetch the next page in the background
+        :return: generator of girder item objects
+        """
+        parameters = {'folderId': folder_id, 'sort': 'lowerName'}
+        if text:
+            parameters['text'] = text
+        if name:
+            parameters['name'] = name
+        return self.transport.paginate(
+            'item', parameters, offset=offset, limit=limit,
+            page_size=page_size, prefetch=prefetch)
+
+    def get_many(self, paths, parameters=None):
+        """Issues GET requests for several api paths concurrently
+
+        :param paths: list of api paths, e.g. ['item/{id}', ...]
+        :param parameters: query parameters sent with every request
+        :return: list of responses, in the order of paths
+        """
+        return self.transport.get_many(paths, parameters)
+
+    def get_geometa(self, item_ids, missing_ok=False):
+        """Fetches geometa for several items concurrently
+
+        :param item_ids: list of girder item ids
+        :param missing_ok: (bool) if true, items without geometa (e.g.
+            non-geospatial files, answered with 400 or 404) get an empty
+            dict instead of raising
+        :return: list of geometa objects, in the order of item_ids
+        """
+        if not missing_ok:
+            return self.get_many(
+                ['item/{}/geometa'.format(item_id) for item_id in item_ids])
+
+        def fetch(item_id):
+            try:
+                return self.transport.get('item/{}/geometa'.format(item_id))
+            except requests.HTTPError as e:
+                # Other errors (e.g. 401/403) are not a missing geometa
+                if e.response is None or \
+                        e.response.status_code not in (400, 404):
+                    raise
+                return {}
+
+        return self.transport.map(fetch, item_ids)
+
+    def lookup_geometa(self, items, missing_ok=False):
+        """Returns geometa for several items, using the metadata cache
+
+        Cached geometa is used for every item whose 'updated' timestamp
+        is unchanged; the rest is fetched concurrently and cached. Empty
+        geometa (see missing_ok) is not cached, as it may still be computed.
+
+        :param items: list of girder item objects (e.g. from a listing)
+        :param missing_ok: (bool) see get_geometa()
+        :return: list of geometa objects, in the order of items
+        """
+        cache = get_metadata_cache()
+        keys = [(item['_id'], item.get('updated')) for item in items]
+        results = cache.get_many(keys)
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            fetched = self.get_geometa(
+                [keys[i][0] for i in missing], missing_ok=missing_ok)
+            for i, geometa in zip(missing, fetched):
+                results[i] = geometa
+            cache.put_many(
+                [keys[i] + (results[i],) for i in missing if results[i]])
+        return results
+
+    def list_geometa(self, folder_id):
+        """Returns the items in a folder with their geometa
+
+        Lists the folder in a single request; geometa is only fetched for
+        items that are new or changed since they were last cached.
+
+        :param folder_id: girder folder id
+        :return: list of (item, geometa) tuples
+        """
+        items = self.gc.get(
+            'item', parameters=dict(folderId=folder_id, limit=0))
+        return list(zip(items, self.lookup_geometa(items)))
+
+    def get_items(self, item_ids):
+        """Fetches several items concurrently
+
+        :param item_ids: list of girder item ids
+        :return: list of item objects, in the order of item_ids
+        """
+        return self.get_many(
+            ['item/{}'.format(item_id) for item_id in item_ids])
 
     @classmethod
     def _get_default_folder_id(cls):
@@ -0,0 +1,213 @@
+from __future__ import absolute_import, division, print_function
+
+from concurrent.futures import Future, as_completed, wait  # noqa: F401
+try:
+    from concurrent.futures import InvalidStateError
+except ImportError:
+    # Python < 3.8 does not check the state when resolving futures
+    InvalidStateError = RuntimeError
+import heapq
+import itertools
+import random
+import threading
+import time
+
+from gaia.util import GaiaException
+
+"""
+Futures for remote (Girder and Cumulus) jobs.
+
+Submitting a job returns a JobFuture immediately. One background poller
+thread checks the status of all outstanding jobs, each with its own
+exponential backoff (with jitter, so that jobs submitted together do not
+poll in lockstep), and resolves their futures when they finish. The
+futures work with concurrent.futures.wait and as_completed, which are
+re-exported here.
+"""
+
+#: Default polling settings
+POLL_DEFAULTS = {
+    'initial_interval': 0.5,
+    'max_interval': 30.0,
+    'backoff': 2.0,
+    'jitter': 0.2
+}
+
+#: Girder job status codes (girder_jobs.constants.JobStatus)
+GIRDER_JOB_STATUS = {
+    'INACTIVE': 0,
+    'QUEUED': 1,
+    'RUNNING': 2,
+    'SUCCESS': 3,
+    'ERROR': 4,
+    'CANCELED': 5
+}
+
+_lock = threading.Lock()
+_poller = None
+
+
+class JobTimeoutError(GaiaException):
+    """
+    Raised by a JobFuture whose job did not finish within its timeout
+    """
+    pass
+
+
+def get_poller():
+    """
+    Return the shared JobPoller, starting it on first use
+    """
+    global _poller
+    with _lock:
+        if _poller is None:
+            _poller = JobPoller()
+    return _poller
+
+
+def submit(poll, **kwargs):
+    """
+    Track a remote job with the shared poller
+
+    :param poll: function called to check the job; returns None while the
+    job is running, the job's result once it is done, and raises an
+    exception if the job failed
+    :param kwargs: timeout and polling settings, see JobPoller.submit
+    :return: JobFuture
+    """
+    return get_poller().submit(poll, **kwargs)
+
+
+def girder_job(job_id, result=None, **kwargs):
+    """
+    Future for a girder job (e.g. from the raster/clip endpoint)
+
+    :param job_id: girder job id
+    :param result: function mapping the finished job object to the
+    future's result (default: the job object)
+    :param kwargs: timeout and polling settings, see JobPoller.submit
+    :return: JobFuture
+    """
+    from gaia.io.girder_interface import GirderInterface
+    gc = GirderInterface._get_girder_client()
+
+    def poll():
+        job = gc.get('job/{}'.format(job_id))
+        status = job['status']
+        if status < GIRDER_JOB_STATUS['SUCCESS']:
+            return None
+        if status != GIRDER_JOB_STATUS['SUCCESS']:
+            raise GaiaException('Girder job {} {}'.format(
+                job_id, 'failed' if status == GIRDER_JOB_STATUS['ERROR']
+                else 'was canceled'))
+        return job if result is None else result(job)
+
+    return submit(poll, **kwargs)
+
+
+class JobFuture(Future):
+    """
+    Future resolved by a JobPoller. Cancelling it stops the polling, not
+    the remote job.
+    """
+    def __init__(self, poll, timeout=None):
+        super(JobFuture, self).__init__()
+        self.poll = poll
+        self.deadline = None if timeout is None else time.time() + timeout
+        self.polls = 0
+
+
+class JobPoller(object):
+    """
+    A single thread that polls any number of outstanding jobs, each on its
+    own exponential backoff schedule
+    """
+    def __init__(self):
+        self._queue = []  # heap of (due time, sequence, future, interval)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name='gaia-job-poller')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, poll, timeout=None,
+               initial_interval=POLL_DEFAULTS['initial_interval'],
+               max_interval=POLL_DEFAULTS['max_interval'],
+               backoff=POLL_DEFAULTS['backoff'],
+               jitter=POLL_DEFAULTS['jitter']):
+        """
+        Start polling a job
+
+        :param poll: function called to check the job; returns None while
+        the job is running, the job's result once it is done, and raises
+        an exception if the job failed
+        :param timeout: seconds after which the future fails with a
+        JobTimeoutError (default: no timeout)
+        :param initial_interval: seconds before the first poll
+        :param max_interval: upper bound of the polling interval
+        :param backoff: factor by which the interval grows after each poll
+        :param jitter: relative random variation of each interval
+        :return: JobFuture
+        """
+        future = JobFuture(poll, timeout)
+        future.schedule = (initial_interval, max_interval, backoff, jitter)
+        self._push(future, initial_interval)
+        return future
+
+    def pending(self):
+        """
+        Number of jobs still being polled
+        """
+        with self._condition:
+            return len(self._queue)
+
+    def _push(self, future, interval):
+        jitter = future.schedule[3]
+        delay = interval * random.uniform(1 - jitter, 1 + jitter)
+        if future.deadline is not None:
+            delay = min(delay, max(0, future.deadline - time.time()))
+        with self._condition:
+            heapq.heappush(self._queue, (
+                time.time() + delay, next(self._sequence), future, interval))
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue or self._queue[0][0] > time.time():
+                    timeout = None
+                    if self._queue:
+                        timeout = self._queue[0][0] - time.time()
+                    self._condition.wait(timeout)
+                _, _, future, interval = heapq.heappop(self._queue)
+            self._poll(future, interval)
+
+    def _poll(self, future, interval):
+        if future.done():
+            return
+        future.polls += 1
+        try:
+            result = future.poll()
+        except Exception as e:
+            self._resolve(future.set_exception, e)
+            return
+        if result is not None:
+            self._resolve(future.set_result, result)
+        elif future.deadline is not None and time.time() >= future.deadline:
+            self._resolve(future.set_exception, JobTimeoutError(
+                'Job did not finish within its timeout'))
+        else:
+            _, max_interval, backoff, _ = future.schedule
+            self._push(future, min(interval * backoff, max_interval))
+
+    @staticmethod
+    def _resolve(method, value):
+        """
+        Set a future's result or exception, unless it was cancelled
+        meanwhile
+        """
+        try:
+            method(value)
+        except InvalidStateError:
+            pass
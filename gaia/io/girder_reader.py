@@ -2,7 +2,7 @@ from __future__ import absolute_import, print_function
 import os
 
 from gaia import GaiaException
-from gaia.girder_data import GirderDataObject
+from gaia.girder_data import GirderDataObject, GirderFolderObject
 from gaia.io.gaia_reader import GaiaReader
 from gaia.io.girder_interface import GirderInterface
 import gaia.formats as formats
@@ -76,8 +76,7 @@ class GirderReader(GaiaReader):
                 raise GaiaException('Internal error - not a girder url')
 
             resource_type, resource_id = parsed_result
-            return GirderDataObject(
-                self, resource_type, resource_id, bounds=self.bounds)
+            return self._data_object(resource_type, resource_id)
 
         elif self.girder_source:
             gint, path = self.girder_source
@@ -89,13 +88,22 @@ class GirderReader(GaiaReader):
 
             resource_type = resource['_modelType']
             resource_id = resource['_id']
-            return GirderDataObject(
-                self, resource_type, resource_id, bounds=self.bounds)
+            return self._data_object(resource_type, resource_id)
 
         raise GaiaException(
             'Internal error - should never reach end of GirderReader.read()')
         return None
 
+    def _data_object(self, resource_type, resource_id):
+        """Returns the data object proxying a girder item or folder
+
+        Folders become collections of their items (see GirderFolderObject)
+        """
+        if resource_type == 'folder':
+            return GirderFolderObject(self, resource_id)
+        return GirderDataObject(
+            self, resource_type, resource_id, bounds=self.bounds)
+
     def load_metadata(self, dataObject):
         # Todo
         pass
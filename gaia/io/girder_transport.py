@@ -0,0 +1,237 @@
+from __future__ import absolute_import, division, print_function
+
+from concurrent.futures import ThreadPoolExecutor
+import io
+import os
+import tempfile
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+"""
+Pooled HTTP transport for the Girder REST API: one keep-alive session
+(shared with girder_client) whose connection pool bounds the number of
+parallel requests, and which retries failed requests with exponential
+backoff.
+"""
+
+#: Default transport settings, overridden by the [gaia_girder] config section
+TRANSPORT_DEFAULTS = {
+    'pool_size': 8,
+    'retries': 3,
+    'backoff_factor': 0.5,
+    'timeout': 60
+}
+
+#: HTTP status codes that are retried
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+#: Bytes read at a time when downloading files
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+#: Number of elements requested per page from list endpoints
+PAGE_SIZE = 500
+
+
+def get_transport_options(**options):
+    """
+    Merge transport settings from the defaults, the gaia config file and
+    the given keyword arguments (highest priority)
+
+    :return: dict of GirderTransport arguments
+    """
+    import gaia
+    settings = dict(TRANSPORT_DEFAULTS)
+    section = gaia.config.get('gaia_girder', {})
+    for key, default in TRANSPORT_DEFAULTS.items():
+        value = options.get(key, section.get(key))
+        if value is None or value == '':
+            continue
+        settings[key] = type(default)(value)
+    return settings
+
+
+def create_session(pool_size, retries, backoff_factor):
+    """
+    Create a requests session with a keep-alive connection pool of
+    pool_size connections per host and automatic retries
+
+    :return: requests.Session
+    """
+    retry = Retry(
+        total=retries, connect=retries, read=retries, status=retries,
+        backoff_factor=backoff_factor, status_forcelist=RETRY_STATUS,
+        raise_on_status=False)
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size,
+        max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class GirderTransport(object):
+    """
+    Keep-alive, retrying access to a Girder REST API, with batch methods
+    that run up to pool_size requests in parallel
+    """
+    def __init__(self, api_url, token=None, pool_size=None, retries=None,
+                 backoff_factor=None, timeout=None):
+        settings = get_transport_options(
+            **{k: v for k, v in dict(
+                pool_size=pool_size, retries=retries,
+                backoff_factor=backoff_factor, timeout=timeout).items()
+               if v is not None})
+        self.api_url = api_url.rstrip('/')
+        self.pool_size = settings['pool_size']
+        self.timeout = settings['timeout']
+        self.session = create_session(
+            self.pool_size, settings['retries'], settings['backoff_factor'])
+        if token:
+            self.set_token(token)
+
+    def set_token(self, token):
+        """
+        Authenticate all further requests with a Girder token
+        """
+        self.session.headers['Girder-Token'] = token
+
+    def url(self, path):
+        """
+        Full url of an API path, e.g. 'item/{id}/geometa'
+        """
+        return '{}/{}'.format(self.api_url, path.lstrip('/'))
+
+    def get(self, path, parameters=None):
+        """
+        GET an API path
+
+        :param path: API path, e.g. 'item/{id}'
+        :param parameters: query parameters
+        :return: decoded JSON response
+        """
+        return self.request('GET', path, parameters)
+
+    def request(self, method, path, parameters=None, data=None, json=None):
+        """
+        Send a request to an API path
+
+        :param method: HTTP method, e.g. 'POST'
+        :param path: API path, e.g. 'file/chunk'
+        :param parameters: query parameters
+        :param data: request body (bytes)
+        :param json: JSON request body
+        :return: decoded JSON response
+        """
+        r = self.session.request(
+            method, self.url(path), params=parameters, data=data, json=json,
+            timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def get_many(self, paths, parameters=None):
+        """
+        GET several API paths concurrently
+
+        :param paths: list of API paths
+        :param parameters: query parameters sent with every request
+        :return: list of decoded JSON responses, in the order of paths
+        """
+        return self.map(lambda path: self.get(path, parameters), paths)
+
+    def paginate(self, path, parameters=None, offset=0, limit=0,
+                 page_size=PAGE_SIZE, prefetch=True):
+        """
+        Iterate over the elements of a list endpoint that takes offset and
+        limit parameters, one page at a time. While a page is being
+        consumed the next one is fetched in the background, and at most
+        two pages are held in memory.
+
+        :param path: API path, e.g. 'item'
+        :param parameters: query parameters sent with every request
+        :param offset: index of the first element
+        :param limit: maximum number of elements (0 for all)
+        :param page_size: number of elements per request
+        :param prefetch: fetch the next page in the background
+        :return: generator of decoded JSON elements
+        """
+        def fetch(start):
+            count = page_size
+            if limit:
+                count = min(page_size, offset + limit - start)
+            page_parameters = dict(parameters or {}, offset=start, limit=count)
+            return self.get(path, page_parameters), count
+
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            start = offset
+            pending = executor.submit(fetch, start) if executor else None
+            while True:
+                page, count = pending.result() if executor else fetch(start)
+                start += len(page)
+                more = len(page) == count and \
+                    (not limit or start < offset + limit)
+                if more and executor:
+                    pending = executor.submit(fetch, start)
+                for element in page:
+                    yield element
+                if not more:
+                    return
+        finally:
+            if executor:
+                executor.shutdown(wait=False)
+
+    def map(self, func, iterable):
+        """
+        Apply func to every element of iterable on up to pool_size threads,
+        so that each thread can hold one pooled connection
+
+        :return: list of results, in order
+        """
+        items = list(iterable)
+        if len(items) < 2:
+            return [func(item) for item in items]
+        workers = min(self.pool_size, len(items))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(func, items))
+
+    def download_file(self, file_id, path, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """
+        Stream a Girder file to a local path. The file is written under a
+        temporary name and renamed when complete, so an interrupted
+        download never leaves a partial file at path.
+
+        :param file_id: Girder file id
+        :param path: local file path
+        :return: number of bytes written
+        """
+        # A unique name, as several threads may download the same file
+        fd, partial = tempfile.mkstemp(
+            suffix='.part', prefix=os.path.basename(path) + '.',
+            dir=os.path.dirname(os.path.abspath(path)))
+        size = 0
+        r = None
+        try:
+            with io.open(fd, 'wb') as fp:
+                r = self.session.get(
+                    self.url('file/{}/download'.format(file_id)),
+                    stream=True, timeout=self.timeout)
+                r.raise_for_status()
+                for chunk in r.iter_content(chunk_size=chunk_size):
+                    fp.write(chunk)
+                    size += len(chunk)
+            os.rename(partial, path)
+        finally:
+            if r is not None:
+                r.close()
+            if os.path.exists(partial):
+                os.remove(partial)
+        return size
+
+    def close(self):
+        """
+        Close all pooled connections
+        """
+        self.session.close()
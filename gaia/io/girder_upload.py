@@ -0,0 +1,207 @@
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import io
+import os
+import tempfile
+
+import requests
+
+from gaia.io.girder_cache import _makedirs, get_cache_options
+
+"""
+Parallel, resumable and deduplicated uploads of local files to Girder.
+
+Files are identified by their sha512 checksum, which is stored in the
+metadata of the uploaded items. A file whose checksum matches an item in
+the target folder is skipped; one that matches an item in the cache
+folder is copied on the server instead of being transferred again. Files
+are uploaded concurrently in chunks, and the ids of unfinished uploads
+are kept in a journal (one small file per upload in a directory shared by
+all processes) so that an interrupted upload continues from the last
+chunk Girder received.
+"""
+
+#: Bytes sent per upload request
+UPLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+
+#: Bytes read at a time when hashing files
+HASH_BLOCK_SIZE = 1024 * 1024
+
+#: Number of times in a row a failed chunk is resent after checking the
+#: offset
+UPLOAD_RETRIES = 3
+
+#: Item metadata key holding the content checksum
+HASH_KEY = 'sha512'
+
+
+def file_sha512(path):
+    """
+    Compute the sha512 checksum of a local file
+
+    :return: hex digest
+    """
+    digest = hashlib.sha512()
+    with io.open(path, 'rb') as fp:
+        for block in iter(lambda: fp.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class GirderUploader(object):
+    """
+    Uploads local files to Girder folders, see the module documentation
+
+    :param transport: GirderTransport used for all requests
+    :param cache_folder_id: girder folder keeping one copy of every
+    uploaded file, shared by all uploads (default: none)
+    :param chunk_size: bytes per upload request
+    :param journal: directory recording unfinished uploads (default:
+    uploads in the gaia cache directory)
+    """
+    def __init__(self, transport, cache_folder_id=None,
+                 chunk_size=UPLOAD_CHUNK_SIZE, journal=None):
+        self.transport = transport
+        self.cache_folder_id = cache_folder_id
+        self.chunk_size = chunk_size
+        if journal is None:
+            journal = os.path.join(
+                get_cache_options()['cache_dir'], 'uploads')
+        self.journal = journal
+
+    def upload_files(self, paths, folder_id):
+        """
+        Upload files into a folder, concurrently
+
+        :param paths: list of local file paths
+        :param folder_id: target girder folder id
+        :return: list of girder items, in the order of paths
+        """
+        hashes = self.transport.map(file_sha512, paths)
+        existing = self.hashed_items(folder_id)
+        cached = {}
+        if self.cache_folder_id and self.cache_folder_id != folder_id:
+            cached = self.hashed_items(self.cache_folder_id)
+
+        def upload(task):
+            path, sha512 = task
+            name = os.path.basename(path)
+            item = existing.get((sha512, name))
+            if item is not None:
+                return item
+            source = cached.get(sha512)
+            if source is None:
+                target = self.cache_folder_id or folder_id
+                source = self.upload_file(path, target, sha512)
+                if target == folder_id:
+                    return source
+            return self.copy_item(source, folder_id, name)
+
+        return self.transport.map(upload, list(zip(paths, hashes)))
+
+    def hashed_items(self, folder_id):
+        """
+        Index the items of a folder that have a content checksum
+
+        :return: dict mapping checksums (and (checksum, name) pairs) to
+        girder items
+        """
+        index = {}
+        for item in self.transport.paginate(
+                'item', {'folderId': folder_id}):
+            sha512 = (item.get('meta') or {}).get(HASH_KEY)
+            if sha512:
+                index[sha512] = item
+                index[(sha512, item['name'])] = item
+        return index
+
+    def copy_item(self, item, folder_id, name):
+        """
+        Copy an item into a folder on the server (no data is transferred)
+        """
+        return self.transport.request(
+            'POST', 'item/{}/copy'.format(item['_id']),
+            {'folderId': folder_id, 'name': name})
+
+    def upload_file(self, path, folder_id, sha512=None):
+        """
+        Upload a file in chunks, resuming an earlier interrupted upload of
+        the same content to the same folder
+
+        :param path: local file path
+        :param folder_id: target girder folder id
+        :param sha512: checksum of the file, if already known
+        :return: girder item, with the checksum in its metadata
+        """
+        if sha512 is None:
+            sha512 = file_sha512(path)
+        size = os.path.getsize(path)
+        key = '{}:{}'.format(folder_id, sha512)
+
+        upload, offset = None, 0
+        upload_id = self._journal_get(key)
+        if upload_id is not None:
+            try:
+                offset = self.transport.get(
+                    'file/offset', {'uploadId': upload_id})['offset']
+                upload = {'_id': upload_id}
+            except requests.HTTPError:
+                # Expired or finished upload
+                self._journal_set(key, None)
+        if upload is None:
+            upload = self.transport.request('POST', 'file', {
+                'parentType': 'folder', 'parentId': folder_id,
+                'name': os.path.basename(path), 'size': size})
+            if upload.get('_modelType') != 'file':
+                self._journal_set(key, upload['_id'])
+
+        with io.open(path, 'rb') as fp:
+            retries = UPLOAD_RETRIES
+            while upload.get('_modelType') != 'file':
+                fp.seek(offset)
+                chunk = fp.read(self.chunk_size)
+                try:
+                    upload = self.transport.request(
+                        'POST', 'file/chunk',
+                        {'uploadId': upload['_id'], 'offset': offset},
+                        data=chunk)
+                    offset += len(chunk)
+                    # Only consecutive failures use up the retries
+                    retries = UPLOAD_RETRIES
+                except requests.RequestException:
+                    if not retries:
+                        raise
+                    retries -= 1
+                    offset = self.transport.get(
+                        'file/offset', {'uploadId': upload['_id']})['offset']
+        self._journal_set(key, None)
+
+        return self.transport.request(
+            'PUT', 'item/{}/metadata'.format(upload['itemId']),
+            json={HASH_KEY: sha512})
+
+    def _journal_path(self, key):
+        return os.path.join(
+            self.journal, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def _journal_get(self, key):
+        try:
+            with io.open(self._journal_path(key)) as fp:
+                return fp.read().strip() or None
+        except (IOError, OSError):
+            return None
+
+    def _journal_set(self, key, upload_id):
+        path = self._journal_path(key)
+        if upload_id is None:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return
+        _makedirs(self.journal)
+        fd, partial = tempfile.mkstemp(suffix='.part', dir=self.journal)
+        with io.open(fd, 'w') as fp:
+            fp.write(u'{}'.format(upload_id))
+        os.rename(partial, path)
@@ -0,0 +1,383 @@
+from __future__ import absolute_import, division, print_function
+
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import gaia
+from gaia.io import girder_jobs
+from gaia.io.girder_cache import _makedirs, get_cache_options
+from gaia.io.slurm_emulator import SlurmEmulator
+from gaia.util import GaiaException
+
+"""
+Execution backends for the jobs submitted by CumulusInterface.
+
+A backend runs a job script next to an input folder, and collects what
+the job writes into an output folder. The NERSC backend (in
+cumulus_interface) does this on a cluster through girder/cumulus;
+LocalBackend runs the same scripts on this machine with the SLURM
+emulator, so that jobs can use all local cores and job orchestration can
+be tested offline.
+"""
+
+#: Number of local jobs running at the same time
+LOCAL_MAX_JOBS = 4
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+
+
+class JobBackend(object):
+    """
+    Interface of the execution backends. A backend handles one job at a
+    time: the methods below are called in order by
+    CumulusInterface.submit_crop, after which the job can be tracked with
+    job_future().
+    """
+    #: Name of the machine the jobs run on
+    machine = None
+
+    #: Script cropping a raster in one task, on the machine (default:
+    #: gaia.geo.tiled_crop with a single tile)
+    crop_script = None
+
+    def create_cluster(self, machine_name, cluster_name=None, timeout=None):
+        '''Makes sure the machine is ready to run jobs
+        '''
+        raise NotImplementedError()
+
+    def environment_commands(self):
+        '''Returns the script commands setting up the job environment
+        '''
+        raise NotImplementedError()
+
+    def input_path(self, input_object):
+        '''Returns the path of a data object's file, as seen by the job
+        '''
+        raise NotImplementedError()
+
+    def create_slurm_script(self, name, command_list):
+        '''Creates script to submit job
+        '''
+        raise NotImplementedError()
+
+    def create_job(self, job_name, tail=None):
+        '''Creates the job with its input and output folders
+        '''
+        raise NotImplementedError()
+
+    def upload_inputs(self, files_to_upload, folders_to_upload=[]):
+        '''Copies local files and folders into the input folder
+        '''
+        raise NotImplementedError()
+
+    def upload_input_text(self, name, text):
+        '''Writes a text file (e.g. a geometry) into the input folder
+        '''
+        raise NotImplementedError()
+
+    def set_job_metadata(self, meta):
+        '''Writes metadata to job
+        '''
+        raise NotImplementedError()
+
+    def job_output_dir(self, job_name):
+        '''Returns the directory the job runs in on the machine
+        '''
+        raise NotImplementedError()
+
+    def submit_job(self, machine, project_account, job_output_dir,
+                   timeout_minutes=5, queue='debug', qos=None,
+                   number_of_nodes=1):
+        '''Starts the job, returning its id
+        '''
+        raise NotImplementedError()
+
+    def job_future(self, job_id=None, timeout=None):
+        '''Returns a future for the completion of a submitted job
+        '''
+        raise NotImplementedError()
+
+    def download_results(self, destination_folder):
+        '''Downloads all output files to a local directory
+        '''
+        raise NotImplementedError()
+
+    def release_resources(self):
+        '''Closes/deletes any current resources
+        '''
+        raise NotImplementedError()
+
+
+def _get_executor():
+    """
+    Return the shared thread pool running local job scripts, and the
+    semaphore sharing the CPUs among the tasks of all jobs
+    """
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=LOCAL_MAX_JOBS)
+            _slots = threading.BoundedSemaphore(multiprocessing.cpu_count())
+    return _executor, _slots
+
+
+def _copy(source, destination):
+    """
+    Copy a file or folder tree, hard-linking files where possible
+    """
+    if os.path.isdir(source):
+        _makedirs(destination)
+        for name in os.listdir(source):
+            _copy(os.path.join(source, name), os.path.join(destination, name))
+        return destination
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+    return destination
+
+
+class LocalBackend(JobBackend):
+    """
+    Runs jobs on this machine
+
+    Every job has a folder holding input_files, output_files and the job
+    document (job.json) with the job's commands, status and metadata.
+    Submitted jobs run on a shared pool of LOCAL_MAX_JOBS threads, each
+    running its script with the SLURM emulator in the job output
+    directory; the srun tasks of all jobs share one slot per CPU. The
+    inputs are copied into the job output directory before the script
+    runs, and everything else the job leaves there (including its log,
+    slurm-<job id>.out) is copied to output_files when it ends.
+
+    :param job_dir: folder holding the job folders (default: jobs in the
+    gaia cache directory)
+    """
+    machine = 'localhost'
+
+    def __init__(self, job_dir=None):
+        if job_dir is None:
+            job_dir = os.path.join(get_cache_options()['cache_dir'], 'jobs')
+        self.job_dir = os.path.abspath(job_dir)
+        self._commands = None
+        self._script_name = None
+        self._staged = []
+        self._job_id = None
+        self._job_folder = None
+        self._input_folder = None
+        self._output_folder = None
+        self._job_lock = threading.Lock()
+
+    def create_cluster(self, machine_name=None, cluster_name=None,
+                       timeout=None):
+        '''Creates the folder holding the jobs
+        '''
+        _makedirs(self.job_dir)
+
+    def environment_commands(self):
+        '''Returns the commands making the running gaia importable
+        '''
+        package_path = os.path.dirname(os.path.dirname(
+            os.path.abspath(gaia.__file__)))
+        return ['export PYTHONPATH={}'.format(package_path)]
+
+    def input_path(self, input_object):
+        '''Returns the file of a data object in the job's input folder
+
+        Girder items are downloaded (through the download cache), and
+        staged with the other files of the item when the job is created;
+        objects read from local files use these files in place.
+        '''
+        if hasattr(input_object, 'local_path'):
+            path = input_object.local_path()
+            directory = os.path.dirname(path)
+            self._staged.extend(os.path.join(directory, name)
+                                for name in sorted(os.listdir(directory)))
+            return os.path.basename(path)
+
+        path = getattr(getattr(input_object, '_reader', None), 'uri', None)
+        if not path or not os.path.isfile(path):
+            raise GaiaException(
+                'Input object is not a girder item or local file')
+        return os.path.abspath(path)
+
+    def create_slurm_script(self, name, command_list):
+        '''Keeps the commands of the next job
+        '''
+        self._script_name = name
+        self._commands = list(command_list)
+
+    def create_job(self, job_name, tail=None):
+        '''Creates the job folder and document
+        '''
+        self._job_id = uuid.uuid4().hex  # unique name
+        self._job_folder = os.path.join(self.job_dir, self._job_id)
+        self._input_folder = os.path.join(self._job_folder, 'input_files')
+        self._output_folder = os.path.join(self._job_folder, 'output_files')
+        _makedirs(self._input_folder)
+        _makedirs(self._output_folder)
+        self.upload_inputs(self._staged)
+        self._staged = []
+        self._update_job(
+            name=job_name or 'CumulusJob', script=self._script_name,
+            commands=self._commands, status='created', metadata={},
+            created=time.time())
+        print('Created job_id', self._job_id)
+
+    def upload_inputs(self, files_to_upload, folders_to_upload=[]):
+        '''Copies input files and folders into the input folder
+        '''
+        if not self._input_folder:
+            raise Exception('Input folder missing')
+        for path in list(files_to_upload) + list(folders_to_upload):
+            if not path or not os.path.exists(path):
+                raise Exception('Input not found: %s' % path)
+            basename = os.path.basename(os.path.normpath(path))
+            destination = os.path.join(self._input_folder, basename)
+            if not os.path.exists(destination):
+                _copy(path, destination)
+
+    def upload_input_text(self, name, text):
+        '''Writes a text file into the input folder
+        '''
+        with io.open(os.path.join(self._input_folder, name), 'w') as fp:
+            fp.write(text)
+
+    def set_job_metadata(self, meta):
+        '''Writes metadata to job
+        '''
+        self._update_job(metadata=meta)
+
+    def job_output_dir(self, job_name):
+        '''Returns the directory the job runs in
+        '''
+        return os.path.join(self._job_folder, 'scratch')
+
+    def submit_job(self, machine=None, project_account=None,
+                   job_output_dir=None, timeout_minutes=None, queue=None,
+                   qos=None, number_of_nodes=1):
+        '''Queues the job on the local job pool
+
+        The cluster options (account, queue, wall time...) are ignored.
+        '''
+        if job_output_dir is None:
+            job_output_dir = self.job_output_dir(None)
+        self._update_job(status='queued', jobOutputDir=job_output_dir)
+        executor, slots = _get_executor()
+        executor.submit(self._run, self._job_folder, job_output_dir, slots)
+        print('Submitted job', self._job_id)
+        return self._job_id
+
+    def job_future(self, job_id=None, timeout=None):
+        '''Returns a future for the completion of a submitted job
+
+        The future's result is the final job document. Futures of many
+        jobs can be combined with girder_jobs.wait/as_completed.
+        '''
+        job_folder = self._job_folder if job_id is None else \
+            os.path.join(self.job_dir, job_id)
+
+        def poll():
+            job = self._read_job(job_folder)
+            if job['status'] == 'complete':
+                return job
+            elif job['status'] == 'error':
+                raise GaiaException('Job %s failed: %s' % (
+                    os.path.basename(job_folder), job.get('error')))
+            return None
+
+        return girder_jobs.submit(poll, timeout=timeout)
+
+    def download_results(self, destination_folder):
+        '''Copies all output files to a local directory
+        '''
+        _makedirs(destination_folder)
+        for name in os.listdir(self._output_folder):
+            destination = os.path.join(destination_folder, name)
+            if os.path.isdir(destination):
+                shutil.rmtree(destination)
+            elif os.path.exists(destination):
+                os.remove(destination)
+            _copy(os.path.join(self._output_folder, name), destination)
+        print('Downloaded files to %s' % destination_folder)
+
+    def release_resources(self):
+        '''Deletes the job folder
+        '''
+        if self._job_folder is not None:
+            shutil.rmtree(self._job_folder, ignore_errors=True)
+        self._commands = None
+        self._staged = []
+        self._job_id = None
+        self._job_folder = None
+        self._input_folder = None
+        self._output_folder = None
+
+    def _run(self, job_folder, work_dir, slots):
+        """
+        Run a job script (on a pool thread), then collect its outputs
+        """
+        input_folder = os.path.join(job_folder, 'input_files')
+        log_path = os.path.join(
+            work_dir, 'slurm-{}.out'.format(os.path.basename(job_folder)))
+        inputs = set()
+        error = None
+        try:
+            # Any failure, even before the script starts, ends the job
+            job = self._read_job(job_folder)
+            inputs = set(os.listdir(input_folder))
+            self._update_job(status='running', started=time.time(),
+                             job_folder=job_folder)
+            _makedirs(work_dir)
+            for name in inputs:
+                destination = os.path.join(work_dir, name)
+                if not os.path.exists(destination):
+                    _copy(os.path.join(input_folder, name), destination)
+            with io.open(log_path, 'w') as log:
+                SlurmEmulator(cwd=work_dir, output=log, slots=slots).run(
+                    job['commands'] or [])
+        except Exception as e:
+            error = str(e)
+
+        output_folder = os.path.join(job_folder, 'output_files')
+        try:
+            names = os.listdir(work_dir) if os.path.isdir(work_dir) else []
+            for name in names:
+                destination = os.path.join(output_folder, name)
+                if name not in inputs and not os.path.exists(destination):
+                    _copy(os.path.join(work_dir, name), destination)
+        except Exception as e:
+            error = error or str(e)
+        self._update_job(
+            status='error' if error else 'complete', error=error,
+            finished=time.time(), job_folder=job_folder)
+
+    @staticmethod
+    def _read_job(job_folder):
+        with io.open(os.path.join(job_folder, 'job.json')) as fp:
+            return json.load(fp)
+
+    def _update_job(self, job_folder=None, **fields):
+        """
+        Update fields of a job document (written atomically)
+        """
+        job_folder = job_folder or self._job_folder
+        path = os.path.join(job_folder, 'job.json')
+        with self._job_lock:
+            job = {'_id': os.path.basename(job_folder)}
+            if os.path.exists(path):
+                job = self._read_job(job_folder)
+            job.update(fields)
+            partial = '{}.{}.part'.format(path, os.getpid())
+            with io.open(partial, 'w') as fp:
+                fp.write(json.dumps(job))
+            os.rename(partial, path)
@@ -0,0 +1,58 @@
+from __future__ import absolute_import, division, print_function
+from builtins import (
+    bytes, str, open, super, range, zip, round, input, int, pow, object
+)
+
+import numpy as np
+
+from gaia.geo.gdal_functions import numpy_to_dataset
+from gaia.io.gaia_reader import GaiaReader
+from gaia.io.gdal_reader import GaiaGDALReader
+import gaia.formats as formats
+import gaia.types as types
+
+
+class GaiaNumpyReader(GaiaGDALReader):
+    """
+    A specific subclass for wrapping in-memory numpy arrays as rasters.
+
+    The array is not copied: the data object is backed by a GDAL dataset
+    that references the array buffer.
+    """
+    def __init__(self, data_source, *args, **kwargs):
+        GaiaReader.__init__(self, *args, **kwargs)
+
+        self.array = data_source
+        self.uri = None
+        self.ext = None
+        # Georeferencing of the array: GDAL geotransform and the CRS as
+        # an EPSG code (crs) or a WKT string (projection)
+        self.geotransform = kwargs.get('geotransform')
+        self.crs = kwargs.get('crs')
+        self.projection = kwargs.get('projection')
+        self.nodata = kwargs.get('nodata')
+
+        self.as_numpy_array = False
+        self.as_single_band = True
+        self.old_nodata = None
+        self.new_nodata = None
+
+    @staticmethod
+    def can_read(data_source, *args, **kwargs):
+        return isinstance(data_source, np.ndarray)
+
+    def load_data(self, dataObject):
+        projection = self.projection
+        if projection is None and self.crs is not None:
+            projection = int(self.crs)
+
+        dataObject.set_data(numpy_to_dataset(
+            self.array, geotransform=self.geotransform,
+            projection=projection, nodata=self.nodata))
+
+        if self.epsg and dataObject.get_epsg() != self.epsg:
+            dataObject.reproject(self.epsg)
+
+        dataObject.set_metadata({})
+        dataObject._datatype = types.RASTER
+        dataObject._dataformat = formats.RASTER
@@ -12,6 +12,7 @@ import gaia.formats as formats
 
 class GaiaPostGISReader(GaiaReader):
     required_arguments = ['table', 'dbname', 'hostname', 'user', 'password']
+    optional_arguments = ['filters', 'batch_size', 'pool_options']
 
     def __init__(self, *args, **kwargs):
         super(GaiaPostGISReader, self).__init__(*args, **kwargs)
@@ -30,9 +31,10 @@ class GaiaPostGISReader(GaiaReader):
 
     def load_data(self, dataObject):
         self.__set_db_properties(dataObject)
+        dataObject.set_data(dataObject.read_data())
 
     def __set_db_properties(self, dataObject):
-        for key in self.required_arguments:
+        for key in self.required_arguments + self.optional_arguments:
             if key in self._kwargs:
                 print('  Setting property %s to %s' % (key, self._kwargs[key]))
                 setattr(dataObject, key, self._kwargs[key])
@@ -0,0 +1,189 @@
+from __future__ import absolute_import, division, print_function
+
+import io
+import math
+import os
+
+import gdal
+import numpy as np
+from osgeo.gdal_array import GDALTypeCodeToNumericTypeCode
+
+from gaia.geo.gdal_functions import get_dataset
+from gaia.util import GaiaException
+
+"""
+Memory-mapped access to the band data of uncompressed GeoTIFFs.
+
+Band pixels are exposed as numpy views over the file's strips or tiles,
+so reading a subset of a band only pages in the parts of the file it
+touches, and every process mapping the same file shares the OS page
+cache instead of holding a private copy.
+"""
+
+#: Byte order marks at the start of a TIFF file
+TIFF_BYTE_ORDER = {
+    b'II': '<',
+    b'MM': '>'
+}
+
+
+def memmap_bands(raster):
+    """
+    Map the bands of an uncompressed GeoTIFF as read-only numpy views
+
+    Striped rasters map to 2D numpy.memmap views. Tiled rasters map to
+    TiledBand objects, since tiles cannot be viewed as one 2D array
+    without copying; slicing a TiledBand copies only the tiles the slice
+    touches.
+
+    :param raster: GDAL Dataset or file path of a GeoTIFF
+    :return: list of band views, one per band
+    :raises GaiaException: if the raster layout cannot be memory-mapped
+    """
+    dataset = get_dataset(raster)
+    path = dataset.GetDescription()
+    if dataset.GetDriver().ShortName != 'GTiff' or not os.path.isfile(path):
+        raise GaiaException('Only GeoTIFF files can be memory-mapped')
+
+    structure = dataset.GetMetadata('IMAGE_STRUCTURE') or {}
+    if structure.get('COMPRESSION', 'NONE').upper() != 'NONE':
+        raise GaiaException('Cannot memory-map a compressed raster')
+    if 'NBITS' in structure:
+        raise GaiaException('Cannot memory-map a bit-packed raster')
+
+    bands = [dataset.GetRasterBand(i + 1)
+             for i in range(dataset.RasterCount)]
+    if len(set(band.DataType for band in bands)) > 1:
+        raise GaiaException('Cannot memory-map bands of mixed data types')
+    numeric_type = GDALTypeCodeToNumericTypeCode(bands[0].DataType)
+    if numeric_type is None:
+        raise GaiaException('Cannot memory-map {} data'.format(
+            gdal.GetDataTypeName(bands[0].DataType)))
+
+    with io.open(path, 'rb') as fp:
+        byte_order = TIFF_BYTE_ORDER.get(fp.read(2))
+    if byte_order is None:
+        raise GaiaException('{} is not a TIFF file'.format(path))
+    dtype = np.dtype(numeric_type).newbyteorder(byte_order)
+
+    width, height = dataset.RasterXSize, dataset.RasterYSize
+    block_x, block_y = bands[0].GetBlockSize()
+    tiled = block_x != width
+    blocks_x = int(math.ceil(width / float(block_x)))
+    blocks_y = int(math.ceil(height / float(block_y)))
+
+    # Pixel interleaved bands share one set of blocks
+    interleaved = (len(bands) > 1 and
+                   structure.get('INTERLEAVE', 'PIXEL').upper() == 'PIXEL')
+    samples = len(bands) if interleaved else 1
+    block_bytes = block_x * block_y * samples * dtype.itemsize
+
+    if tiled:
+        shape = (blocks_y, blocks_x, block_y, block_x)
+    else:
+        shape = (height, width)
+    if interleaved:
+        shape += (samples,)
+
+    maps = []
+    for band in bands[:1] if interleaved else bands:
+        offset = _contiguous_offset(band, blocks_x, blocks_y, block_bytes)
+        try:
+            maps.append(np.memmap(
+                path, dtype=dtype, mode='r', offset=offset, shape=shape))
+        except ValueError:
+            raise GaiaException('Raster blocks extend beyond end of file')
+
+    if interleaved:
+        views = [maps[0][..., i] for i in range(samples)]
+    else:
+        views = maps
+    if tiled:
+        views = [TiledBand(view, (height, width)) for view in views]
+    return views
+
+
+def _contiguous_offset(band, blocks_x, blocks_y, block_bytes):
+    """
+    File offset of the first block of a band, checking that the blocks
+    follow each other in row-major order without gaps
+
+    :raises GaiaException: for sparse or irregularly laid out files
+    """
+    offsets = [
+        band.GetMetadataItem('BLOCK_OFFSET_{}_{}'.format(x, y), 'TIFF')
+        for y in range(blocks_y) for x in range(blocks_x)
+    ]
+    if not all(offsets):
+        raise GaiaException('Cannot memory-map a sparse raster')
+    first = int(offsets[0])
+    for i, offset in enumerate(offsets):
+        if int(offset) != first + i * block_bytes:
+            raise GaiaException(
+                'Cannot memory-map a raster with irregular block layout')
+    return first
+
+
+class TiledBand(object):
+    """
+    Read-only 2D view of one band of a tiled raster
+
+    Backed by a memory-mapped (tile rows, tile columns, tile height,
+    tile width) array. Indexing with integers or slices copies only the
+    tiles that are touched; tile padding beyond the raster edge is never
+    returned.
+    """
+    def __init__(self, tiles, shape):
+        self.tiles = tiles
+        self.shape = tuple(shape)
+        self.dtype = tiles.dtype
+        self.ndim = 2
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None):
+        array = self[:, :]
+        return array if dtype is None else array.astype(dtype)
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        if len(key) != 2:
+            raise IndexError('TiledBand is two dimensional')
+
+        rows, row_scalar = self._indices(key[0], self.shape[0])
+        cols, col_scalar = self._indices(key[1], self.shape[1])
+        if not len(rows) or not len(cols):
+            return np.empty((len(rows), len(cols)), dtype=self.dtype)
+
+        tile_y, tile_x = self.tiles.shape[2:4]
+        ty0, ty1 = rows.min() // tile_y, rows.max() // tile_y + 1
+        tx0, tx1 = cols.min() // tile_x, cols.max() // tile_x + 1
+
+        # Stitch the touched tiles into one block, then pick the pixels
+        block = self.tiles[ty0:ty1, tx0:tx1].transpose(0, 2, 1, 3).reshape(
+            (ty1 - ty0) * tile_y, (tx1 - tx0) * tile_x)
+        result = block[np.ix_(rows - ty0 * tile_y, cols - tx0 * tile_x)]
+
+        if row_scalar and col_scalar:
+            return result[0, 0]
+        if row_scalar:
+            return result[0]
+        if col_scalar:
+            return result[:, 0]
+        return result
+
+    @staticmethod
+    def _indices(index, size):
+        """
+        Convert an integer or slice to an array of indices
+        """
+        if isinstance(index, slice):
+            return np.arange(*index.indices(size)), False
+        index = int(index)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError('index {} is out of bounds'.format(index))
+        return np.array([index]), True
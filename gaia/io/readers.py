@@ -1,4 +1,6 @@
 from gaia.io.gaia_reader import GaiaReader
 from gaia.io.geojson_reader import GaiaGeoJSONReader
 from gaia.io.gdal_reader import GaiaGDALReader
+from gaia.io.columnar_reader import GaiaColumnarReader
 from gaia.io.girder_reader import GirderReader
+from gaia.io.numpy_reader import GaiaNumpyReader
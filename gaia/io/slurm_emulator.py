@@ -0,0 +1,177 @@
+from __future__ import absolute_import, division, print_function
+
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+import os
+import shlex
+import string
+import subprocess
+import sys
+import threading
+
+from gaia.util import GaiaException
+
+"""
+Local emulation of SLURM job scripts, for running the scripts generated
+for the cluster (e.g. by CumulusInterface) on one machine.
+
+Commands run in order, and the script stops at the first failing one.
+'srun -n N command' runs N copies of the command concurrently, each with
+its task rank in SLURM_PROCID, as on the cluster. 'export' and 'cd' update
+the environment of the following commands; cluster environment setup
+('module', 'source activate', 'ulimit'...) is skipped. Commands starting
+with 'python' use the interpreter running gaia.
+"""
+
+#: Commands that set up the cluster environment, skipped locally
+SKIPPED_COMMANDS = ('module', 'source', 'conda', 'ulimit')
+
+#: srun options taking a value, by short and long name
+SRUN_OPTIONS = {
+    '-n': 'ntasks', '--ntasks': 'ntasks',
+    '-c': 'cpus_per_task', '--cpus-per-task': 'cpus_per_task',
+    '-N': 'nodes', '--nodes': 'nodes'
+}
+
+#: srun flags without a value
+SRUN_FLAGS = ('-u', '--unbuffered', '-l', '--label')
+
+
+def parse_srun(argv):
+    """
+    Split srun arguments into options and the command to run
+
+    :param argv: srun arguments (without 'srun')
+    :return: (dict of options, command argument list)
+    """
+    options = {'ntasks': 1, 'cpus_per_task': 1, 'nodes': 1}
+    i = 0
+    while i < len(argv) and argv[i].startswith('-'):
+        name, _, value = argv[i].partition('=')
+        if name in SRUN_FLAGS:
+            i += 1
+            continue
+        if name not in SRUN_OPTIONS:
+            raise GaiaException('Unsupported srun option {}'.format(name))
+        if not value:
+            i += 1
+            if i == len(argv):
+                raise GaiaException('srun option {} needs a value'.format(name))
+            value = argv[i]
+        options[SRUN_OPTIONS[name]] = int(value)
+        i += 1
+    if i == len(argv):
+        raise GaiaException('srun without a command')
+    return options, argv[i:]
+
+
+class SlurmEmulator(object):
+    """
+    Runs job script commands locally, see the module documentation
+
+    :param cwd: working directory of the job (default: current directory)
+    :param env: environment variables added to os.environ
+    :param max_tasks: maximum number of concurrent srun tasks (default:
+    one per CPU); further tasks wait for a free slot
+    :param output: file object receiving the output of all commands
+    (default: sys.stdout)
+    :param slots: semaphore limiting the tasks of several emulators
+    running at the same time (default: max_tasks slots of their own)
+    """
+    def __init__(self, cwd=None, env=None, max_tasks=None, output=None,
+                 slots=None):
+        self.cwd = os.path.abspath(cwd or os.getcwd())
+        self.env = dict(os.environ)
+        self.env.update(env or {})
+        self.max_tasks = max_tasks or multiprocessing.cpu_count()
+        self.output = output
+        self.slots = slots or threading.BoundedSemaphore(self.max_tasks)
+        self.steps = 0
+        self._lock = threading.Lock()
+
+    def run(self, commands):
+        """
+        Run the commands of a job script in order
+
+        :param commands: list of command strings
+        :raises GaiaException: when a command fails
+        """
+        for command in commands:
+            command = command.strip()
+            if not command or command.startswith('#'):
+                continue
+            argv = shlex.split(command)
+            if argv[0] in SKIPPED_COMMANDS:
+                continue
+            elif argv[0] == 'export':
+                for assignment in argv[1:]:
+                    name, _, value = assignment.partition('=')
+                    self.env[name] = string.Template(
+                        value).safe_substitute(self.env)
+            elif argv[0] == 'cd':
+                self.cwd = os.path.join(
+                    self.cwd, os.path.expanduser(argv[1]))
+            elif argv[0] == 'srun':
+                options, task_argv = parse_srun(argv[1:])
+                self.srun(task_argv, options['ntasks'])
+            else:
+                self._check(command, [self._execute(command, shell=True)])
+
+    def srun(self, argv, ntasks=1):
+        """
+        Run one job step of ntasks concurrent copies of a command
+
+        :param argv: command argument list
+        :param ntasks: number of tasks
+        :raises GaiaException: when any task fails
+        """
+        step = self.steps
+        self.steps += 1
+
+        def task(rank):
+            env = {
+                'SLURM_PROCID': str(rank),
+                'SLURM_LOCALID': str(rank),
+                'SLURM_NTASKS': str(ntasks),
+                'SLURM_STEP_ID': str(step)
+            }
+            with self.slots:
+                return self._execute(
+                    argv, env=env, label=rank if ntasks > 1 else None)
+
+        workers = min(ntasks, self.max_tasks)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            codes = list(executor.map(task, range(ntasks)))
+        self._check(' '.join(argv), codes)
+
+    def _execute(self, command, shell=False, env=None, label=None):
+        """
+        Run one process, copying its output (prefixed by the task label)
+
+        :return: exit code
+        """
+        if shell:
+            if command.split(None, 1)[0] == 'python':
+                command = sys.executable + command[len('python'):]
+        elif command[0] == 'python':
+            command = [sys.executable] + list(command[1:])
+        process_env = dict(self.env)
+        process_env.update(env or {})
+        process = subprocess.Popen(
+            command, shell=shell, cwd=self.cwd, env=process_env,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output = process.communicate()[0].decode('utf-8', 'replace')
+        prefix = '' if label is None else '{}: '.format(label)
+        with self._lock:
+            stream = self.output or sys.stdout
+            for line in output.splitlines():
+                stream.write('{}{}\n'.format(prefix, line))
+        return process.returncode
+
+    @staticmethod
+    def _check(command, codes):
+        failed = [(rank, code) for rank, code in enumerate(codes) if code]
+        if failed:
+            raise GaiaException('Command failed ({}): {}'.format(
+                ', '.join('task {} exited with {}'.format(rank, code)
+                          for rank, code in failed), command))
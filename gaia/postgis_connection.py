@@ -0,0 +1,172 @@
+from __future__ import absolute_import, division, print_function
+from builtins import (
+    bytes, str, open, super, range, zip, round, input, int, pow, object
+)
+
+import threading
+import time
+
+from sqlalchemy import create_engine, MetaData, Table
+from geoalchemy2 import Geometry  # noqa: F401 (registers geometry types)
+
+from gaia.util import sqlengines
+
+"""
+Shared SQLAlchemy engines (connection pools) and a cache of reflected
+table metadata, so that opening many PostGIS-backed data objects neither
+opens a new pool nor re-reflects the same table each time.
+"""
+
+#: Default pool settings, overridden by the [gaia_postgis] config section
+POOL_DEFAULTS = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_pre_ping': True,
+    'pool_recycle': 3600
+}
+
+#: Seconds a reflected table description stays valid
+TABLE_INFO_TTL = 300
+
+#: Holder for reflected table info, keyed by (connection string, table)
+table_info_cache = {}
+
+_lock = threading.Lock()
+
+
+def get_pool_options(**options):
+    """
+    Merge pool settings from the defaults, the gaia config file and the
+    given keyword arguments (highest priority)
+
+    :return: dict of create_engine() pool arguments
+    """
+    import gaia
+    settings = dict(POOL_DEFAULTS)
+    section = gaia.config.get('gaia_postgis', {})
+    for key, default in POOL_DEFAULTS.items():
+        value = options.get(key, section.get(key))
+        if value is None or value == '':
+            continue
+        if isinstance(default, bool):
+            if not isinstance(value, bool):
+                value = str(value).lower() in ('1', 'true', 'yes', 'on')
+        else:
+            value = int(value)
+        settings[key] = value
+    return settings
+
+
+def get_connection_string(hostname, dbname, user=None, password=None):
+    """
+    Get connection string based on host, dbname, username, password
+
+    :return: Postgres connection string for SQLAlchemy
+    """
+    auth = ''
+    if user:
+        auth = user
+    if password:
+        auth = auth + ':' + password
+    if auth:
+        auth += '@'
+    return 'postgresql://{auth}{host}/{dbname}'.format(
+        auth=auth, host=hostname, dbname=dbname)
+
+
+def get_engine(connection_string, **options):
+    """
+    Return the shared SQLAlchemy engine for a connection string, creating
+    it (and its connection pool) on first use
+
+    :param connection_string: Database connection string
+    :param options: pool settings (pool_size, max_overflow, pool_pre_ping,
+    pool_recycle); only used when the engine is created
+    :return: SQLAlchemy Engine object
+    """
+    with _lock:
+        engine = sqlengines.get(connection_string)
+        if engine is None:
+            engine = create_engine(
+                connection_string, **get_pool_options(**options))
+            sqlengines[connection_string] = engine
+    return engine
+
+
+def dispose_engines():
+    """
+    Close all pooled connections and forget cached engines and table info
+    """
+    with _lock:
+        for engine in sqlengines.values():
+            engine.dispose()
+        sqlengines.clear()
+        table_info_cache.clear()
+
+
+def get_table_info(engine, table, ttl=None):
+    """
+    Return reflected metadata for a table, reusing a cached reflection
+    younger than ttl seconds
+
+    :param engine: SQLAlchemy Engine object
+    :param table: table name
+    :param ttl: cache lifetime in seconds (default TABLE_INFO_TTL)
+    :return: dict with columns, geom_column, geometry_type, epsg, table
+    """
+    if ttl is None:
+        ttl = TABLE_INFO_TTL
+    key = (str(engine.url), table)
+    now = time.time()
+    with _lock:
+        cached = table_info_cache.get(key)
+    if cached is not None and now - cached[0] < ttl:
+        return cached[1]
+
+    info = reflect_table(engine, table)
+    with _lock:
+        table_info_cache[key] = (now, info)
+    return info
+
+
+def invalidate_table_info(engine=None, table=None):
+    """
+    Drop cached table info, for one table, one database or everything
+    """
+    with _lock:
+        for key in list(table_info_cache.keys()):
+            if engine is not None and key[0] != str(engine.url):
+                continue
+            if table is not None and key[1] != table:
+                continue
+            del table_info_cache[key]
+
+
+def reflect_table(engine, table):
+    """
+    Use SQLAlchemy reflection to gather data on a table, including the
+    geometry column, geometry type, and EPSG code
+
+    :param engine: SQLAlchemy Engine object
+    :param table: table name
+    :return: dict with columns, geom_column, geometry_type, epsg, table
+    """
+    meta = MetaData()
+    table_obj = Table(table, meta, autoload_with=engine)
+    info = {
+        'columns': list(table_obj.columns.keys()),
+        'geom_column': None,
+        'geometry_type': None,
+        'epsg': None,
+        'table': table_obj
+    }
+    geo_cols = [(col.name, col.type) for col in table_obj.columns
+                if hasattr(col.type, 'srid')]
+    if geo_cols:
+        info['geom_column'], geo_obj = geo_cols[0]
+        epsg = geo_obj.srid
+        if epsg == -1:
+            epsg = 4326
+        info['epsg'] = epsg
+        info['geometry_type'] = getattr(geo_obj, 'geometry_type', None)
+    return info
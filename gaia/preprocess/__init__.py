@@ -1,4 +1,7 @@
 
+# PostGIS processes go first, so they are tried before any process that
+# would load a whole table client-side
+from gaia.preprocess.postgis_processes import *
 from gaia.preprocess.pandas_processes import *
 from gaia.preprocess.gdal_processes import *
 from gaia.preprocess.girder_processes import *
@@ -13,10 +16,27 @@ def crop (*args, **kwargs):
     :param datasets: list of datasets to crop
     :param geometry: crop geometry in GeoJSON format
     :param name: optional name for resulting dataset
+    :param local: crop girder rasters on the client, reading only the
+        intersecting blocks from girder
+    :param wait: for girder jobs, if false return a future for the result
+        (see gaia.io.girder_jobs) instead of waiting for the job
+    :param timeout: for girder jobs, seconds to wait for the job
     :return: dataset or None if no intersection
     """
     return compute('crop', inputs=list(args), args=kwargs)
 
+
+def build_overviews(*args, **kwargs):
+    """Build overviews (reduced resolution copies) of a raster dataset
+
+    :param dataset: raster dataset
+    :param factors: optional list of decimation factors, e.g. [2, 4, 8]
+    :param resampling: optional resampling method (default AVERAGE)
+    :param external: write a .ovr file instead of internal overviews
+    :return: dataset
+    """
+    return compute('overviews', inputs=list(args), args=kwargs)
+
 # def centroid(inputs=[], args={}):
 #     return compute('centroid', inputs=inputs, args=args)
 
@@ -5,9 +5,9 @@ from builtins import (
 
 from gaia import GaiaException
 from gaia.gaia_data import GDALDataObject
-from gaia.validators import validate_subset
+from gaia.validators import validate_overviews, validate_subset
 from gaia.process_registry import register_process
-from gaia.geo.gdal_functions import gdal_clip
+from gaia.geo.gdal_functions import gdal_build_overviews, gdal_clip
 from gaia.io.gdal_reader import GaiaGDALReader
 import gaia.types
 
@@ -18,7 +18,8 @@ def validate_gdal(v):
     sure the inputs are gdal-compatible.
     """
     def validator(inputs=[], args=[]):
-        # FIXME: we should check we have a specific gdal type input also
+        if not inputs or not isinstance(inputs[0], GDALDataObject):
+            raise GaiaException('gdal process requires GDALDataObject')
         return v(inputs, args)
     return validator
 
@@ -29,12 +30,15 @@ def validate_gdal(v):
 def compute_subset_gdal(inputs=[], args=[]):
     """
     Runs the subset computation, creating a raster dataset as output.
+    A resolution or target_shape argument crops a reduced resolution
+    read of the raster instead of the full resolution pixels.
     """
     raster, clip = inputs[0], inputs[1]
-    raster_img = raster.get_data()
+    raster_img = raster.get_data(resolution=args.get('resolution'),
+                                 target_shape=args.get('target_shape'))
 
     if clip.get_epsg() != raster.get_epsg():
-        clip.reproject(raster.get_epsg())
+        clip = clip.in_crs(raster.get_epsg())
 
     clip_json = clip.get_data().geometry.unary_union.__geo_interface__
 
@@ -54,3 +58,21 @@ def compute_subset_gdal(inputs=[], args=[]):
     reader.load_metadata(outputDataObject)
 
     return outputDataObject
+
+
+@register_process('overviews')
+@validate_overviews
+@validate_gdal
+def compute_overviews_gdal(inputs=[], args=[]):
+    """
+    Builds an overview pyramid for a raster dataset, returning the input
+    data object with the overviews available to reduced resolution reads.
+    """
+    raster = inputs[0]
+    dataset = gdal_build_overviews(
+        raster.get_data(),
+        factors=args.get('factors'),
+        resampling=args.get('resampling', 'AVERAGE'),
+        external=args.get('external', False))
+    raster.set_data(dataset)
+    return raster
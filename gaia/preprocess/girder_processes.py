@@ -2,19 +2,28 @@ from __future__ import absolute_import, division, print_function
 from builtins import (
     bytes, str, open, super, range, zip, round, input, int, pow, object
 )
-import sys
 from urllib.parse import urlencode
 
 import collections
 import json
 
+from shapely.geometry import shape
+
 import gaia.types
 import gaia.validators as validators
 from gaia.util import GaiaException
-from gaia.gaia_data import GaiaDataObject
+from gaia.gaia_data import GaiaDataObject, GDALDataObject
+from gaia.geo.crs import get_epsg
+from gaia.geo.gdal_functions import gdal_clip, gdal_read_window, get_dataset
 from gaia.girder_data import GirderDataObject
+from gaia.io.girder_jobs import girder_job
+from gaia.io.gdal_reader import GaiaGDALReader
 from gaia.process_registry import register_process
 
+#: Default number of seconds to wait for a girder crop job (the timeout
+#: argument overrides it, None waits forever)
+GIRDER_CROP_TIMEOUT = 300
+
 
 def validate_girder(v):
     """
@@ -27,10 +36,10 @@ def validate_girder(v):
 
         # Second object must have vector geometry
         if (isinstance(inputs[1], GaiaDataObject) and
-                inputs[1].get_datatype() != gaia.types.VECTOR):
+                inputs[1].datatype != gaia.types.VECTOR):
             template = """girder process cannot use datatype \"{}\"" \
                 for crop geometry"""
-            raise GaiaException(template.format(inputs[1].get_datatype()))
+            raise GaiaException(template.format(inputs[1].datatype))
 
         # For now, second object/geometry must be on local filesystem
         if isinstance(inputs[1], GirderDataObject):
@@ -42,11 +51,60 @@ def validate_girder(v):
     return validator
 
 
+@register_process('crop')
+@validate_girder
+def compute_girder_crop_local(inputs=[], args_dict={}):
+    """
+    Crops a girder raster on the client, when called with local=True
+
+    The raster is read directly from girder with range requests, fetching
+    only the blocks that intersect the crop geometry, and the result is
+    a local GDALDataObject.
+    """
+    if not args_dict.get('local'):
+        raise GaiaException('local girder crop not requested')
+
+    with inputs[0].vsicurl_options() as path:
+        dataset = get_dataset(path)
+        if isinstance(inputs[1], GaiaDataObject):
+            clip = inputs[1]
+            epsg = get_epsg(dataset.GetProjection())
+            if epsg is not None and clip.get_epsg() != epsg:
+                clip = clip.in_crs(epsg)
+            geometry = clip.get_data().geometry.unary_union.__geo_interface__
+        else:
+            geometry = inputs[1]
+
+        window = gdal_read_window(dataset, shape(geometry).bounds)
+        dataset = None
+    if window is None:
+        return None
+    output_dataset = gdal_clip(window, None, geometry)
+    if output_dataset is None:
+        return None
+
+    outputDataObject = GDALDataObject()
+    outputDataObject.set_data(output_dataset)
+    outputDataObject._datatype = gaia.types.RASTER
+
+    # Instantiate temporary reader to (only) parse metadata
+    reader = GaiaGDALReader('internal.tif')
+    reader.load_metadata(outputDataObject)
+
+    return outputDataObject
+
+
 @register_process('crop')
 @validate_girder
 def compute_girder_crop(inputs=[], args_dict={}):
     """
     Runs the subset computation on girder
+
+    The clip job runs asynchronously; with wait=False the JobFuture for
+    its output GirderDataObject is returned right after submission, so
+    that many crops can be in flight at once. The future fails if the job
+    is not done within GIRDER_CROP_TIMEOUT seconds (or the timeout
+    argument).
     """
     datasets = inputs[0]
     if isinstance(inputs[1], GaiaDataObject):
@@ -87,27 +145,16 @@ def compute_girder_crop(inputs=[], args_dict={}):
         'folderId': results_folder_id
     }
     job = gc.get(path, parameters=params)
-    # print()
-    # print(job)
-
-    import time
-    path = 'job/{}'.format(job['_id'])
-    status = job['status']
-    for i in range(50):
-        if status >= 3:
-            break
-        # (Using sys.stdout to skip newline at end)
-        sys.stdout.write(
-            '{:2d} Checking job {} status... '.format(i+1, job['_id']))
-        time.sleep(1.0)
-        job = gc.get(path)
-        status = job['status']
-        print(status)
-
-    # Get item id of (new) output file
-    result = gc.listItem(results_folder_id, name=filename)
-    cropped_item = next(result)
-    # print(cropped_item)
 
-    outputDataObject = GirderDataObject(None, 'item', cropped_item['_id'])
-    return outputDataObject
+    def output_object(job):
+        # Get item id of (new) output file
+        result = gc.listItem(results_folder_id, name=filename)
+        cropped_item = next(result)
+        return GirderDataObject(None, 'item', cropped_item['_id'])
+
+    future = girder_job(
+        job['_id'], result=output_object,
+        timeout=args_dict.get('timeout', GIRDER_CROP_TIMEOUT))
+    if not args_dict.get('wait', True):
+        return future
+    return future.result()
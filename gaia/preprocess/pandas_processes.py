@@ -44,7 +44,7 @@ def crop_pandas(inputs=[], args={}):
     """
     first, second = inputs[0], inputs[1]
     if first.get_epsg() != second.get_epsg():
-        second.reproject(epsg=first.get_epsg())
+        second = second.in_crs(first.get_epsg())
     first_df, second_df = first.get_data(), second.get_data()
     first_within = first_df[first_df.geometry.within(
         second_df.geometry.unary_union)]
@@ -0,0 +1,54 @@
+from __future__ import absolute_import, division, print_function
+from builtins import (
+    bytes, str, open, super, range, zip, round, input, int, pow, object
+)
+
+import gaia.validators as validators
+from gaia import GaiaException
+from gaia.gaia_data import PostgisDataObject, POSTGIS_PREDICATES
+from gaia.process_registry import register_process
+
+
+def validate_postgis(v):
+    """
+    Make sure the dataset to be processed is a PostgisDataObject, before
+    anything else touches (and possibly loads) its data.
+    """
+    def validator(inputs=[], args={}):
+        if not isinstance(inputs[0], PostgisDataObject):
+            raise GaiaException('postgis process requires PostgisDataObject')
+
+        predicate = args.get('predicate', 'within')
+        if predicate not in POSTGIS_PREDICATES:
+            raise GaiaException(
+                'Invalid spatial predicate {}'.format(predicate))
+
+        # Otherwise call up the chain to let parent do common validation
+        return v(inputs, args)
+
+    return validator
+
+
+@register_process('crop')
+@validate_postgis
+@validators.validate_within
+def crop_postgis(inputs=[], args={}):
+    """
+    Crop a PostGIS table to a geometry inside the database
+
+    The result is an unloaded PostgisDataObject whose query includes the
+    spatial predicate, so only matching rows are read when its data is
+    requested.
+
+    :param predicate: optional spatial test, 'within' (default) or
+    'intersects'
+    :return: PostgisDataObject
+    """
+    first, second = inputs[0], inputs[1]
+    geometry = second.get_data().geometry.unary_union
+
+    output = first.copy()
+    output.add_spatial_filter(
+        geometry, predicate=args.get('predicate', 'within'),
+        epsg=second.get_epsg())
+    return output
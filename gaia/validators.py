@@ -95,3 +95,38 @@ def validate_subset(v):
         return v(inputs, args)
 
     return subset_validator
+
+
+def validate_overviews(v):
+    """
+    Decorator for validating overview (pyramid) process inputs
+    """
+    def overviews_validator(inputs=[], args={}):
+        required_inputs = [{
+            'description': 'Image to build overviews for',
+            'type': types.RASTER,
+            'max': 1
+        }]
+
+        optional_args = [{
+            'name': 'factors',
+            'title': 'Factors',
+            'description': 'Decimation factors, e.g. [2, 4, 8]',
+            'type': list,
+        }, {
+            'name': 'resampling',
+            'title': 'Resampling',
+            'description': 'Resampling method (default AVERAGE)',
+            'type': str,
+        }, {
+            'name': 'external',
+            'title': 'External',
+            'description': 'Write a .ovr file (default False)',
+            'type': bool,
+        }]
+
+        validate_base(inputs, args, required_inputs=required_inputs,
+                      optional_args=optional_args)
+        return v(inputs, args)
+
+    return overviews_validator
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright Kitware Inc. and Epidemico Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+import os
+import shutil
+import tempfile
+import unittest
+
+import gaia
+
+base_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)))
+testfile_path = os.path.join(base_dir, '../data')
+
+
+class TestColumnarIO(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        path = os.path.join(testfile_path, 'iraq_hospitals.geojson')
+        self.hospitals = gaia.create(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_roundtrip(self):
+        """Test writing and reading GeoParquet and Feather"""
+        expected = self.hospitals.get_data()
+        for name in ('hospitals.parquet', 'hospitals.feather'):
+            path = os.path.join(self.tmp_dir, name)
+            gaia.save(self.hospitals, path)
+
+            data_object = gaia.create(path)
+            data = data_object.get_data()
+            self.assertEqual(len(data), len(expected))
+            self.assertEqual(data_object.get_epsg(), 4326)
+            self.assertTrue(data.geometry.equals(expected.geometry))
+            self.assertEqual(list(data['name']), list(expected['name']))
+
+    def test_projection_and_bbox(self):
+        """Test reading a column subset within a bounding box"""
+        path = os.path.join(self.tmp_dir, 'hospitals.parquet')
+        gaia.save(self.hospitals, path, row_group_size=10)
+
+        bbox = (44.0, 33.0, 44.6, 33.6)
+        data = gaia.create(path, columns=['name'], bbox=bbox).get_data()
+        self.assertEqual(list(data.columns), ['name', 'geometry'])
+
+        expected = self.hospitals.get_data().cx[44.0:44.6, 33.0:33.6]
+        self.assertEqual(sorted(data['name']), sorted(expected['name']))
+
+    def test_projection_and_filters(self):
+        """Test filtering a column subset that includes the geometry"""
+        path = os.path.join(self.tmp_dir, 'hospitals.parquet')
+        gaia.save(self.hospitals, path)
+
+        expected = self.hospitals.get_data().iloc[:1]
+        data = gaia.create(
+            path, columns=['name', 'geometry'],
+            filters=[('osm_id', '=', expected['osm_id'].iloc[0])]
+        ).get_data()
+        self.assertEqual(list(data.columns), ['name', 'geometry'])
+        self.assertEqual(list(data['name']), list(expected['name']))
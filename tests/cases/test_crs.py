@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright Kitware Inc. and Epidemico Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+import os
+import unittest
+
+import numpy as np
+from shapely.geometry import LineString, Point
+
+import gaia
+from gaia.geo import crs
+
+base_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)))
+testfile_path = os.path.join(base_dir, '../data')
+
+
+class TestGaiaCRS(unittest.TestCase):
+
+    def test_crs_key(self):
+        """Test equivalent CRS definitions share one cache key"""
+        for definition in [4326, '4326', 'epsg:4326', 'EPSG:4326',
+                           {'init': 'epsg:4326'}]:
+            self.assertEqual(crs.crs_key(definition), 'EPSG:4326')
+
+    def test_cached_objects(self):
+        """Test parsed SRS and transformations are reused"""
+        self.assertIs(crs.get_srs(3857), crs.get_srs('EPSG:3857'))
+        self.assertIs(crs.get_transformation(4326, 3857),
+                      crs.get_transformation('epsg:4326', '3857'))
+
+    def test_get_epsg(self):
+        """Test EPSG identification from WKT"""
+        self.assertEqual(crs.get_epsg(crs.get_wkt(3857)), 3857)
+        self.assertEqual(crs.get_epsg('EPSG:4326'), 4326)
+
+    def test_transform_geometries(self):
+        """Test transforming geometries, keeping z and missing values"""
+        geometries = [Point(44, 33), None,
+                      LineString([(44, 33, 1), (45, 34, 2)])]
+        result = crs.transform_geometries(geometries, 4326, 3857)
+
+        self.assertAlmostEqual(result[0].x, 4898057.5949, places=3)
+        self.assertAlmostEqual(result[0].y, 3895303.9634, places=3)
+        self.assertIsNone(result[1])
+        self.assertTrue(result[2].has_z)
+        self.assertEqual(result[2].coords[1][2], 2)
+
+    def test_transform_coordinates_chunked(self):
+        """Test chunked, threaded transforms match a single transform"""
+        coords = np.column_stack([np.linspace(-170, 170, 10000),
+                                  np.linspace(-80, 80, 10000)])
+        expected = crs.transform_coordinates(coords, 4326, 3857, workers=1)
+        result = crs.transform_coordinates(
+            coords, 4326, 3857, workers=4, chunk_size=999)
+        np.testing.assert_array_equal(result, expected)
+
+    def test_reproject_in_place(self):
+        """Test vector reprojection replaces only the geometry column"""
+        roads = gaia.create(
+            os.path.join(testfile_path, 'iraq_roads.geojson'))
+        data = roads.get_data()
+        expected = data.geometry.to_crs(epsg=3857)
+
+        roads.reproject(3857, workers=2)
+        self.assertIs(roads.get_data(), data)
+        self.assertEqual(roads.get_epsg(), 3857)
+        for geom, expected_geom in zip(data.geometry, expected):
+            self.assertTrue(geom.equals_exact(expected_geom, 1e-3))
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright Kitware Inc. and Epidemico Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import gaia
+from gaia.filters import (
+    filter_ogr,
+    filter_pandas,
+    filter_postgis,
+    parse_filters
+)
+
+base_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)))
+testfile_path = os.path.join(base_dir, '../data')
+
+
+class TestGaiaFilters(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        path = os.path.join(testfile_path, 'iraq_hospitals.geojson')
+        cls.hospitals = gaia.create(path).get_data()
+
+    def test_filter_pandas_and(self):
+        """Test that list filters are joined by AND"""
+        first = self.hospitals.iloc[0]
+        filtered = filter_pandas(self.hospitals, [
+            ('name', '=', first['name']), ('osm_id', '=', first['osm_id'])])
+        self.assertEqual(len(filtered), 1)
+
+    def test_filter_pandas_or_not(self):
+        """Test OR and NOT filter trees"""
+        names = list(self.hospitals['name'].dropna().unique()[:2])
+        either = filter_pandas(self.hospitals, ('or', [
+            ('name', '=', names[0]), ('name', '=', names[1])]))
+        self.assertEqual(
+            len(either), self.hospitals['name'].isin(names).sum())
+
+        neither = filter_pandas(self.hospitals, ('not', ('name', 'in', names)))
+        self.assertEqual(len(either) + len(neither), len(self.hospitals))
+
+    def test_optimize_order(self):
+        """Test that AND clauses are reordered by selectivity"""
+        expression = parse_filters(
+            [('id', '!=', 1), ('id', '>', 10), ('city', '=', 'Boston')])
+        operators = [x.operator for x in expression.optimize().children]
+        self.assertEqual(operators, ['=', '>', '!='])
+
+    def test_filter_postgis(self):
+        """Test SQL generation with joiners"""
+        sql, params = filter_postgis(
+            [('city', 'in', ['Boston', 'New York']), ('id', '>', 10),
+             ('id', '<', 2, 'OR')])
+        self.assertEqual(
+            sql, '(("city" IN (%s,%s) AND "id" > %s) OR "id" < %s)')
+        self.assertEqual(params, ['Boston', 'New York', 10, 2])
+
+    def test_sql_operators(self):
+        """Test operators pandas does not support are passed to SQL"""
+        sql, params = filter_postgis(
+            [('name', 'ilike', '%x%'), ('tags', '&&', ['a', 'b'])])
+        self.assertEqual(sql, '("name" ILIKE %s AND "tags" && (%s,%s))')
+        self.assertEqual(params, ['%x%', 'a', 'b'])
+        self.assertEqual(
+            filter_ogr([('name', 'ilike', '%x%'), ('id', '=', 1)]),
+            '("id" = 1)')
+        with self.assertRaises(gaia.GaiaException):
+            filter_pandas(self.hospitals, [('name', 'ilike', '%x%')])
+        with self.assertRaises(gaia.GaiaException):
+            parse_filters([('name', "= 1; DROP TABLE x; --", 1)])
+
+    def test_filter_ogr(self):
+        """Test OGR attribute filter generation"""
+        sql = filter_ogr(('not', ('city', '=', "O'Brien")))
+        self.assertEqual(
+            sql, '("city" <> \'O\'\'Brien\' OR "city" IS NULL)')
+        sql = filter_ogr(('not', [('id', '>', 2),
+                                  ('city', 'not in', ['Boston'], 'OR')]))
+        self.assertEqual(sql, '(("id" <= 2 OR "id" IS NULL) AND '
+                              '"city" IN (\'Boston\'))')
+        self.assertIsNone(filter_ogr(('not', ('city', 'contains', 'bo'))))
+        sql = filter_ogr([('id', '>', np.int64(5)),
+                          ('id', 'in', [np.float32(1.5), np.bool_(True)])])
+        self.assertEqual(sql, '("id" > 5 AND "id" IN (1.5,1))')
+
+    def test_reader_filters(self):
+        """Test filters passed to gaia.create"""
+        path = os.path.join(testfile_path, 'iraq_hospitals.geojson')
+        name = self.hospitals['name'].dropna().iloc[0]
+        data = gaia.create(path, filters=[('name', '=', name)])
+        self.assertEqual(
+            len(data.get_data()), (self.hospitals['name'] == name).sum())
+
+    def write_cities(self, cities):
+        """Write points with the given city names to a GeoJSON file"""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'cities.geojson')
+        with open(path, 'w') as fp:
+            json.dump({'type': 'FeatureCollection', 'features': [{
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': [i, i]},
+                'properties': {'city': city, 'id': i}
+            } for i, city in enumerate(cities)]}, fp)
+        return path
+
+    def test_reader_filters_null(self):
+        """Test negated filters keep features with NULL values"""
+        path = self.write_cities(['Boston', None, 'Albany'])
+        for filters, ids in [
+                (('city', '!=', 'Boston'), [1, 2]),
+                (('not', ('city', '=', 'Boston')), [1, 2]),
+                (('not', ('city', 'in', ['Boston'])), [1, 2]),
+                (('id', '>', np.int64(1)), [2]),
+                (('not', [('city', '=', 'Boston'), ('id', '>', 1, 'OR')]),
+                 [1])]:
+            data = gaia.create(path, filters=filters).get_data()
+            self.assertEqual(sorted(data['id']), ids)
+
+    def test_string_filters_literal(self):
+        """Test string operators match their value literally"""
+        path = self.write_cities(['abc', 'a.c', 'a.b(', '(x)*'])
+        for filters, ids in [
+                (('city', 'contains', 'a.c'), [1]),
+                (('city', 'startswith', 'a.'), [1, 2]),
+                (('city', 'endswith', ')*'), [3]),
+                (('city', 'contains', 'b('), [2])]:
+            data = gaia.create(path, filters=filters).get_data()
+            self.assertEqual(sorted(data['id']), ids)
+            self.assertEqual(
+                sorted(filter_pandas(gaia.create(path).get_data(),
+                                     filters)['id']), ids)
@@ -0,0 +1,785 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright Kitware Inc. and Epidemico Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+
+import numpy as np
+import requests
+
+from gaia.geo.gdal_functions import gdal_clip, get_dataset
+import gaia
+from gaia.girder_data import GirderDataObject, GirderFolderObject
+from gaia.io import girder_cache
+from gaia.io.girder_cache import DownloadCache, MetadataCache
+from gaia.io import girder_jobs
+from gaia.io.girder_interface import GirderInterface
+from gaia.io.girder_transport import GirderTransport
+from gaia.io.girder_upload import (
+    UPLOAD_RETRIES, GirderUploader, file_sha512)
+from gaia.preprocess import crop
+from gaia.util import GaiaException
+
+base_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)))
+testfile_path = os.path.join(base_dir, '../data')
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StandInGirderHandler(BaseHTTPRequestHandler):
+    """
+    Minimal stand-in for the Girder REST API, recording requests
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.clients.add(self.client_address)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            fail = self.path.startswith('/api/v1/flaky') and \
+                server.failures > 0
+            if fail:
+                server.failures -= 1
+        try:
+            time.sleep(0.02)
+            if fail:
+                self._send(503, {'message': 'try again'})
+            elif self.path.startswith('/api/v1/item?'):
+                self._send(200, self._list_items())
+            elif self.path.startswith('/api/v1/resource/lookup'):
+                self._send(200, {'_id': 'folder1', '_modelType': 'folder'})
+            elif self.path.startswith('/api/v1/job/'):
+                job_id = self.path.split('/')[4]
+                with server.lock:
+                    polls = server.job_polls[job_id] = \
+                        server.job_polls.get(job_id, 0) + 1
+                self._send(200, {'_id': job_id, 'status': 3 if polls >= 3
+                                 else 2})
+            elif '/files?' in self.path:
+                item_id = self.path.split('/')[4]
+                self._send(200, server.item_files[item_id])
+            elif self.path.endswith('/download'):
+                file_id = self.path.split('/')[4]
+                self._send_range(server.file_data[file_id])
+            elif '/geometa' in self.path:
+                item_id = self.path.split('/')[4]
+                geometa = getattr(server, 'geometa', {})
+                if item_id in geometa:
+                    self._send(*geometa[item_id])
+                else:
+                    self._send(200, {
+                        'itemId': item_id,
+                        'token': self.headers.get('Girder-Token')})
+            elif re.match(r'/api/v1/item/item\d+$', self.path):
+                self._send(200, server.items[int(self.path[17:])])
+            else:
+                self._send(200, {'path': self.path})
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def _list_items(self):
+        query = parse_qs(urlparse(self.path).query)
+        items = self.server.items
+        if 'name' in query:
+            items = [i for i in items if i['name'] == query['name'][0]]
+        if 'text' in query:
+            items = [i for i in items if query['text'][0] in i['name']]
+        offset = int(query.get('offset', [0])[0])
+        limit = int(query.get('limit', [0])[0])
+        return items[offset:offset + limit if limit else None]
+
+    def do_HEAD(self):
+        data = self.server.file_data.get(self.path.split('/')[4], b'')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+
+    def _send_range(self, data):
+        server = self.server
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        with server.lock:
+            server.ranges.append(match is not None)
+            server.tokens.add(self.headers.get('Girder-Token'))
+        if match is None:
+            part = data
+            self._send_bytes(200, data)
+        else:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or len(data) - 1), len(data) - 1)
+            part = data[start:end + 1]
+            self.send_response(206)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(part)))
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+                start, end, len(data)))
+            self.end_headers()
+            self.wfile.write(part)
+        with server.lock:
+            server.bytes_sent += len(part)
+
+    def _send(self, status, body):
+        self._send_bytes(
+            status, json.dumps(body).encode('utf-8'), 'application/json')
+
+    def _send_bytes(self, status, data,
+                    content_type='application/octet-stream'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StandInUploadHandler(BaseHTTPRequestHandler):
+    """
+    Minimal stand-in for the Girder upload, item listing and copy API
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        server = self.server
+        with server.lock:
+            if url.path == '/api/v1/item':
+                items = server.folders.get(query['folderId'], [])
+                offset = int(query.get('offset', 0))
+                limit = int(query.get('limit', 0))
+                self._send(200, items[offset:offset + limit if limit else None])
+            elif url.path == '/api/v1/file/offset':
+                upload = server.uploads.get(query['uploadId'])
+                if upload is None:
+                    self._send(400, {'message': 'No such upload'})
+                else:
+                    self._send(200, {'offset': len(upload['data'])})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        with server.lock:
+            if url.path == '/api/v1/file':
+                upload_id = 'upload{}'.format(len(server.uploads))
+                server.uploads[upload_id] = dict(
+                    query, _id=upload_id, data=b'')
+                self._send(200, {'_id': upload_id})
+            elif url.path == '/api/v1/file/chunk':
+                upload = server.uploads[query['uploadId']]
+                if int(query['offset']) != len(upload['data']):
+                    self._send(400, {'message': 'Wrong offset'})
+                    return
+                server.chunks += 1
+                if server.fail_after is not None and \
+                        server.chunks > server.fail_after or \
+                        server.fail_every and \
+                        server.chunks % server.fail_every == 0:
+                    self._send(500, {'message': 'Connection lost'})
+                    return
+                upload['data'] += body
+                server.bytes_received += len(body)
+                if len(upload['data']) < int(upload['size']):
+                    self._send(200, {'_id': upload['_id']})
+                    return
+                item = self._create_item(upload['parentId'], upload['name'])
+                item['data'] = upload['data']
+                del server.uploads[upload['_id']]
+                self._send(200, {'_modelType': 'file',
+                                 'itemId': item['_id']})
+            elif url.path.endswith('/copy'):
+                source = server.items[url.path.split('/')[4]]
+                item = self._create_item(query['folderId'], query['name'])
+                item['meta'] = dict(source['meta'])
+                item['data'] = source['data']
+                server.copies += 1
+                self._send(200, self._public(item))
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.server.lock:
+            item = self.server.items[self.path.split('/')[4]]
+            item['meta'].update(json.loads(body.decode('utf-8')))
+            self._send(200, self._public(item))
+
+    def _create_item(self, folder_id, name):
+        item = {'_id': 'item{}'.format(len(self.server.items)),
+                'name': name, 'folderId': folder_id, 'meta': {}}
+        self.server.items[item['_id']] = item
+        self.server.folders.setdefault(folder_id, []).append(item)
+        return item
+
+    @staticmethod
+    def _public(item):
+        return {k: v for k, v in item.items() if k != 'data'}
+
+    def _send(self, status, body):
+        if isinstance(body, list):
+            body = [self._public(i) for i in body]
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class TestGirderTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(
+            ('127.0.0.1', 0), StandInGirderHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.clients = set()
+        self.server.active = 0
+        self.server.max_active = 0
+        self.server.failures = 0
+        self.server.items = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        api_url = 'http://127.0.0.1:{}/api/v1'.format(
+            self.server.server_address[1])
+        self.transport = GirderTransport(
+            api_url, token='secret', pool_size=4, retries=3,
+            backoff_factor=0.01)
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_concurrent_requests(self):
+        """Test batch requests run in parallel on pooled connections"""
+        item_ids = ['item{}'.format(i) for i in range(20)]
+        paths = ['item/{}/geometa'.format(i) for i in item_ids]
+        results = self.transport.get_many(paths)
+
+        self.assertEqual([r['itemId'] for r in results], item_ids)
+        self.assertTrue(all(r['token'] == 'secret' for r in results))
+        self.assertGreater(self.server.max_active, 1)
+        self.assertLessEqual(self.server.max_active, 4)
+        # Connections are kept alive and reused
+        self.assertLessEqual(len(self.server.clients), 4)
+
+    def test_retry(self):
+        """Test failed requests are retried with backoff"""
+        self.server.failures = 2
+        result = self.transport.get('flaky')
+        self.assertEqual(result['path'], '/api/v1/flaky')
+        self.assertEqual(self.server.requests.count('/api/v1/flaky'), 3)
+
+
+class TestJobFutures(unittest.TestCase):
+
+    def setUp(self):
+        self.poller = girder_jobs.JobPoller()
+
+    def job(self, polls_needed, result='done', record=None):
+        """A fake job that finishes after polls_needed polls"""
+        state = {'polls': 0}
+
+        def poll():
+            state['polls'] += 1
+            if record is not None:
+                record.append((time.time(), threading.current_thread()))
+            if state['polls'] >= polls_needed:
+                if isinstance(result, Exception):
+                    raise result
+                return result
+            return None
+        return poll
+
+    def test_many_jobs(self):
+        """Test outstanding jobs are multiplexed over one poller thread"""
+        record = []
+        futures = [
+            self.poller.submit(self.job(i % 4 + 1, i, record),
+                               initial_interval=0.005, jitter=0.5)
+            for i in range(50)]
+        # Submitting does not block
+        self.assertFalse(all(f.done() for f in futures))
+
+        results = [f.result() for f in girder_jobs.as_completed(
+            futures, timeout=10)]
+        self.assertEqual(sorted(results), list(range(50)))
+        self.assertEqual(len(set(thread for _, thread in record)), 1)
+        self.assertEqual(self.poller.pending(), 0)
+
+    def test_backoff(self):
+        """Test polling intervals grow exponentially up to the maximum"""
+        record = []
+        future = self.poller.submit(
+            self.job(6, record=record), initial_interval=0.01,
+            max_interval=0.08, backoff=2, jitter=0)
+        self.assertEqual(future.result(timeout=10), 'done')
+        times = [t for t, _ in record]
+        intervals = [b - a for a, b in zip(times, times[1:])]
+        for interval, expected in zip(intervals, [0.02, 0.04, 0.08, 0.08]):
+            self.assertGreaterEqual(interval, expected * 0.9)
+            self.assertLess(interval, expected + 0.05)
+
+    def test_failure_and_timeout(self):
+        """Test failed and timed out jobs raise from their futures"""
+        failed = self.poller.submit(
+            self.job(2, GaiaException('job failed')), initial_interval=0.01)
+        slow = self.poller.submit(
+            self.job(1000), initial_interval=0.01, timeout=0.1)
+        done, _ = girder_jobs.wait([failed, slow], timeout=10)
+        self.assertEqual(len(done), 2)
+        self.assertRaises(GaiaException, failed.result)
+        self.assertRaises(girder_jobs.JobTimeoutError, slow.result)
+
+
+class TestMetadataCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache = MetadataCache(
+            os.path.join(self.tmp_dir, 'metadata.db'), ttl=60,
+            max_entries=3)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_updated_validation(self):
+        """Test cached metadata is only used while the item is unchanged"""
+        self.cache.put('a', '2018-01-01', {'bounds': [0, 0, 1, 1]})
+        self.assertEqual(self.cache.get('a', '2018-01-01'),
+                         {'bounds': [0, 0, 1, 1]})
+        self.assertIsNone(self.cache.get('a', '2018-02-01'))
+        self.assertIsNone(self.cache.get('b', '2018-01-01'))
+
+        # Another process opening the same file sees the entry
+        other = MetadataCache(self.cache.path)
+        self.assertEqual(other.get('a', '2018-01-01'),
+                         {'bounds': [0, 0, 1, 1]})
+
+    def test_ttl(self):
+        """Test entries without a known timestamp expire after the ttl"""
+        self.cache.put('a', '2018-01-01', {'name': 'a'})
+        self.assertEqual(self.cache.get('a'), {'name': 'a'})
+        self.cache.ttl = 0
+        self.assertIsNone(self.cache.get('a'))
+        # An unchanged timestamp still validates the entry
+        self.assertEqual(self.cache.get('a', '2018-01-01'), {'name': 'a'})
+
+    def test_eviction(self):
+        """Test least recently used entries are evicted"""
+        for item_id in 'abc':
+            self.cache.put(item_id, None, {'name': item_id})
+            time.sleep(0.01)
+        self.cache.get('a')
+        self.cache.put('d', None, {'name': 'd'})
+        self.assertEqual(
+            [r is None for r in self.cache.get_many(
+                [(i, None) for i in 'abcd'])],
+            [False, True, False, False])
+
+
+class TestGirderData(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        girder_cache._metadata_cache = MetadataCache(
+            os.path.join(self.tmp_dir, 'metadata.db'))
+        girder_cache._download_cache = DownloadCache(
+            os.path.join(self.tmp_dir, 'downloads'))
+
+        self.server = ThreadingHTTPServer(
+            ('127.0.0.1', 0), StandInGirderHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.clients = set()
+        self.server.active = 0
+        self.server.max_active = 0
+        self.server.failures = 0
+        self.server.items = [
+            {'_id': 'item{}'.format(i), 'name': 'file{:04d}.tif'.format(i),
+             'size': 2048 * i, 'updated': '2018-01-01'}
+            for i in range(100)]
+        self.server.item_files = {}
+        self.server.file_data = {}
+        self.server.ranges = []
+        self.server.tokens = set()
+        self.server.bytes_sent = 0
+        self.server.job_polls = {}
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+        api_url = 'http://127.0.0.1:{}/api/v1'.format(
+            self.server.server_address[1])
+        self.girder = GirderInterface.get_instance()
+        self.girder.transport = GirderTransport(
+            api_url, token='secret', pool_size=4)
+        self.girder.gc = self.girder.transport
+
+    def tearDown(self):
+        self.girder.transport.close()
+        self.girder.transport = None
+        self.girder.gc = None
+        girder_cache._metadata_cache = None
+        girder_cache._download_cache = None
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_reopen_folder(self):
+        """Test reopening a folder only costs the listing request"""
+        listing = self.girder.list_geometa('folder1')
+        self.assertEqual(len(listing), 100)
+        self.assertEqual(len(self.server.requests), 101)
+        self.assertEqual([g['itemId'] for _, g in listing],
+                         [item['_id'] for item, _ in listing])
+
+        del self.server.requests[:]
+        self.assertEqual(self.girder.list_geometa('folder1'), listing)
+        self.assertEqual(len(self.server.requests), 1)
+
+        # Only changed items are fetched again
+        del self.server.requests[:]
+        self.server.items[5]['updated'] = '2018-02-01'
+        self.girder.list_geometa('folder1')
+        self.assertEqual(self.server.requests[1:],
+                         ['/api/v1/item/item5/geometa'])
+
+    def add_file(self, item_id, file_id, name, data, sha512=None):
+        self.server.item_files.setdefault(item_id, []).append(
+            {'_id': file_id, 'name': name, 'size': len(data),
+             'sha512': sha512})
+        self.server.file_data[file_id] = data
+
+    def test_materialize(self):
+        """Test girder items are read from the local download cache"""
+        path = os.path.join(testfile_path, 'iraq_hospitals.geojson')
+        with open(path, 'rb') as fp:
+            self.add_file('item1', 'file1', 'hospitals.geojson', fp.read())
+
+        data = GirderDataObject(None, 'item', 'item1').get_data()
+        self.assertEqual(len(data), 86)
+        downloads = ['/api/v1/file/file1/download']
+        self.assertEqual(
+            [r for r in self.server.requests if 'download' in r], downloads)
+
+        # A new object for the same item reads the cached copy
+        local = GirderDataObject(None, 'item', 'item1').materialize()
+        self.assertEqual(len(local.get_data()), 86)
+        self.assertEqual(
+            [r for r in self.server.requests if 'download' in r], downloads)
+
+    def test_concurrent_download(self):
+        """Test threads downloading the same file to the same path"""
+        self.add_file('item1', 'file1', 'a.bin', os.urandom(4000000))
+        path = os.path.join(self.tmp_dir, 'a.bin')
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            sizes = list(executor.map(
+                lambda _: self.girder.transport.download_file('file1', path),
+                range(8)))
+        self.assertEqual(sizes, [4000000] * 8)
+        with open(path, 'rb') as fp:
+            self.assertEqual(fp.read(), self.server.file_data['file1'])
+        self.assertFalse([name for name in os.listdir(self.tmp_dir)
+                          if name.endswith('.part')])
+
+    def test_download_eviction(self):
+        """Test the download cache evicts least recently used entries"""
+        cache = girder_cache._download_cache
+        cache.max_bytes = 250
+        for i in range(3):
+            self.add_file('item{}'.format(i), 'file{}'.format(i), 'a.txt',
+                          b'x' * 100, sha512='{:0128x}'.format(i))
+            cache.fetch(self.server.item_files['item{}'.format(i)],
+                        self.girder.transport)
+            time.sleep(0.01)
+
+        self.assertEqual(cache.size(), 200)
+        self.assertEqual(
+            [os.path.basename(entry) for _, _, entry in cache.entries()],
+            ['{:0128x}'.format(i) for i in (1, 2)])
+
+    def test_crop_local(self):
+        """Test cropping a girder raster only reads intersecting blocks"""
+        path = os.path.join(testfile_path, 'globalprecip.tif')
+        with open(path, 'rb') as fp:
+            data = fp.read()
+        self.add_file('item1', 'file1', 'globalprecip.tif', data)
+        geometry = {
+            'type': 'Polygon',
+            'coordinates': [[[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]]]
+        }
+
+        output = crop(GirderDataObject(None, 'item', 'item1'), geometry,
+                      local=True)
+        expected = gdal_clip(get_dataset(path), None, geometry)
+        np.testing.assert_array_equal(
+            output.get_data().ReadAsArray(), expected.ReadAsArray())
+        self.assertEqual(output.get_data().GetGeoTransform(),
+                         expected.GetGeoTransform())
+
+        self.assertTrue(self.server.ranges and all(self.server.ranges))
+        self.assertEqual(self.server.tokens, {'secret'})
+        self.assertLess(self.server.bytes_sent, len(data) / 2)
+
+    def test_iter_items(self):
+        """Test folder listings are fetched lazily, page by page"""
+        listing = self.girder.iter_items('folder1', page_size=10)
+        first = next(listing)
+        self.assertEqual(first['_id'], 'item0')
+        # Only the first page and the prefetched second page are requested
+        time.sleep(0.1)
+        self.assertEqual(len(self.server.requests), 2)
+
+        rest = list(listing)
+        self.assertEqual([first] + rest, self.server.items)
+        self.assertEqual(len(self.server.requests), 11)
+
+    def test_ls(self):
+        """Test ls applies offset, limit and server-side filters"""
+        path = '/collection/data'
+        self.assertEqual(
+            self.girder.ls(path, offset=5, limit=2),
+            [['10.0 KB', 'file0005.tif'], ['12.0 KB', 'file0006.tif']])
+        self.assertEqual(len(self.girder.ls(path, limit=0)), 100)
+        self.assertEqual(
+            [i['_id'] for i in self.girder.ls(
+                path, text='file001', formatted=False)],
+            ['item{}'.format(i) for i in range(10, 20)])
+        self.assertEqual(
+            list(self.girder.ls(path, name='file0042.tif', stream=True)),
+            [['84.0 KB', 'file0042.tif']])
+
+    def test_folder_select(self):
+        """Test selecting the items of a folder that intersect an AOI"""
+        geometa = {}
+        for i, item in enumerate(self.server.items):
+            # A 10 x 10 grid of 1 degree scenes, and one non-geo file
+            x, y = i % 10, i // 10
+            bounds = {'type': 'Polygon', 'coordinates': [[
+                [x, y], [x + 1, y], [x + 1, y + 1], [x, y + 1], [x, y]]]}
+            geometa[item['_id']] = (200, {'bounds': bounds, 'type_': 'raster'})
+        geometa['item99'] = (400, {'message': 'No geospatial data'})
+        self.server.geometa = geometa
+
+        folder = gaia.create('girder://folder/folder1')
+        self.assertIsInstance(folder, GirderFolderObject)
+        metadata = folder.get_metadata()
+        self.assertEqual(metadata['items'], 99)
+        self.assertEqual(metadata['type_'], 'raster')
+        self.assertEqual(metadata['bounds']['coordinates'],
+                         [[[0, 0], [10, 0], [10, 10], [0, 10]]])
+        requests = len(self.server.requests)
+
+        selected = folder.select([2.5, 3.5, 3.5, 4.2])
+        self.assertEqual(sorted(item.resource_id for item in selected),
+                         ['item32', 'item33', 'item42', 'item43'])
+        triangle = {'type': 'Polygon', 'coordinates': [[
+            [0.5, 0.5], [2.5, 0.5], [0.5, 2.5], [0.5, 0.5]]]}
+        self.assertEqual(
+            sorted(item.resource_id for item in folder.select(triangle)),
+            ['item0', 'item1', 'item10', 'item11', 'item12', 'item2',
+             'item20', 'item21'])
+
+        # Selection and the selected items' metadata need no requests
+        self.assertEqual(selected[0].get_metadata()['type_'], 'raster')
+        self.assertEqual(len(self.server.requests), requests)
+
+    def test_missing_geometa(self):
+        """Test only missing geometa is empty, and it is not cached"""
+        self.server.geometa = {
+            'item1': (400, {'message': 'No geospatial data'}),
+            'item2': (404, {'message': 'Not found'}),
+            'item3': (403, {'message': 'Access denied'})}
+        items = self.server.items[:3]
+        geometa = self.girder.lookup_geometa(items, missing_ok=True)
+        self.assertEqual([g['itemId'] for g in geometa[:1]], ['item0'])
+        self.assertEqual(geometa[1:], [{}, {}])
+
+        del self.server.requests[:]
+        self.girder.lookup_geometa(items, missing_ok=True)
+        self.assertEqual(sorted(self.server.requests),
+                         ['/api/v1/item/item1/geometa',
+                          '/api/v1/item/item2/geometa'])
+
+        with self.assertRaises(requests.HTTPError):
+            self.girder.get_geometa(['item3'], missing_ok=True)
+
+    def test_item_metadata(self):
+        """Test item geometa is cached until the item changes"""
+        metadata = GirderDataObject(None, 'item', 'item5').get_metadata()
+        self.assertEqual(metadata['itemId'], 'item5')
+        self.assertEqual(self.server.requests, [
+            '/api/v1/item/item5', '/api/v1/item/item5/geometa'])
+
+        del self.server.requests[:]
+        GirderDataObject(None, 'item', 'item5').get_metadata()
+        self.assertEqual(self.server.requests, ['/api/v1/item/item5'])
+
+        del self.server.requests[:]
+        self.server.items[5]['updated'] = '2018-02-01'
+        GirderDataObject(None, 'item', 'item5').get_metadata()
+        self.assertEqual(self.server.requests, [
+            '/api/v1/item/item5', '/api/v1/item/item5/geometa'])
+
+    def test_girder_job(self):
+        """Test girder job futures resolve once the job succeeds"""
+        futures = [girder_jobs.girder_job(
+            'job{}'.format(i), result=lambda job: job['_id'],
+            initial_interval=0.01) for i in range(10)]
+        done, _ = girder_jobs.wait(futures, timeout=10)
+        self.assertEqual(len(done), 10)
+        self.assertEqual(sorted(f.result() for f in futures),
+                         sorted('job{}'.format(i) for i in range(10)))
+        self.assertEqual(set(self.server.job_polls.values()), {3})
+
+
+class TestGirderUpload(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server = ThreadingHTTPServer(
+            ('127.0.0.1', 0), StandInUploadHandler)
+        self.server.lock = threading.Lock()
+        self.server.folders = {}
+        self.server.items = {}
+        self.server.uploads = {}
+        self.server.chunks = 0
+        self.server.fail_after = None
+        self.server.fail_every = None
+        self.server.bytes_received = 0
+        self.server.copies = 0
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+        api_url = 'http://127.0.0.1:{}/api/v1'.format(
+            self.server.server_address[1])
+        self.transport = GirderTransport(
+            api_url, pool_size=4, retries=0, backoff_factor=0)
+        self.uploader = GirderUploader(
+            self.transport, cache_folder_id='cache', chunk_size=1000,
+            journal=os.path.join(self.tmp_dir, 'uploads'))
+
+        self.paths = []
+        for i in range(6):
+            path = os.path.join(self.tmp_dir, 'input{}.bin'.format(i))
+            with open(path, 'wb') as fp:
+                fp.write(os.urandom(2500 + i))
+            self.paths.append(path)
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def folder_data(self, folder_id):
+        return {item['name']: item['data']
+                for item in self.server.folders.get(folder_id, [])}
+
+    def test_upload_and_deduplicate(self):
+        """Test unchanged inputs are copied on girder, not uploaded again"""
+        items = self.uploader.upload_files(self.paths, 'job1')
+        self.assertEqual([i['name'] for i in items],
+                         [os.path.basename(p) for p in self.paths])
+        uploaded = self.folder_data('job1')
+        for path in self.paths:
+            with open(path, 'rb') as fp:
+                self.assertEqual(uploaded[os.path.basename(path)], fp.read())
+        self.assertEqual(items[0]['meta']['sha512'],
+                         file_sha512(self.paths[0]))
+        size = sum(os.path.getsize(p) for p in self.paths)
+        self.assertEqual(self.server.bytes_received, size)
+
+        # A second job reuses the cached inputs, re-uploading the other
+        self.uploader.upload_files(self.paths, 'job2')
+        with open(self.paths[0], 'wb') as fp:
+            fp.write(b'changed')
+        self.uploader.upload_files(self.paths, 'job3')
+        self.assertEqual(self.server.bytes_received, size + len(b'changed'))
+        self.assertEqual(self.folder_data('job3')['input0.bin'], b'changed')
+        self.assertEqual(len(self.folder_data('job3')), 6)
+
+        # Inputs already in the target folder are skipped
+        copies = self.server.copies
+        self.uploader.upload_files(self.paths, 'job3')
+        self.assertEqual(self.server.copies, copies)
+        self.assertEqual(len(self.folder_data('job3')), 6)
+
+    def test_resume(self):
+        """Test an interrupted upload resumes from the last chunk"""
+        self.server.fail_after = 2
+        self.assertRaises(
+            Exception, self.uploader.upload_file, self.paths[5], 'job1')
+        self.assertEqual(self.server.bytes_received, 2000)
+
+        self.server.fail_after = None
+        item = self.uploader.upload_file(self.paths[5], 'job1')
+        self.assertEqual(self.server.bytes_received, 2505)
+        with open(self.paths[5], 'rb') as fp:
+            self.assertEqual(self.server.items[item['_id']]['data'],
+                             fp.read())
+
+    def test_shared_journal(self):
+        """Test uploaders sharing a journal keep each other's entries"""
+        other = GirderUploader(self.transport, journal=self.uploader.journal)
+        self.uploader._journal_set('job1:a', 'upload1')
+        other._journal_set('job1:b', 'upload2')
+        self.assertEqual(self.uploader._journal_get('job1:b'), 'upload2')
+        self.assertEqual(other._journal_get('job1:a'), 'upload1')
+        other._journal_set('job1:a', None)
+        self.assertIsNone(self.uploader._journal_get('job1:a'))
+        self.assertEqual(other._journal_get('job1:b'), 'upload2')
+
+    def test_intermittent_failures(self):
+        """Test failures spread over an upload don't use up its retries"""
+        self.server.fail_every = 2
+        self.uploader.chunk_size = 100
+        item = self.uploader.upload_file(self.paths[5], 'job1')
+        self.assertGreater(self.server.chunks, 2 * UPLOAD_RETRIES)
+        with open(self.paths[5], 'rb') as fp:
+            self.assertEqual(self.server.items[item['_id']]['data'],
+                             fp.read())
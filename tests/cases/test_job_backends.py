@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright Kitware Inc. and Epidemico Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from zipfile import ZipFile
+
+import gdal
+
+import gaia
+from gaia.io.cumulus_interface import CumulusInterface
+from gaia.io.job_backends import LocalBackend
+
+base_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)))
+testfile_path = os.path.join(base_dir, '../data')
+
+#: Task writing its rank and the content of the input file
+TASK_SCRIPT = (
+    'import os; open("out_{}.txt".format(os.environ["SLURM_PROCID"]), "w")'
+    '.write(open("input.txt").read())')
+
+
+class TestLocalBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.backend = LocalBackend(
+            job_dir=os.path.join(self.tmp_dir, 'jobs'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def submit(self, commands):
+        backend = self.backend
+        backend.create_cluster(backend.machine)
+        backend.create_slurm_script(
+            'test', backend.environment_commands() + commands)
+        backend.create_job('test')
+        input_path = os.path.join(self.tmp_dir, 'input.txt')
+        with open(input_path, 'w') as fp:
+            fp.write('input')
+        backend.upload_inputs([input_path])
+        backend.set_job_metadata({'numberOfCores': 3})
+        return backend.submit_job(
+            backend.machine, None, backend.job_output_dir('test'))
+
+    def test_job_lifecycle(self):
+        """Test staging, running and collecting the outputs of a job"""
+        job_id = self.submit(
+            ["srun -n 3 -c 1 -u python -c '{}'".format(TASK_SCRIPT)])
+        job = self.backend.job_future(timeout=60).result()
+        self.assertEqual(job['_id'], job_id)
+        self.assertEqual(job['status'], 'complete')
+        self.assertEqual(job['metadata'], {'numberOfCores': 3})
+        self.assertLessEqual(job['created'], job['started'])
+        self.assertLessEqual(job['started'], job['finished'])
+
+        job_folder = os.path.join(self.backend.job_dir, job_id)
+        with open(os.path.join(job_folder, 'job.json')) as fp:
+            self.assertEqual(json.load(fp)['status'], 'complete')
+
+        results = os.path.join(self.tmp_dir, 'results')
+        self.backend.download_results(results)
+        self.assertEqual(sorted(os.listdir(results)), [
+            'out_0.txt', 'out_1.txt', 'out_2.txt',
+            'slurm-{}.out'.format(job_id)])
+        with open(os.path.join(results, 'out_2.txt')) as fp:
+            self.assertEqual(fp.read(), 'input')
+
+        self.backend.release_resources()
+        self.assertFalse(os.path.exists(job_folder))
+
+    def test_job_failure(self):
+        """Test a failing job fails its future and keeps its log"""
+        job_id = self.submit(['echo starting', 'python -c "import sys; '
+                              'sys.exit(3)"', 'echo not reached'])
+        with self.assertRaises(gaia.GaiaException):
+            self.backend.job_future(job_id, timeout=60).result()
+
+        results = os.path.join(self.tmp_dir, 'results')
+        self.backend.download_results(results)
+        with open(os.path.join(
+                results, 'slurm-{}.out'.format(job_id))) as fp:
+            self.assertEqual(fp.read(), 'starting\n')
+
+    def test_job_setup_failure(self):
+        """Test a job failing before its script runs is not left queued"""
+        backend = self.backend
+        backend.create_cluster(backend.machine)
+        backend.create_slurm_script('test', ['echo not reached'])
+        backend.create_job('test')
+        shutil.rmtree(os.path.join(backend._job_folder, 'input_files'))
+        job_id = backend.submit_job()
+        with self.assertRaises(gaia.GaiaException) as context:
+            backend.job_future(job_id, timeout=60).result()
+        self.assertIn('input_files', str(context.exception))
+
+    def test_submit_crop(self):
+        """Test running a tiled crop job locally"""
+        raster = gaia.create(os.path.join(testfile_path, 'globalairtemp.tif'))
+        with ZipFile(os.path.join(testfile_path, '2states.zip')) as zipfile:
+            zipfile.extract('2states.geojson', self.tmp_dir)
+        clip = gaia.create(os.path.join(self.tmp_dir, '2states.geojson'))
+        cumulus = CumulusInterface(self.backend)
+        cumulus.submit_crop(raster, clip, None, tiles=3)
+        job = cumulus.job_future(timeout=120).result()
+        self.assertEqual(job['metadata']['numberOfCores'], 3)
+
+        results = os.path.join(self.tmp_dir, 'results')
+        cumulus.download_results(results)
+        self.assertIn('crop_geometry.geojson', os.listdir(os.path.join(
+            self.backend.job_dir, job['_id'], 'input_files')))
+        self.assertEqual(len(os.listdir(os.path.join(results, 'tiles'))), 3)
+        output = gdal.Open(os.path.join(results, 'output.tif'))
+        window = gaia.geo.pixel_window(
+            raster.get_data(), clip.get_data().geometry.unary_union.bounds)
+        self.assertEqual((output.RasterXSize, output.RasterYSize),
+                         tuple(window[2:]))
@@ -18,13 +18,15 @@
 ###############################################################################
 import os
 import json
+import shutil
+import tempfile
 import unittest
 from zipfile import ZipFile
 
 import geojson
 
 import gaia
-from gaia.preprocess import crop
+from gaia.preprocess import build_overviews, crop
 from gaia.io import readers
 
 base_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)))
@@ -61,6 +63,27 @@ class TestGaiaProcesses(unittest.TestCase):
 
         self.assertEqual(len(output.get_data()), 19)
 
+    def test_crop_pandas_keeps_inputs(self):
+        """
+        Test cropping against a clip object in another CRS leaves the clip
+        object unchanged, and reuses its cached projection
+        """
+        hospitals = gaia.create(
+            os.path.join(testfile_path, 'iraq_hospitals_3857.json'))
+        districts = gaia.create(
+            os.path.join(testfile_path, 'baghdad_districts.geojson'))
+        districts_data = districts.get_data()
+
+        output = crop(hospitals, districts)
+        self.assertEqual(len(output.get_data()), 19)
+        self.assertEqual(districts.get_epsg(), 4326)
+        self.assertIs(districts.get_data(), districts_data)
+
+        projected = districts.in_crs(3857)
+        self.assertIs(districts.in_crs(3857), projected)
+        self.assertEqual(projected.get_epsg(), 3857)
+        self.assertIs(districts.in_crs(4326), districts)
+
     def test_crop_vector_null(self):
         """Test case where vector intersection is null"""
         source_path = os.path.join(testfile_path, '2states.geojson')
@@ -146,3 +169,48 @@ class TestGaiaProcesses(unittest.TestCase):
 
         cropped_raster = crop(input_raster, crop_geom)
         self.assertIsNotNone(cropped_raster)
+
+    def test_crop_gdal_resolution(self):
+        """Test cropping a reduced resolution read of a raster"""
+        input_path = os.path.join(testfile_path, 'globalairtemp.tif')
+        input_raster = gaia.create(input_path)
+        full = input_raster.get_data()
+
+        tool_path = os.path.join(testfile_path, '2states.geojson')
+        tool = gaia.create(tool_path)
+
+        resolution = 4 * abs(full.GetGeoTransform()[1])
+        cropped = crop(input_raster, tool, resolution=resolution)
+        cropped_full = crop(input_raster, tool)
+        self.assertAlmostEqual(
+            cropped.get_data().GetGeoTransform()[1], resolution)
+        self.assertLess(cropped.get_data().RasterXSize,
+                        cropped_full.get_data().RasterXSize)
+
+    def test_build_overviews(self):
+        """Test building external overviews and reading from them"""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            raster_path = os.path.join(tmp_dir, 'simplergb.tif')
+            shutil.copy(
+                os.path.join(testfile_path, 'simplergb.tif'), raster_path)
+            raster = gaia.create(raster_path)
+            full = raster.get_data()
+            width, height = full.RasterXSize, full.RasterYSize
+
+            output = build_overviews(raster, factors=[2, 4], external=True)
+            self.assertTrue(os.path.exists(raster_path + '.ovr'))
+            band = output.get_data().GetRasterBand(1)
+            self.assertEqual(band.GetOverviewCount(), 2)
+
+            reduced = output.get_data(target_shape=(height // 4, width // 4))
+            self.assertEqual(reduced.RasterXSize, width // 4)
+            self.assertEqual(reduced.RasterYSize, height // 4)
+            self.assertEqual(reduced.RasterCount, full.RasterCount)
+            self.assertEqual(reduced.GetRasterBand(1).DataType,
+                             full.GetRasterBand(1).DataType)
+            self.assertAlmostEqual(
+                reduced.GetGeoTransform()[1],
+                full.GetGeoTransform()[1] * width / float(width // 4))
+        finally:
+            shutil.rmtree(tmp_dir)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright Kitware Inc. and Epidemico Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+import os
+import shutil
+import tempfile
+import unittest
+
+import gdal
+import numpy as np
+
+import gaia
+from gaia.io import readers
+
+base_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)))
+testfile_path = os.path.join(base_dir, '../data')
+
+
+class TestGaiaRasters(unittest.TestCase):
+
+    def test_read_numpy_native_dtype(self):
+        """Test numpy output keeps the band data type"""
+        raster_path = os.path.join(testfile_path, 'simplergb.tif')
+        dataset = gaia.create(raster_path).get_data()
+        reader = readers.GaiaReader(raster_path)
+        array = reader.read(as_numpy_array=True, as_single_band=False)
+
+        self.assertEqual(array.dtype, np.uint8)
+        self.assertEqual(array.shape, (dataset.RasterCount,
+                                       dataset.RasterYSize,
+                                       dataset.RasterXSize))
+        np.testing.assert_array_equal(array, dataset.ReadAsArray())
+
+    def test_read_numpy_window(self):
+        """Test reading a pixel window into a numpy array"""
+        raster_path = os.path.join(testfile_path, 'simplergb.tif')
+        raster = gaia.create(raster_path)
+        full = raster.get_array(as_single_band=False)
+
+        window = (10, 5, 20, 15)
+        array = raster.get_array(window=window, as_single_band=False)
+        self.assertEqual(array.shape, (full.shape[0], 15, 20))
+        np.testing.assert_array_equal(array, full[:, 5:20, 10:30])
+
+        with self.assertRaises(gaia.GaiaException):
+            raster.get_array(window=(0, 0, full.shape[2] + 1, 1))
+
+    def test_read_numpy_masked(self):
+        """Test NoData pixels are masked instead of replaced by NaN"""
+        raster_path = os.path.join(testfile_path, 'globalairtemp.tif')
+        raster = gaia.create(raster_path)
+        band = raster.get_data().GetRasterBand(1)
+        nodata = band.GetNoDataValue()
+
+        array = raster.get_array(masked=True, old_nodata=nodata)
+        self.assertIsInstance(array, np.ma.MaskedArray)
+        self.assertEqual(array.dtype, band.ReadAsArray(0, 0, 1, 1).dtype)
+        raw = band.ReadAsArray()
+        np.testing.assert_array_equal(array.mask, raw == nodata)
+
+    def test_read_memmap(self):
+        """Test memory-mapped band views of uncompressed GeoTIFFs"""
+        source = gdal.Open(os.path.join(testfile_path, 'simplergb.tif'))
+        expected = source.ReadAsArray()
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            layouts = {
+                'striped.tif': ['INTERLEAVE=PIXEL'],
+                'banded.tif': ['INTERLEAVE=BAND'],
+                'tiled.tif': ['TILED=YES', 'BLOCKXSIZE=16', 'BLOCKYSIZE=16']
+            }
+            for name, options in layouts.items():
+                raster_path = os.path.join(tmp_dir, name)
+                gdal.GetDriverByName('GTiff').CreateCopy(
+                    raster_path, source, options=options)
+                reader = readers.GaiaReader(raster_path)
+                views = reader.read(as_memmap=True, as_single_band=False)
+                self.assertEqual(len(views), source.RasterCount)
+                for view, band in zip(views, expected):
+                    self.assertEqual(view.shape, band.shape)
+                    np.testing.assert_array_equal(view[:, :], band)
+                    np.testing.assert_array_equal(
+                        view[3:17, 5:40:2], band[3:17, 5:40:2])
+
+            raster_path = os.path.join(tmp_dir, 'deflate.tif')
+            gdal.GetDriverByName('GTiff').CreateCopy(
+                raster_path, source, options=['COMPRESS=DEFLATE'])
+            with self.assertRaises(gaia.GaiaException):
+                gaia.create(raster_path).get_memmap()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_create_from_numpy(self):
+        """Test wrapping a numpy array as a raster without copying it"""
+        array = np.arange(3 * 40 * 60, dtype=np.int16).reshape(3, 40, 60)
+        geotransform = (10.0, 0.5, 0.0, 50.0, 0.0, -0.5)
+        raster = gaia.create(array, geotransform=geotransform, crs=4326)
+
+        self.assertEqual(raster.get_epsg(), 4326)
+        dataset = raster.get_data()
+        self.assertEqual(dataset.RasterCount, 3)
+        self.assertEqual(tuple(dataset.GetGeoTransform()), geotransform)
+        np.testing.assert_array_equal(dataset.ReadAsArray(), array)
+
+        # The dataset references the array buffer
+        array[1, 2, 3] = -1
+        self.assertEqual(dataset.GetRasterBand(2).ReadAsArray()[2, 3], -1)
+
+        bounds = raster.get_metadata()['bounds']['coordinates'][0]
+        self.assertEqual(bounds[0], [10.0, 30.0])
+        self.assertEqual(bounds[2], [40.0, 50.0])
+
+        output_path = os.path.join(tempfile.mkdtemp(), 'array.tif')
+        try:
+            gaia.save(raster, output_path)
+            saved = gdal.Open(output_path)
+            np.testing.assert_array_equal(saved.ReadAsArray(), array)
+        finally:
+            shutil.rmtree(os.path.dirname(output_path))
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright Kitware Inc. and Epidemico Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from zipfile import ZipFile
+
+import gdal
+from six import StringIO
+
+import gaia
+from gaia.geo import tiled_crop
+from gaia.io.slurm_emulator import SlurmEmulator, parse_srun
+
+base_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)))
+testfile_path = os.path.join(base_dir, '../data')
+package_path = os.path.realpath(os.path.join(base_dir, '../..'))
+
+
+class TestSlurmEmulator(unittest.TestCase):
+
+    def setUp(self):
+        self.job_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.job_dir, ignore_errors=True)
+
+    def test_parse_srun(self):
+        """Test splitting srun options from the task command"""
+        options, argv = parse_srun(
+            ['-n', '4', '--cpus-per-task=2', '-u', 'python', '-V'])
+        self.assertEqual(options['ntasks'], 4)
+        self.assertEqual(options['cpus_per_task'], 2)
+        self.assertEqual(argv, ['python', '-V'])
+        with self.assertRaises(gaia.GaiaException):
+            parse_srun(['--exclusive', 'hostname'])
+
+    def test_script(self):
+        """Test running srun tasks concurrently with their task ranks"""
+        output = StringIO()
+        emulator = SlurmEmulator(cwd=self.job_dir, max_tasks=2, output=output)
+        emulator.run([
+            'ulimit -s unlimited',
+            'module load python/3.6-anaconda-4.4',
+            'export PREFIX=task',
+            'export NAME=$PREFIX',
+            'mkdir out',
+            'cd out',
+            'srun -n 4 -c 1 -u python -c "import os; open(\'{}_{}\'.format('
+            'os.environ[\'NAME\'], os.environ[\'SLURM_PROCID\']), '
+            '\'w\').write(os.environ[\'SLURM_NTASKS\'])"',
+            'echo done'
+        ])
+        out_dir = os.path.join(self.job_dir, 'out')
+        self.assertEqual(sorted(os.listdir(out_dir)),
+                         ['task_0', 'task_1', 'task_2', 'task_3'])
+        with open(os.path.join(out_dir, 'task_3')) as fp:
+            self.assertEqual(fp.read(), '4')
+        self.assertEqual(output.getvalue(), 'done\n')
+
+    def test_failure(self):
+        """Test a failing task stops the script"""
+        emulator = SlurmEmulator(cwd=self.job_dir, output=StringIO())
+        with self.assertRaises(gaia.GaiaException) as context:
+            emulator.run([
+                'srun -n 3 python -c "import os, sys; '
+                'sys.exit(os.environ[\'SLURM_PROCID\'] == \'1\')"',
+                'touch not_reached'
+            ])
+        self.assertIn('task 1 exited with 1', str(context.exception))
+        self.assertFalse(
+            os.path.exists(os.path.join(self.job_dir, 'not_reached')))
+
+
+class TestTiledCrop(unittest.TestCase):
+
+    def setUp(self):
+        self.job_dir = tempfile.mkdtemp()
+        shutil.copy(os.path.join(testfile_path, 'globalairtemp.tif'),
+                    self.job_dir)
+        with ZipFile(os.path.join(testfile_path, '2states.zip')) as zipfile:
+            zipfile.extract('2states.geojson', self.job_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.job_dir, ignore_errors=True)
+
+    def test_plan_tiles(self):
+        """Test splitting a crop window into strips"""
+        raster_path = os.path.join(testfile_path, 'globalairtemp.tif')
+        dataset = gaia.create(raster_path).get_data()
+        bounds = (-100.0, 20.0, -80.0, 50.0)
+        window = gaia.geo.pixel_window(dataset, bounds)
+
+        plan = tiled_crop.plan_tiles(dataset, bounds, 4)
+        self.assertGreater(len(plan), 1)
+        self.assertLessEqual(len(plan), 4)
+        self.assertEqual(plan[0][1], window[1])
+        self.assertEqual(sum(tile[3] for tile in plan), window[3])
+        for tile, next_tile in zip(plan, plan[1:]):
+            self.assertEqual(tile[1] + tile[3], next_tile[1])
+            self.assertEqual(tile[0::2], window[0::2])
+
+    def test_tiled_crop_job(self):
+        """Test running the commands of a tiled crop job locally"""
+        commands = ['export PYTHONPATH={}'.format(package_path)]
+        commands += tiled_crop.slurm_commands(
+            'globalairtemp.tif', '2states.geojson', 'output.tif', 4)
+        SlurmEmulator(cwd=self.job_dir, output=StringIO()).run(commands)
+
+        tiles = os.listdir(os.path.join(self.job_dir, 'tiles'))
+        self.assertGreater(len(tiles), 1)
+        raster = gaia.create(os.path.join(self.job_dir, 'globalairtemp.tif'))
+        clip = gaia.create(os.path.join(self.job_dir, '2states.geojson'))
+        window = gaia.geo.pixel_window(
+            raster.get_data(), clip.get_data().geometry.unary_union.bounds)
+        output = gdal.Open(os.path.join(self.job_dir, 'output.tif'))
+        self.assertEqual((output.RasterXSize, output.RasterYSize),
+                         tuple(window[2:]))
+
+        tiled_crop.merge_tiles(os.path.join(self.job_dir, 'tiles'),
+                               os.path.join(self.job_dir, 'output.vrt'))
+        vrt = gdal.Open(os.path.join(self.job_dir, 'output.vrt'))
+        self.assertEqual(vrt.GetGeoTransform(), output.GetGeoTransform())
+        self.assertEqual(vrt.ReadAsArray().tolist(),
+                         output.ReadAsArray().tolist())
+
+    def test_reuse_tile_dir(self):
+        """Test a job ignores the tiles of an earlier job in its directory"""
+        with open(os.path.join(self.job_dir, '2states.geojson')) as fp:
+            states = json.load(fp)
+        # A smaller crop, with fewer tiles
+        states['features'] = states['features'][:1]
+        with open(os.path.join(self.job_dir, 'state.geojson'), 'w') as fp:
+            json.dump(states, fp)
+
+        for geometry, tiles in [('2states.geojson', 4), ('state.geojson', 2)]:
+            commands = ['export PYTHONPATH={}'.format(package_path)]
+            commands += tiled_crop.slurm_commands(
+                'globalairtemp.tif', geometry, 'output.tif', tiles)
+            SlurmEmulator(cwd=self.job_dir, output=StringIO()).run(commands)
+
+        raster = gaia.create(os.path.join(self.job_dir, 'globalairtemp.tif'))
+        clip = gaia.create(os.path.join(self.job_dir, 'state.geojson'))
+        window = gaia.geo.pixel_window(
+            raster.get_data(), clip.get_data().geometry.unary_union.bounds)
+        output = gdal.Open(os.path.join(self.job_dir, 'output.tif'))
+        self.assertEqual((output.RasterXSize, output.RasterYSize),
+                         tuple(window[2:]))
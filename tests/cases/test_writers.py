@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright Kitware Inc. and Epidemico Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import gdal
+
+import gaia
+
+base_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)))
+testfile_path = os.path.join(base_dir, '../data')
+
+
+class TestGaiaWriters(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_geojson_precision(self):
+        """Test writing GeoJSON with reduced coordinate precision"""
+        path = os.path.join(testfile_path, 'iraq_hospitals.geojson')
+        hospitals = gaia.create(path)
+
+        output_path = os.path.join(self.tmp_dir, 'hospitals.geojson')
+        gaia.save(hospitals, output_path, precision=3, batch_size=10)
+        with open(output_path) as fp:
+            features = json.load(fp)['features']
+        self.assertEqual(len(features), len(hospitals.get_data()))
+        for feature in features:
+            for value in feature['geometry']['coordinates']:
+                self.assertEqual(value, round(value, 3))
+
+        output = gaia.create(output_path)
+        self.assertEqual(
+            list(output.get_data()['name']),
+            list(hospitals.get_data()['name']))
+
+    def test_geojson_newline_delimited(self):
+        """Test writing one feature per line"""
+        path = os.path.join(testfile_path, 'iraq_hospitals.geojson')
+        hospitals = gaia.create(path)
+
+        output_path = os.path.join(self.tmp_dir, 'hospitals.geojsonl')
+        gaia.save(hospitals, output_path)
+        with open(output_path) as fp:
+            lines = fp.read().splitlines()
+        self.assertEqual(len(lines), len(hospitals.get_data()))
+        self.assertEqual(json.loads(lines[0])['type'], 'Feature')
+
+    def test_cog(self):
+        """Test writing a cloud-optimized GeoTIFF"""
+        path = os.path.join(testfile_path, 'globalairtemp.tif')
+        raster = gaia.create(path)
+
+        output_path = os.path.join(self.tmp_dir, 'airtemp_cog.tif')
+        gaia.save(raster, output_path, cog=True, blocksize=64)
+
+        dataset = gdal.Open(output_path)
+        band = dataset.GetRasterBand(1)
+        self.assertEqual(band.GetBlockSize(), [64, 64])
+        self.assertGreater(band.GetOverviewCount(), 0)
+        self.assertEqual(
+            dataset.GetMetadata('IMAGE_STRUCTURE').get('COMPRESSION'),
+            'DEFLATE')
+        self.assertEqual(dataset.RasterXSize, raster.get_data().RasterXSize)
+
+    def test_cog_uncompressed(self):
+        """Test writing a cloud-optimized GeoTIFF without compression"""
+        raster = gaia.create(os.path.join(testfile_path, 'globalairtemp.tif'))
+        output_path = os.path.join(self.tmp_dir, 'airtemp_cog.tif')
+        gaia.save(raster, output_path, cog=True, compress='NONE')
+
+        dataset = gdal.Open(output_path)
+        self.assertIsNone(
+            dataset.GetMetadata('IMAGE_STRUCTURE').get('COMPRESSION'))